@@ -0,0 +1,5 @@
+"""Host-side backend for the Embedded Board Manager.
+
+The routes used by ``static/script.js`` live on the ``board_manager.api.api``
+blueprint; register it on the Flask application to serve them.
+"""
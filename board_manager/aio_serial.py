@@ -0,0 +1,264 @@
+"""Asyncio transport for local serial ports.
+
+Every other board path is blocking pyserial, so a coroutine waiting for
+board output needs a thread to wait in. ``SerialTransport`` is an
+``asyncio.Transport`` over the port's non-blocking fd: reads are dispatched
+by ``loop.add_reader`` and writes that the driver cannot take at once are
+buffered and flushed by ``loop.add_writer``, with the usual write buffer
+limits and ``pause_writing``/``resume_writing`` calls.
+
+Protocols may be ``asyncio.Protocol`` or ``serial.threaded.Protocol``
+subclasses; both get ``connection_made``, ``data_received`` and
+``connection_lost`` on the loop, so ``Packetizer``, ``LineReader`` and
+``ReplHub`` run unchanged.
+"""
+import asyncio
+import os
+import threading
+
+from serial import SerialException
+
+from . import serial_io
+
+READ_BYTES = 64 * 1024  # most taken from the port per wakeup
+CALL_TIMEOUT = 2  # wait for the loop to run a ``*_threadsafe`` call that must finish first
+HIGH_WATER = 64 * 1024  # buffered write bytes before the protocol is paused
+
+
+class SerialTransport(asyncio.Transport):
+    """A serial port driven by an event loop; not thread safe except the ``*_threadsafe`` calls."""
+
+    def __init__(self, loop, protocol, serial_instance):
+        super().__init__({"serial": serial_instance})
+        self.loop = loop
+        self.serial = serial_instance
+        self.fd = serial_instance.fileno()
+        self._protocol = protocol
+        self._buffer = memoryview(bytearray(READ_BYTES))
+        self._write_buffer = bytearray()
+        self._high = HIGH_WATER
+        self._low = HIGH_WATER // 4
+        self._thread = None  # the loop's thread, once started
+        self._reading = False
+        self._writing = False
+        self._protocol_paused = False
+        self._closing = False
+        self._lost = False
+
+    def _start(self, paused=False):
+        if self._closing:
+            return
+        self._thread = threading.get_ident()
+        self._protocol.connection_made(self)
+        if not paused:
+            self.resume_reading()
+
+    def get_protocol(self):
+        return self._protocol
+
+    def set_protocol(self, protocol):
+        self._protocol = protocol
+
+    def is_closing(self):
+        return self._closing
+
+    def is_reading(self):
+        return self._reading
+
+    def pause_reading(self):
+        if self._reading:
+            self.loop.remove_reader(self.fd)
+            self._reading = False
+
+    def resume_reading(self):
+        if not self._reading and not self._closing:
+            self.loop.add_reader(self.fd, self._read_ready)
+            self._reading = True
+
+    def _read_ready(self):
+        try:
+            count = os.readv(self.fd, [self._buffer])
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self._force_close(SerialException(f"read failed: {e}"))
+            return
+        if not count:
+            self._force_close(SerialException("device reports readiness to read but returned no data "
+                                              "(device disconnected or multiple access on port?)"))
+            return
+        try:
+            self._protocol.data_received(bytes(self._buffer[:count]))
+        except Exception as e:  # as in ReaderThread, a failing protocol ends the connection
+            self._force_close(e)
+
+    def write(self, data):
+        if self._lost or not data:
+            return
+        if not self._write_buffer:
+            try:
+                sent = os.write(self.fd, data)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            except OSError as e:
+                self._force_close(SerialException(f"write failed: {e}"))
+                return
+            data = memoryview(data)[sent:]
+            if not data:
+                return
+            self.loop.add_writer(self.fd, self._write_ready)
+            self._writing = True
+        self._write_buffer += data
+        self._maybe_pause_protocol()
+
+    def _write_ready(self):
+        try:
+            sent = os.write(self.fd, self._write_buffer)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self._force_close(SerialException(f"write failed: {e}"))
+            return
+        del self._write_buffer[:sent]
+        self._maybe_resume_protocol()
+        if not self._write_buffer:
+            self._stop_writing()
+            if self._closing:
+                self._call_connection_lost(None)
+
+    def _stop_writing(self):
+        if self._writing:
+            self.loop.remove_writer(self.fd)
+            self._writing = False
+
+    def _maybe_pause_protocol(self):
+        if not self._protocol_paused and len(self._write_buffer) > self._high:
+            self._protocol_paused = True
+            # serial.threaded protocols have no flow control callbacks.
+            pause = getattr(self._protocol, "pause_writing", None)
+            if pause is not None:
+                pause()
+
+    def _maybe_resume_protocol(self):
+        if self._protocol_paused and len(self._write_buffer) <= self._low:
+            self._protocol_paused = False
+            resume = getattr(self._protocol, "resume_writing", None)
+            if resume is not None:
+                resume()
+
+    def get_write_buffer_size(self):
+        return len(self._write_buffer)
+
+    def get_write_buffer_limits(self):
+        return self._low, self._high
+
+    def set_write_buffer_limits(self, high=None, low=None):
+        high = HIGH_WATER if high is None else high
+        low = high // 4 if low is None else low
+        if not high >= low >= 0:
+            raise ValueError(f"high ({high!r}) must be >= low ({low!r}) must be >= 0")
+        self._high, self._low = high, low
+        self._maybe_pause_protocol()
+
+    def can_write_eof(self):
+        return False
+
+    def close(self):
+        """Stop reading, and close the port once buffered writes are out."""
+        if self._closing:
+            return
+        self._closing = True
+        self.pause_reading()
+        if not self._write_buffer:
+            self.loop.call_soon(self._call_connection_lost, None)
+
+    def abort(self):
+        self._force_close(None)
+
+    def _force_close(self, exc):
+        if self._lost:
+            return
+        self._write_buffer.clear()
+        self._stop_writing()
+        if not self._closing:
+            self._closing = True
+            self.pause_reading()
+        self.loop.call_soon(self._call_connection_lost, exc)
+
+    def _call_connection_lost(self, exc):
+        if self._lost:
+            return
+        self._lost = True
+        try:
+            self._protocol.connection_lost(exc)
+        except Exception as e:
+            if e is not exc:  # serial.threaded.Protocol re-raises the error it is given
+                raise
+        finally:
+            self.serial.close()
+            self._protocol = None
+
+    def _soon(self, callback, *args, wait=False):
+        """Run ``callback`` on the loop; with ``wait``, return only once it has run."""
+        if threading.get_ident() == self._thread:
+            callback(*args)
+            return
+        if not wait:
+            self.loop.call_soon_threadsafe(callback, *args)
+            return
+        done = threading.Event()
+
+        def run():
+            try:
+                callback(*args)
+            finally:
+                done.set()
+        self.loop.call_soon_threadsafe(run)
+        done.wait(CALL_TIMEOUT)
+
+    def write_threadsafe(self, data):
+        """``write`` from any thread, as ``ReaderThread.write`` allows."""
+        self._soon(self.write, bytes(data))
+
+    def pause_reading_threadsafe(self):
+        """``pause_reading`` from any thread; returns once the loop has stopped reading."""
+        if not self.loop.is_closed():
+            self._soon(self.pause_reading, wait=True)
+
+    def resume_reading_threadsafe(self):
+        if not self.loop.is_closed():
+            self._soon(self.resume_reading)
+
+    def close_threadsafe(self):
+        """``close`` from any thread; closes the port directly once the loop is gone."""
+        if self.loop.is_closed():
+            self.serial.close()
+            return
+        self._soon(self.close)
+
+
+def attach(loop, serial_instance, protocol_factory, paused=False):
+    """Drive an open port on ``loop`` with a new protocol; callable from any thread.
+
+    Returns the transport. Off the loop's thread, ``connection_made`` and
+    reading start on the loop's next iteration. A ``paused`` transport is
+    only read after ``resume_reading``.
+    """
+    transport = SerialTransport(loop, protocol_factory(), serial_instance)
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        transport._start(paused)
+    else:
+        loop.call_soon_threadsafe(transport._start, paused)
+    return transport
+
+
+async def create_serial_connection(loop, protocol_factory, port=None, serial_instance=None, **kwargs):
+    """Open ``port`` (or use ``serial_instance``) and return ``(transport, protocol)``, like ``loop.create_connection``."""
+    if serial_instance is None:
+        serial_instance = serial_io.Serial(port, **kwargs)
+    transport = attach(loop, serial_instance, protocol_factory)
+    return transport, transport.get_protocol()
@@ -0,0 +1,220 @@
+"""Asyncio WebSocket server for the REPL and status channels.
+
+Under Flask every ``/repl`` viewer holds a request thread plus the reader
+thread ``simple_websocket`` starts for it. This server accepts the same
+``/repl`` protocol, and a ``/status`` feed of port and REPL statistics, with
+``simple_websocket.AioServer`` connections that all share one event loop.
+Boards are still read once each by ``ReplHub``; a local port whose hub is
+opened here is read and written on this loop through ``aio_serial``, and
+other blocking board calls go through the loop's small default executor.
+Run it next to the Flask app and route ``/repl`` and ``/status`` to it::
+
+    python -m board_manager.aio_ws --port 5001
+"""
+import argparse
+import asyncio
+import codecs
+import json
+import queue
+import socket
+from urllib.parse import urlsplit
+
+from simple_websocket import AioServer, ConnectionClosed
+
+from .connections import SessionError
+from .ports import registry
+from . import repl_protocol
+from .repl_hub import (COALESCE_BYTES, COALESCE_SECONDS, SUBSCRIBER_QUEUE, Subscriber, closing_message,
+                       handle_message, hubs, output_messages, repl_connection)
+
+MAX_REQUEST = 16384  # bytes of upgrade request headers accepted
+STATUS_INTERVAL = 2  # seconds between REPL statistics on /status
+
+JOIN_ERRORS = (OSError, SessionError, KeyError, ValueError)
+
+
+class LoopQueue(queue.Queue):
+    """A ``queue.Queue`` filled from any thread that wakes an asyncio consumer."""
+
+    def __init__(self, loop, maxsize=0):
+        super().__init__(maxsize)
+        self.loop = loop
+        self.ready = asyncio.Event()
+
+    def _put(self, item):
+        super()._put(item)
+        self.loop.call_soon_threadsafe(self.ready.set)
+
+    async def next(self):
+        """Wait for and return the next item."""
+        while True:
+            try:
+                return self.get_nowait()
+            except queue.Empty:
+                self.ready.clear()
+                await self.ready.wait()
+
+
+class AsyncSubscriber(Subscriber):
+    """A hub subscriber whose queue is consumed on the event loop."""
+
+    def __init__(self, loop):
+        super().__init__()
+        self.queue = LoopQueue(loop, SUBSCRIBER_QUEUE)
+
+
+async def send(ws, data):
+    """Send one message and wait for the socket buffer to drain.
+
+    ``AioServer.send`` only buffers; draining is what pushes a slow browser's
+    backlog back onto the hub, which then drops with a marker.
+    """
+    await ws.send(data)
+    await ws.wsock.drain()
+
+
+async def pump_output(ws, hub, subscriber, binary=False):
+    """Forward board output to one viewer in coalesced frames until the hub ends."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    ended = False
+    while not ended:
+        data = await subscriber.queue.next()
+        ended = data is None
+        frame = bytearray(data or b"")
+        if not ended:
+            await asyncio.sleep(COALESCE_SECONDS)
+            while len(frame) < COALESCE_BYTES:
+                try:
+                    data = subscriber.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if data is None:
+                    ended = True
+                    break
+                frame += data
+        for message in output_messages(bytes(frame), decoder, subscriber, binary):
+            await send(ws, message)
+            hub.meter.add(message)
+    await send(ws, closing_message(binary))
+    await ws.close()
+
+
+async def repl(ws):
+    """Attach a viewer to the shared REPL hub of the board it names first."""
+    loop = asyncio.get_running_loop()
+    binary = ws.subprotocol == repl_protocol.SUBPROTOCOL
+    try:
+        message = json.loads(await ws.receive())
+        hub, subscriber = await asyncio.to_thread(hubs.join, repl_connection(message), message.get("viewer"),
+                                                  AsyncSubscriber(loop), loop)
+    except JOIN_ERRORS as e:
+        await send(ws, repl_protocol.status("error", message=str(e)) if binary else f"Error: {e}\n")
+        return
+    keys = bool(message.get("keys"))
+    if keys:
+        await asyncio.to_thread(hub.low_latency)
+    if binary:
+        await send(ws, repl_protocol.status("joined", board=hub.key[1]))
+    pump = asyncio.create_task(pump_output(ws, hub, subscriber, binary))
+    try:
+        while True:
+            message = await ws.receive()
+            try:
+                if hub.loop is loop:  # writes only queue on the port's transport
+                    reply = handle_message(hub, subscriber, message, binary, keys)
+                else:
+                    reply = await asyncio.to_thread(handle_message, hub, subscriber, message, binary, keys)
+            except (TimeoutError, ValueError) as e:
+                reply = repl_protocol.status("error", message=str(e)) if binary else f"Error: {e}\n"
+            if reply is not None:
+                await send(ws, reply)
+    finally:
+        pump.cancel()
+        await asyncio.to_thread(hubs.leave, hub, subscriber)
+
+
+async def status(ws):
+    """Push serial port changes as they happen and REPL statistics periodically."""
+    events = registry.subscribe(LoopQueue(asyncio.get_running_loop(), 256))
+    try:
+        await send(ws, json.dumps({"type": "ports", "ports": await asyncio.to_thread(registry.list)}))
+        while True:
+            try:
+                event, port = await asyncio.wait_for(events.next(), STATUS_INTERVAL)
+                message = {"type": "ports", "ports": port} if event == "ports" else {"type": event, "port": port}
+            except asyncio.TimeoutError:
+                message = {"type": "repl", "boards": hubs.stats()}
+            await send(ws, json.dumps(message))
+    finally:
+        registry.unsubscribe(events)
+
+
+ROUTES = {"/repl": repl, "/status": status}
+
+
+async def read_request(loop, conn):
+    """Read an HTTP upgrade request; returns ``(path, headers)``."""
+    data = b""
+    while b"\r\n\r\n" not in data:
+        chunk = await loop.sock_recv(conn, 4096)
+        if not chunk or len(data) > MAX_REQUEST:
+            raise ConnectionError("incomplete request")
+        data += chunk
+    request_line, *lines = data.split(b"\r\n\r\n", 1)[0].decode("latin-1").split("\r\n")
+    headers = dict(line.split(":", 1) for line in lines if ":" in line)
+    return urlsplit(request_line.split(" ")[1]).path, {k.strip(): v.strip() for k, v in headers.items()}
+
+
+async def handle(conn):
+    loop = asyncio.get_running_loop()
+    try:
+        path, headers = await read_request(loop, conn)
+    except (ConnectionError, IndexError, UnicodeDecodeError):
+        conn.close()
+        return
+    route = ROUTES.get(path)
+    if route is None:
+        await loop.sock_sendall(conn, b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        conn.close()
+        return
+    ws = await AioServer.accept(sock=conn, headers=headers, subprotocols=[repl_protocol.SUBPROTOCOL])
+    try:
+        await route(ws)
+    except (ConnectionClosed, ConnectionError):
+        pass
+    finally:
+        if ws.connected:
+            await ws.close()
+        ws.wsock.close()
+
+
+async def serve(host, port, ready=None):
+    """Accept WebSocket connections on ``host:port`` until cancelled."""
+    loop = asyncio.get_running_loop()
+    server = socket.create_server((host, port), backlog=512)
+    server.setblocking(False)
+    if ready is not None:
+        ready(server.getsockname()[1])
+    tasks = set()
+    try:
+        while True:
+            conn, _ = await loop.sock_accept(server)
+            conn.setblocking(False)
+            task = loop.create_task(handle(conn))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m board_manager.aio_ws",
+                                     description="Serve the /repl and /status WebSockets from one event loop.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5001)
+    args = parser.parse_args(argv)
+    asyncio.run(serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""Flask routes backing the board manager page."""
+import ftplib
+import json
+import posixpath
+import queue
+import re
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask import Blueprint, Response, abort, jsonify, request
+from flask_sock import Sock
+
+from .broker import broker_running, broker_status
+from .completions import completions
+from .connections import SessionError, sessions
+from .console_index import console
+from .fanout import deploy
+from .fs_pull import pull_filesystem
+from .mpy_batch import precompile
+from .mpy_cache import CompileError
+from .ports import registry
+from .raw_repl import RawReplError
+from .recorder import Recording, list_recordings
+from .remote_exec import EXEC_TIMEOUT, run_snippets, running
+from . import repl_protocol
+from .repl_hub import SCROLLBACK_PAGE, handle_message, hubs, pump_output, repl_connection
+from .transfer import board_micropython, download_files, upload_files
+from .zipstream import stream_zip
+
+api = Blueprint("board_api", __name__)
+sock = Sock()
+
+DOWNLOAD_TTL = 60  # seconds a prepared download stays claimable
+
+# download id -> (connection, names or None for everything, expiry);
+# claimed once by /download.
+pending_downloads = {}
+
+TRANSFER_ERRORS = (OSError, RawReplError, CompileError, SessionError, KeyError, ValueError) + ftplib.all_errors
+
+
+def posted_files(connection=None):
+    """Return the posted files as ``(name, data)`` pairs.
+
+    With ``compile=1`` modules are precompiled to ``.mpy`` first, for the
+    MicroPython release given in ``micropython``, else the one the serial
+    board on ``connection`` runs, else the bundled mpy-cross's.
+    """
+    files = [(posixpath.basename(f.filename), f.read()) for f in request.files.getlist("files")]
+    if request.form.get("compile"):
+        micropython = request.form.get("micropython") or None
+        if micropython is None and connection is not None:
+            micropython = board_micropython(connection)
+        files = precompile(files, micropython=micropython)
+    return files
+
+
+@api.route("/api/upload", methods=["POST"])
+def upload():
+    """Upload the posted files to the board named in the ``connection`` field.
+
+    Post ``delta=blocks`` to rewrite only the changed blocks of edited files,
+    ``compile=1`` to send precompiled ``.mpy`` modules and ``framed=1`` to
+    send serial uploads as CRC-checked frames.
+    """
+    try:
+        connection = json.loads(request.form["connection"])
+        files = posted_files(connection)
+        sent = upload_files(connection, files, blocks=request.form.get("delta") == "blocks",
+                            framed=bool(request.form.get("framed")))
+    except TRANSFER_ERRORS as e:
+        return jsonify(success=False, message=f"Upload failed: {e}")
+    changed = sum(1 for _, n in sent if n is not None)
+    return jsonify(success=True, message=f"Uploaded {changed} file(s), {len(sent) - changed} unchanged",
+                   files=[{"name": name, "bytes_sent": n} for name, n in sent])
+
+
+@api.route("/api/deploy", methods=["POST"])
+def deploy_many():
+    """Upload the posted files to every board in the ``targets`` JSON list."""
+    try:
+        targets = json.loads(request.form["targets"])
+        files = posted_files()
+        start = time.monotonic()
+        results = deploy(targets, files, blocks=request.form.get("delta") == "blocks",
+                         framed=bool(request.form.get("framed")))
+    except (KeyError, ValueError, OSError, CompileError, SessionError) as e:
+        return jsonify(success=False, message=f"Deploy failed: {e}")
+    failed = sum(1 for r in results if not r["success"])
+    return jsonify(success=not failed, message=f"Deployed to {len(results) - failed}/{len(results)} board(s)",
+                   seconds=round(time.monotonic() - start, 3), results=results)
+
+
+@api.route("/api/download", methods=["POST"])
+def prepare_download():
+    """Register a board download and return the id that ``/download`` streams.
+
+    Send ``recursive: true`` instead of ``files`` to pull every file under
+    ``/flash`` and ``/sd``.
+    """
+    payload = request.get_json(silent=True) or {}
+    if not payload.get("connection") or not (payload.get("files") or payload.get("recursive")):
+        return jsonify(success=False, message="Download failed: connection and files are required")
+    now = time.monotonic()
+    for key in [k for k, (_, _, expiry) in pending_downloads.items() if expiry < now]:
+        pending_downloads.pop(key, None)
+    download_id = secrets.token_urlsafe(16)
+    names = None if payload.get("recursive") else payload["files"]
+    pending_downloads[download_id] = (payload["connection"], names, now + DOWNLOAD_TTL)
+    return jsonify(success=True, download_id=download_id)
+
+
+@api.route("/download")
+def download():
+    """Stream a zip of the board files as they are read, without temp files."""
+    entry = pending_downloads.pop(request.args.get("id", ""), None)
+    if entry is None or entry[2] < time.monotonic():
+        abort(404)
+    connection, names, _ = entry
+    if names is None:
+        entries = pull_filesystem(connection)
+    else:
+        entries = download_files(connection, [posixpath.basename(name) for name in names])
+    return Response(stream_zip(entries), mimetype="application/zip",
+                    headers={"Content-Disposition": "attachment; filename=board_files.zip"})
+
+
+@api.route("/api/exec", methods=["POST"])
+def exec_code():
+    """Run ``script``, or each of ``snippets``, in one raw REPL session.
+
+    The response streams one JSON event per line as the board prints; see
+    ``remote_exec.run_snippets``.
+    """
+    payload = request.get_json(silent=True) or {}
+    snippets = [payload["script"]] if payload.get("script") else payload.get("snippets") or []
+    if not payload.get("connection") or not snippets:
+        return jsonify(success=False, message="Exec failed: connection and script or snippets are required")
+    events = run_snippets(payload["connection"], snippets, timeout=payload.get("timeout", EXEC_TIMEOUT),
+                          stop_on_error=payload.get("stop_on_error", True))
+    return Response((json.dumps(event) + "\n" for event in events), mimetype="application/x-ndjson")
+
+
+@api.route("/api/exec/<exec_id>", methods=["DELETE"])
+def cancel_exec(exec_id):
+    """Interrupt a running ``/api/exec`` with Ctrl-C."""
+    execution = running.get(exec_id)
+    if execution is None:
+        return jsonify(success=False, message="No such execution"), 404
+    execution.cancel()
+    return jsonify(success=True, message="Interrupted")
+
+
+@api.route("/api/sessions", methods=["POST"])
+def open_session():
+    """Open a board connection once; later calls pass ``{"session": id}`` as their connection."""
+    try:
+        session = sessions.open(request.get_json())
+    except TRANSFER_ERRORS as e:
+        return jsonify(success=False, message=f"Connection failed: {e}")
+    info = session.info()
+    rate = f" at {info['baudrate']} baud" if "baudrate" in info else ""
+    return jsonify(success=True, message=f"Connected to {info['target']}{rate}", session=info)
+
+
+@api.route("/api/sessions")
+def list_sessions():
+    return jsonify(sessions.list())
+
+
+@api.route("/api/sessions/<session_id>", methods=["GET", "POST"])
+def session_keepalive(session_id):
+    """Describe a session; POSTing to it also counts as activity."""
+    try:
+        session = sessions.get(session_id)
+    except SessionError as e:
+        return jsonify(success=False, message=str(e)), 404
+    if request.method == "POST":
+        session.touch()
+    return jsonify(success=True, session=session.info())
+
+
+@api.route("/api/sessions/<session_id>", methods=["DELETE"])
+def close_session(session_id):
+    try:
+        sessions.close(session_id)
+    except SessionError as e:
+        return jsonify(success=False, message=str(e)), 404
+    return jsonify(success=True, message="Session closed")
+
+
+@api.route("/api/serial-ports")
+def serial_ports():
+    return jsonify(registry.list())
+
+
+@api.route("/api/serial-ports/lanes")
+def port_lanes():
+    """Queue depth and wait time of each write priority lane on broker-held ports."""
+    if not broker_running():
+        return jsonify(success=False, message="No serial broker is running", ports=[])
+    try:
+        return jsonify(success=True, ports=broker_status())
+    except OSError as e:
+        return jsonify(success=False, message=f"Broker status failed: {e}", ports=[])
+
+
+@api.route("/api/serial-ports/events")
+def serial_port_events():
+    """Push ``add``/``remove`` port events to the page as server-sent events.
+
+    A page that fell behind gets a ``ports`` event with the full list instead.
+    """
+    events = registry.subscribe()
+
+    def stream():
+        try:
+            while True:
+                try:
+                    event, port = events.get(timeout=15)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(port)}\n\n"
+        finally:
+            registry.unsubscribe(events)
+
+    return Response(stream(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@api.route("/api/repl/stats")
+def repl_stats():
+    """Frames/s and bytes/s sent to REPL viewers, per board."""
+    return jsonify(hubs.stats())
+
+
+@api.route("/api/repl/completions", methods=["POST"])
+def repl_completions():
+    """Cached attributes of the dotted ``name`` on the board, for tab completion.
+
+    ``names`` is null on a miss; with ``learn``, what the board prints for the
+    Tab the page then sends it is cached. ``retype`` says the board had to be
+    asked for its firmware, which dropped the line typed at its prompt.
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        retype = completions.identify(payload["connection"])
+        firmware, names = completions.lookup(payload["connection"], payload["name"], bool(payload.get("learn")))
+    except TRANSFER_ERRORS as e:
+        return jsonify(success=False, message=f"Completion failed: {e}")
+    return jsonify(success=True, firmware=firmware, cached=names is not None, names=names, retype=retype)
+
+
+@api.route("/api/repl/scrollback")
+def repl_scrollback():
+    """Page through the board output before line ``before`` of a /repl viewer."""
+    try:
+        start, lines = hubs.scrollback(request.args["viewer"], request.args.get("before", 0, type=int),
+                                       request.args.get("count", SCROLLBACK_PAGE, type=int))
+    except KeyError:
+        return jsonify({"success": False, "message": "Unknown or closed REPL viewer"}), 404
+    return jsonify({"success": True, "start": start, "lines": lines})
+
+
+@api.route("/api/recordings")
+def recordings():
+    """List the recorded REPL sessions, newest last."""
+    return jsonify(list_recordings())
+
+
+@api.route("/api/recordings/<recording_id>")
+def replay_recording(recording_id):
+    """Replay a recording from ``start`` (epoch seconds) in pages of ``limit`` bytes."""
+    try:
+        recording = Recording(recording_id)
+    except KeyError:
+        return jsonify(success=False, message="No such recording"), 404
+    chunks, following = recording.replay(request.args.get("start", type=float), request.args.get("end", type=float),
+                                         min(request.args.get("limit", 256 * 1024, type=int), 1024 * 1024))
+    first, last = recording.span()
+    return jsonify(success=True, start=first, end=last, next=following,
+                   chunks=[{"time": t, "text": text} for t, text in chunks])
+
+
+@api.route("/api/recordings/<recording_id>/search")
+def search_recording(recording_id):
+    """Find the lines of a recording matching the regular expression ``q``."""
+    try:
+        recording = Recording(recording_id)
+        matches = recording.search(request.args["q"], request.args.get("start", type=float),
+                                   request.args.get("end", type=float), request.args.get("limit", 100, type=int))
+    except KeyError:
+        return jsonify(success=False, message="No such recording, or no query"), 404
+    except re.error as e:
+        return jsonify(success=False, message=f"Bad pattern: {e}")
+    return jsonify(success=True, matches=[{"time": t, "line": line} for t, line in matches])
+
+
+@api.route("/api/console/search")
+def search_console():
+    """Search indexed console output of every board.
+
+    ``q`` is matched as a phrase (``raw=1`` for FTS5 query syntax); narrow it
+    with ``board`` and ``since``/``until`` in epoch seconds.
+    """
+    if not request.args.get("q"):
+        return jsonify(success=False, message="Search failed: q is required")
+    start = time.monotonic()
+    try:
+        matches = console.search(request.args["q"], board=request.args.get("board"),
+                                 since=request.args.get("since", type=float), until=request.args.get("until", type=float),
+                                 limit=min(request.args.get("limit", 50, type=int), 1000),
+                                 context=min(request.args.get("context", 2, type=int), 20),
+                                 raw=bool(request.args.get("raw")))
+    except (sqlite3.Error, OSError) as e:
+        return jsonify(success=False, message=f"Search failed: {e}")
+    return jsonify(success=True, seconds=round(time.monotonic() - start, 4), matches=matches)
+
+
+@api.route("/api/console/boards")
+def console_boards():
+    """Boards with indexed console output."""
+    return jsonify(console.boards())
+
+
+@api.record_once
+def offer_repl_subprotocol(state):
+    """Let flask-sock accept the binary ``/repl`` subprotocol."""
+    options = state.app.config.setdefault("SOCK_SERVER_OPTIONS", {})
+    subprotocols = options.setdefault("subprotocols", [])
+    if repl_protocol.SUBPROTOCOL not in subprotocols:
+        subprotocols.append(repl_protocol.SUBPROTOCOL)
+
+
+@sock.route("/repl", bp=api)
+def repl(ws):
+    """Attach a browser to the shared REPL hub of the board it names first."""
+    binary = ws.subprotocol == repl_protocol.SUBPROTOCOL
+    try:
+        message = json.loads(ws.receive())
+        hub, subscriber = hubs.join(repl_connection(message), message.get("viewer"))
+    except TRANSFER_ERRORS as e:
+        ws.send(repl_protocol.status("error", message=str(e)) if binary else f"Error: {e}\n")
+        return
+    keys = bool(message.get("keys"))
+    if keys:
+        hub.low_latency()
+    if binary:
+        ws.send(repl_protocol.status("joined", board=hub.key[1]))
+    threading.Thread(target=pump_output, args=(ws, hub, subscriber, binary), daemon=True).start()
+    try:
+        while True:
+            try:
+                reply = handle_message(hub, subscriber, ws.receive(), binary, keys)
+            except (TimeoutError, ValueError) as e:
+                reply = repl_protocol.status("error", message=str(e)) if binary else f"Error: {e}\n"
+            if reply is not None:
+                ws.send(reply)
+    finally:
+        hubs.leave(hub, subscriber)
@@ -0,0 +1,196 @@
+"""Baud-rate escalation for serial board sessions.
+
+Sessions connect at the rate the form names (115200 by default), then ask
+the board to move its REPL UART to the fastest rate that survives a round
+trip: the board switches, echoes a random test block with its CRC32 at the
+new rate, and only keeps the rate once the host confirms. Anything else
+puts both ends back on the safe rate. The rate that worked is remembered per
+board, tried first next time, and used to reach a board a crashed host left
+at a high rate. While a session keeps a board at its fast rate, ``active``
+lets every other link to the port open at that rate too.
+"""
+import json
+import os
+import threading
+import time
+import zlib
+
+from .ports import registry
+from .raw_repl import ACK, RawReplError
+
+RATES_PATH = os.environ.get("BOARD_MANAGER_BAUDRATES",
+                            os.path.join(os.path.expanduser("~"), ".cache", "board_manager", "baudrates.json"))
+RATES = (1500000, 921600, 460800, 230400)  # fastest first
+REPL_UART = 0  # the UART the REPL runs on (UART0 on ESP32 and Pycom boards)
+TEST_BYTES = 256
+TEST_TIMEOUT_MS = 1000  # how long the board waits at a new rate before giving up
+SWITCH_DELAY_MS = 20  # lets the board's ack drain before it changes rate
+
+# Runs on the board: ack, switch, echo the test block with its CRC32 and keep
+# the rate only if the host confirms; otherwise return to {safe}.
+SWITCH_SCRIPT = """\
+import sys, struct, time, machine, micropython
+try:
+    import select
+except ImportError:
+    import uselect as select
+try:
+    from binascii import crc32
+except ImportError:
+    from ubinascii import crc32
+micropython.kbd_intr(-1)
+u = machine.UART({uart})
+p = select.poll()
+p.register(sys.stdin, select.POLLIN)
+def wait(n):
+    b = b''
+    t = time.ticks_ms()
+    while len(b) < n and time.ticks_diff(time.ticks_ms(), t) < {timeout}:
+        if p.poll(10):
+            b += sys.stdin.buffer.read(1)
+    return b
+sys.stdout.write('\\x06')
+time.sleep_ms({delay})
+u.init(baudrate={rate})
+d = wait({size})
+ok = False
+if len(d) == {size}:
+    sys.stdout.buffer.write(d + struct.pack('<I', crc32(d) & 0xffffffff))
+    ok = wait(1) == b'\\x06'
+if not ok:
+    time.sleep_ms({delay})
+    u.init(baudrate={safe})
+micropython.kbd_intr(3)
+"""
+
+RESTORE_SCRIPT = """\
+import time, machine
+time.sleep_ms({delay})
+machine.UART({uart}).init(baudrate={rate})
+"""
+
+
+def board_id(port):
+    """Return a key for the board on ``port`` that survives re-enumeration where possible."""
+    info = registry.ports.get(port) or {}
+    hwid = info.get("hwid") or ""
+    return hwid if "SER=" in hwid else port
+
+
+class RateMemory:
+    """The last rate that passed the test, per board, kept on disk."""
+
+    def __init__(self, path=RATES_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.rates = None
+
+    def _load(self):
+        if self.rates is None:
+            try:
+                with open(self.path) as f:
+                    self.rates = json.load(f)
+            except (OSError, ValueError):
+                self.rates = {}
+        return self.rates
+
+    def get(self, board):
+        with self.lock:
+            return self._load().get(board)
+
+    def set(self, board, rate):
+        with self.lock:
+            rates = self._load()
+            if rates.get(board) == rate:
+                return
+            if rate is None:
+                rates.pop(board, None)
+            else:
+                rates[board] = rate
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(rates, f)
+            os.replace(tmp, self.path)
+
+
+remembered = RateMemory()
+active = {}  # port -> rate an open session has moved the board to, until it restores the safe rate
+
+
+def _settle(repl, rate):
+    """Move the host side to ``rate`` and discard whatever arrived at the old one."""
+    repl.serial.baudrate = rate
+    time.sleep(2 * SWITCH_DELAY_MS / 1000)
+    repl.serial.reset_input_buffer()
+    repl.pending.clear()
+
+
+def try_rate(repl, rate, safe, uart=REPL_UART):
+    """Ask the board to run at ``rate``; returns whether both ends now do.
+
+    The raw REPL must be active, and is again afterwards at whichever rate won.
+    """
+    repl.send(SWITCH_SCRIPT.format(uart=uart, rate=rate, safe=safe, size=TEST_BYTES, timeout=TEST_TIMEOUT_MS,
+                                   delay=SWITCH_DELAY_MS))
+    first = repl.read_exact(1)
+    if first != ACK:  # the script failed before switching, e.g. no such UART
+        repl.pending.unread(first)
+        repl.follow()
+        return False
+    try:
+        _settle(repl, rate)
+        block = os.urandom(TEST_BYTES)
+        repl.serial.write(block)
+        echo = repl.read_exact(TEST_BYTES + 4, timeout=TEST_TIMEOUT_MS / 1000)
+        if echo != block + zlib.crc32(block).to_bytes(4, "little"):
+            raise RawReplError(f"echo test failed at {rate} baud")
+        repl.serial.write(ACK)
+        repl.follow(timeout=TEST_TIMEOUT_MS / 1000)
+        return True
+    except (RawReplError, OSError):
+        pass
+    # Wait out the board's timeouts; it then falls back to the safe rate.
+    time.sleep(2 * TEST_TIMEOUT_MS / 1000 + 0.1)
+    _settle(repl, safe)
+    repl.enter()
+    return False
+
+
+def negotiate(repl, board, rates=RATES, uart=REPL_UART):
+    """Escalate ``repl``'s link to the fastest working rate in ``rates``; returns the rate in use.
+
+    The remembered rate for ``board`` is tried first; a rate that fails is
+    forgotten. Leaves the board in the friendly REPL.
+    """
+    safe = repl.serial.baudrate
+    known = remembered.get(board)
+    try:
+        repl.enter()
+    except RawReplError:
+        if not known:
+            raise
+        # A previous session may have left the board at its fast rate.
+        _settle(repl, known)
+        repl.enter()
+        repl.exit()
+        return known
+    try:
+        order = ([known] if known else []) + [rate for rate in rates if rate > safe and rate != known]
+        for rate in order:
+            if try_rate(repl, rate, safe, uart):
+                remembered.set(board, rate)
+                return rate
+            if rate == known:
+                remembered.set(board, None)
+        return safe
+    finally:
+        repl.exit()
+
+
+def restore(repl, rate, uart=REPL_UART):
+    """Put the board and the host back on ``rate``, e.g. before closing the port."""
+    repl.enter()
+    repl.send(RESTORE_SCRIPT.format(uart=uart, rate=rate, delay=SWITCH_DELAY_MS))
+    _settle(repl, rate)
+    repl.exit()
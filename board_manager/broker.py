@@ -0,0 +1,583 @@
+"""Serial port broker: one process owns every board port and shares it safely.
+
+Run it once per host::
+
+    python -m board_manager.broker [--socket PATH]
+
+Web workers, the REPL route and CLI tools then reach ports through
+``BrokerSerial``, a pyserial-style client, instead of opening ``/dev/tty*``
+themselves. Ports stay open between clients, writes are gated by an
+exclusive lease and every byte read is copied to all subscribers.
+
+Messages in both directions are a JSON header line, followed by ``size``
+raw payload bytes when the header has a ``size``.
+
+Writes to a port are scheduled in priority lanes: ``control`` (Ctrl-C, sent
+with ``write_control``), then ``interactive`` (REPL input), then ``bulk`` (the
+lease holder's transfers, in ``BULK_CHUNK`` pieces). A higher lane goes next
+at every chunk boundary, so a viewer's Ctrl-C or keystroke reaches the board
+within one chunk of a running upload instead of after it. Each client's
+writes without an explicit lane go to one lane and stay in order; only the
+lease holder writes ``bulk``.
+"""
+import argparse
+import collections
+import errno
+import json
+import os
+import queue
+import selectors
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import serial
+
+SOCKET_PATH = os.environ.get("BOARD_BROKER_SOCKET",
+                             os.path.join(tempfile.gettempdir(), "board_manager_broker.sock"))
+PORT_IDLE_TIMEOUT = 600  # close a port nobody has used for this long
+MAX_CLIENT_BACKLOG = 4 * 1024 * 1024  # drop subscribers that fall this far behind
+LEASE_TIMEOUT = 30
+LANES = ("control", "interactive", "bulk")  # highest priority first
+BULK_CHUNK = 512
+
+
+def encode(header, payload=b""):
+    """Frame one message."""
+    if payload:
+        header = dict(header, size=len(payload))
+    return json.dumps(header).encode() + b"\n" + bytes(payload)
+
+
+class Decoder:
+    """Split a byte stream into ``(header, payload)`` messages.
+
+    A header that is not a JSON object raises ``ValueError``; the stream
+    cannot be framed past it.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.header = None
+
+    def feed(self, data):
+        self.buffer += data
+        while True:
+            if self.header is None:
+                end = self.buffer.find(b"\n")
+                if end < 0:
+                    return
+                header = json.loads(self.buffer[:end])
+                if not isinstance(header, dict):
+                    raise ValueError(f"header is not an object: {header!r}")
+                self.header = header
+                del self.buffer[:end + 1]
+            size = self.header.get("size", 0)
+            if len(self.buffer) < size:
+                return
+            payload = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            header, self.header = self.header, None
+            yield header, payload
+
+
+class _Lane:
+    """Queued writes of one priority class, with depth and wait statistics."""
+
+    def __init__(self):
+        self.chunks = collections.deque()  # (enqueued at, data)
+        self.bytes = 0
+        self.written = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def push(self, data, since=None):
+        self.chunks.append((time.monotonic() if since is None else since, data))
+        self.bytes += len(data)
+
+    def pop(self):
+        since, data = self.chunks.popleft()
+        wait = time.monotonic() - since
+        self.bytes -= len(data)
+        self.written += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        return bytearray(data)
+
+    def stats(self):
+        return {"queued": len(self.chunks), "queued_bytes": self.bytes, "written": self.written,
+                "avg_wait_ms": round(1000 * self.total_wait / self.written, 3) if self.written else 0,
+                "max_wait_ms": round(1000 * self.max_wait, 3)}
+
+
+class _Port:
+    def __init__(self, name, baudrate):
+        self.name = name
+        self.serial = serial.Serial(name, baudrate, timeout=0, exclusive=True)
+        self.fd = self.serial.fileno()
+        self.out = bytearray()  # the chunk being written; never interleaved
+        self.lanes = {lane: _Lane() for lane in LANES}
+        self.subscribers = set()
+        self.owner = None
+        self.waiting = collections.deque()
+        self.last_used = time.monotonic()
+
+
+class _Client:
+    def __init__(self, sock):
+        self.sock = sock
+        self.decoder = Decoder()
+        self.out = bytearray()
+
+
+class Broker:
+    """Single-threaded, selector-driven owner of all serial ports."""
+
+    def __init__(self, path=SOCKET_PATH):
+        self.path = path
+        self.selector = selectors.DefaultSelector()
+        self.ports = {}
+        self.clients = set()
+
+    def serve_forever(self):
+        """Listen on ``path`` until killed; refuses to start beside a running broker."""
+        if broker_running(self.path):
+            raise OSError(errno.EADDRINUSE, f"a broker is already listening on {self.path}")
+        if os.path.exists(self.path):  # left behind by a broker that was killed
+            os.unlink(self.path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        os.chmod(self.path, 0o660)
+        listener.listen()
+        listener.setblocking(False)
+        self.selector.register(listener, selectors.EVENT_READ, self._accept)
+        try:
+            while True:
+                for key, events in self.selector.select(timeout=5):
+                    key.data(key.fileobj, events)
+                self._close_idle_ports()
+        finally:
+            listener.close()
+            os.unlink(self.path)
+
+    # -- clients -------------------------------------------------------------
+
+    def _accept(self, listener, events):
+        sock, _ = listener.accept()
+        sock.setblocking(False)
+        client = _Client(sock)
+        self.clients.add(client)
+        self.selector.register(sock, selectors.EVENT_READ, lambda s, e: self._client_event(client, e))
+
+    def _client_event(self, client, events):
+        if events & selectors.EVENT_WRITE:
+            self._flush(client)
+        if events & selectors.EVENT_READ:
+            try:
+                data = client.sock.recv(65536)
+            except BlockingIOError:
+                return
+            except OSError:
+                data = b""
+            if not data:
+                self._drop(client)
+                return
+            try:
+                messages = list(client.decoder.feed(data))
+            except ValueError as e:
+                self._send(client, {"ok": False, "error": f"bad frame: {e}"})
+                self._drop(client)
+                return
+            for header, payload in messages:
+                if client not in self.clients:
+                    break
+                try:
+                    self._handle(client, header, payload)
+                except (ValueError, KeyError) as e:
+                    self._send(client, {"ok": False, "error": f"bad request: {e}"})
+
+    def _send(self, client, header, payload=b""):
+        if client not in self.clients:
+            return
+        client.out += encode(header, payload)
+        if len(client.out) > MAX_CLIENT_BACKLOG:
+            self._drop(client)
+            return
+        self._flush(client)
+
+    def _flush(self, client):
+        try:
+            sent = client.sock.send(client.out)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._drop(client)
+            return
+        del client.out[:sent]
+        self.selector.modify(client.sock, selectors.EVENT_READ | (selectors.EVENT_WRITE if client.out else 0),
+                             self.selector.get_key(client.sock).data)
+
+    def _drop(self, client):
+        if client not in self.clients:
+            return
+        self.clients.discard(client)
+        self.selector.unregister(client.sock)
+        client.sock.close()
+        for port in list(self.ports.values()):
+            port.subscribers.discard(client)
+            if client in port.waiting:
+                port.waiting.remove(client)
+            if port.owner is client:
+                self._release(port)
+
+    # -- requests ------------------------------------------------------------
+
+    def _handle(self, client, header, payload):
+        op = header["op"]
+        if op == "status":
+            self._send(client, {"op": op, "ok": True, "ports": [
+                {"port": p.name, "baudrate": p.serial.baudrate, "leased": p.owner is not None,
+                 "waiting": len(p.waiting), "subscribers": len(p.subscribers),
+                 "lanes": {lane: q.stats() for lane, q in p.lanes.items()}} for p in self.ports.values()]})
+            return
+        name = header["port"]
+        if op == "open":
+            try:
+                port = self._open(name, int(header.get("baudrate") or 115200))
+            except (serial.SerialException, ValueError) as e:
+                self._send(client, {"op": op, "ok": False, "error": str(e)})
+                return
+            self._send(client, {"op": op, "ok": True, "baudrate": port.serial.baudrate})
+            return
+        port = self.ports.get(name)
+        if port is None:
+            self._send(client, {"op": "error" if op == "write" else op, "ok": False, "error": f"{name} is not open"})
+            return
+        port.last_used = time.monotonic()
+        if op == "write":
+            self._enqueue(port, client, payload, header.get("lane"))
+        elif op == "subscribe":
+            port.subscribers.add(client)
+            self._send(client, {"op": op, "ok": True})
+        elif op == "lease":
+            if port.owner is None:
+                port.owner = client
+            elif port.owner is not client:
+                port.waiting.append(client)
+                return
+            self._send(client, {"op": op, "ok": True})
+        elif op == "release":
+            if port.owner is client:
+                self._release(port)
+            self._send(client, {"op": op, "ok": True})
+        elif op == "configure" and "low_latency" in header:
+            # Only affects latency, never the data, so no lease is needed.
+            try:
+                port.serial.set_low_latency_mode(bool(header["low_latency"]))
+            except (ValueError, NotImplementedError) as e:
+                self._send(client, {"op": op, "ok": False, "error": str(e)})
+                return
+            self._send(client, {"op": op, "ok": True})
+        elif op == "configure":
+            if port.owner not in (None, client):
+                self._send(client, {"op": op, "ok": False, "error": f"{name} is leased"})
+                return
+            port.serial.baudrate = int(header["baudrate"])
+            self._send(client, {"op": op, "ok": True})
+        else:
+            self._send(client, {"op": op, "ok": False, "error": f"unknown op {op!r}"})
+
+    def _enqueue(self, port, client, data, lane=None):
+        if lane is not None and lane not in LANES:
+            raise ValueError(f"unknown lane {lane!r}")
+        if lane is None:
+            lane = "bulk" if port.owner is client else "interactive"
+        elif lane == "bulk" and port.owner not in (None, client):
+            lane = "interactive"
+        if lane == "bulk":
+            for i in range(0, len(data), BULK_CHUNK):
+                port.lanes[lane].push(data[i:i + BULK_CHUNK])
+        else:
+            port.lanes[lane].push(data)
+        self._write_port(port)
+
+    def _release(self, port):
+        port.owner = None
+        while port.waiting and port.owner is None:
+            client = port.waiting.popleft()
+            if client in self.clients:
+                port.owner = client
+                self._send(client, {"op": "lease", "ok": True})
+
+    # -- ports ---------------------------------------------------------------
+
+    def _open(self, name, baudrate):
+        port = self.ports.get(name)
+        if port is None:
+            port = self.ports[name] = _Port(name, baudrate)
+            self.selector.register(port.fd, selectors.EVENT_READ, lambda fd, e: self._port_event(port, e))
+        elif port.owner is None and port.serial.baudrate != baudrate:
+            port.serial.baudrate = baudrate
+        return port
+
+    def _port_event(self, port, events):
+        if events & selectors.EVENT_WRITE:
+            self._write_port(port)
+        if events & selectors.EVENT_READ:
+            try:
+                data = os.read(port.fd, 65536)
+            except BlockingIOError:
+                return
+            except OSError:
+                data = b""
+            if not data:  # readable but empty: the device went away
+                self._close_port(port)
+                return
+            for client in list(port.subscribers):
+                self._send(client, {"op": "data"}, data)
+
+    def _write_port(self, port):
+        while True:
+            if not port.out:
+                lane = next((q for q in port.lanes.values() if q.chunks), None)
+                if lane is None:
+                    break
+                port.out = lane.pop()
+            try:
+                written = os.write(port.fd, port.out)
+            except BlockingIOError:
+                written = 0
+            except OSError:
+                self._close_port(port)
+                return
+            del port.out[:written]
+            if port.out:
+                break
+        self.selector.modify(port.fd, selectors.EVENT_READ | (selectors.EVENT_WRITE if port.out else 0),
+                             self.selector.get_key(port.fd).data)
+
+    def _close_port(self, port):
+        self.selector.unregister(port.fd)
+        port.serial.close()
+        del self.ports[port.name]
+        for client in port.subscribers | {port.owner} - {None}:
+            self._send(client, {"op": "closed", "port": port.name})
+
+    def _close_idle_ports(self):
+        now = time.monotonic()
+        for port in list(self.ports.values()):
+            if port.owner is None and not port.subscribers and now - port.last_used > PORT_IDLE_TIMEOUT:
+                self._close_port(port)
+
+
+class BrokerSerial:
+    """pyserial-style handle on a port owned by the broker.
+
+    By default the handle holds the port's exclusive lease from open to
+    ``close()``, so it can stand in for ``serial.Serial`` in ``RawRepl``.
+    """
+
+    def __init__(self, port, baudrate=115200, timeout=None, lease=True, path=SOCKET_PATH):
+        self.port = port
+        self.timeout = timeout
+        self.buffer = bytearray()
+        self.ready = threading.Condition()
+        self.replies = queue.Queue()
+        self.request_lock = threading.Lock()
+        self.error = None
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.is_open = True
+        threading.Thread(target=self._reader, name=f"broker-{port}", daemon=True).start()
+        try:
+            self._baudrate = self._request(op="open", port=port, baudrate=baudrate)["baudrate"]
+            self._request(op="subscribe", port=port)
+            if lease:
+                self._request(op="lease", port=port, timeout=LEASE_TIMEOUT)
+        except BaseException:
+            self.close()
+            raise
+
+    def _reader(self):
+        decoder = Decoder()
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except OSError:
+                data = b""
+            if not data:
+                break
+            for header, payload in decoder.feed(data):
+                if header.get("op") == "data":
+                    with self.ready:
+                        self.buffer += payload
+                        self.ready.notify_all()
+                elif header.get("op") in ("error", "closed"):
+                    self.error = header.get("error") or f"{self.port} was closed"
+                else:
+                    self.replies.put(header)
+        self.is_open = False
+        self.error = self.error or "connection to broker lost"
+        with self.ready:
+            self.ready.notify_all()
+        self.replies.put({"ok": False, "error": self.error})
+
+    def _request(self, timeout=None, **header):
+        with self.request_lock:
+            self.sock.sendall(encode(header))
+            try:
+                reply = self.replies.get(timeout=timeout)
+            except queue.Empty:
+                raise serial.SerialException(f"Timed out waiting for {header['op']} on {self.port}") from None
+        if not reply.get("ok"):
+            raise serial.SerialException(reply.get("error"))
+        return reply
+
+    @property
+    def baudrate(self):
+        return self._baudrate
+
+    @baudrate.setter
+    def baudrate(self, value):
+        self._request(op="configure", port=self.port, baudrate=value)
+        self._baudrate = value
+
+    def set_low_latency_mode(self, low_latency_settings):
+        try:
+            self._request(op="configure", port=self.port, low_latency=bool(low_latency_settings))
+        except serial.SerialException as e:
+            raise ValueError(str(e)) from None
+
+    def hung_up(self):
+        """Return whether the broker closed the port (unplugged) or went away."""
+        return not self.is_open or self.error is not None
+
+    @property
+    def in_waiting(self):
+        return len(self.buffer)
+
+    def read(self, size=1):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self.ready:
+            while len(self.buffer) < size and self.is_open:
+                left = None if deadline is None else deadline - time.monotonic()
+                if left is not None and left <= 0:
+                    break
+                self.ready.wait(left)
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+        if not data and self.error:
+            raise serial.SerialException(self.error)
+        return data
+
+    def read_available_into(self, buffer):
+        """Move up to ``len(buffer)`` received bytes into ``buffer``, waiting up to ``timeout`` for the first."""
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self.ready:
+            while not self.buffer and self.is_open:
+                left = None if deadline is None else deadline - time.monotonic()
+                if left is not None and left <= 0:
+                    break
+                self.ready.wait(left)
+            count = min(len(buffer), len(self.buffer))
+            buffer[:count] = memoryview(self.buffer)[:count]
+            del self.buffer[:count]
+        if not count and self.error:
+            raise serial.SerialException(self.error)
+        return count
+
+    def write(self, data, lane=None):
+        """Queue ``data`` on the port; ``lane`` overrides the broker's choice of priority.
+
+        Writes without an override stay in order: ``bulk`` for the lease
+        holder, ``interactive`` for everyone else.
+        """
+        if self.error:
+            raise serial.SerialException(self.error)
+        header = {"op": "write", "port": self.port}
+        if lane is not None:
+            header["lane"] = lane
+        self.sock.sendall(encode(header, data))
+        return len(data)
+
+    def write_control(self, data):
+        """Write ``data``, e.g. Ctrl-C, at the next chunk boundary, ahead of every queued write."""
+        return self.write(data, lane="control")
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        with self.ready:
+            self.buffer.clear()
+
+    def close(self):
+        # The broker releases the lease and unsubscribes when we disconnect.
+        # shutdown() first: a bare close() does not wake the reader's recv().
+        self.is_open = False
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def broker_running(path=SOCKET_PATH):
+    """Return whether a broker is listening on ``path``.
+
+    The socket file alone proves nothing: a broker killed without cleanup
+    leaves it behind, refusing connections.
+    """
+    if not os.path.exists(path):
+        return False
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            return False
+    return True
+
+
+def broker_status(path=SOCKET_PATH, timeout=5):
+    """Return the ports a running broker holds, with per-lane queue statistics."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(encode({"op": "status"}))
+        decoder = Decoder()
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                raise ConnectionError("broker closed the connection")
+            for header, _ in decoder.feed(data):
+                return header["ports"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m board_manager.broker",
+                                     description="Own all board serial ports and share them over a Unix socket.")
+    parser.add_argument("--socket", default=SOCKET_PATH, help=f"socket path (default: {SOCKET_PATH})")
+    parser.add_argument("--status", action="store_true", help="print the ports a running broker holds")
+    args = parser.parse_args(argv)
+    if args.status:
+        print(json.dumps(broker_status(args.socket), indent=2))
+        return
+    # Exit through serve_forever's cleanup, which removes the socket, on kill too.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        Broker(args.socket).serve_forever()
+    except OSError as e:
+        sys.exit(f"broker: {e}")
+
+
+if __name__ == "__main__":
+    main()
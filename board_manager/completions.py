@@ -0,0 +1,141 @@
+"""REPL tab-completion candidates, cached per board firmware.
+
+``dir()`` of a module only changes with the firmware, so candidates are kept
+in memory and on disk under the firmware's boot banner. The board is never
+taken over to look them up: the REPL hub shows this cache every line of
+board output, which is how it learns a board's banner, and a Tab that misses
+the cache goes to the board's own completion, whose printed candidate list
+is then stored. Later lookups for any board running the same build need no
+round trip. A serial board that booted before its hub was reading is asked
+for ``os.uname()`` once instead (``identify``).
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from .connections import board_link, resolve
+from .raw_repl import RawReplError
+
+CACHE_DIR = os.environ.get("BOARD_MANAGER_COMPLETIONS",
+                           os.path.join(os.path.expanduser("~"), ".cache", "board_manager", "completions"))
+CAPTURE_SECONDS = 2  # how long after a missed lookup the board's candidate list is expected
+
+BANNER = re.compile(r"MicroPython (\S.*? on [^;]+; .+?)\s*$")  # also Pycom's "1.20.2.r4 [v1.11-ffb0e1c] on ..."
+DOTTED_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*")
+PROMPTS = (">>> ", "... ")
+
+# Runs on the board: the fields its boot banner is made of.
+UNAME_SCRIPT = "import os\nu = os.uname()\nprint(u.release, u.version, u.machine, sep='\\t')\n"
+
+
+def uname_firmware(release, version, machine):
+    """Return the firmware key ``BANNER`` would capture for these ``os.uname()`` fields."""
+    if version.startswith("v" + release):
+        return f"{version}; {machine}"
+    # Pycom: release "1.20.2.r4", version "v1.11-ffb0e1c on 2021-01-12".
+    tag, _, built = version.partition(" on ")
+    return f"{release} [{tag}] on {built}; {machine}"
+
+
+class CompletionCache:
+    """``dir()`` results keyed by firmware and dotted name.
+
+    Cached names are what the board lists for ``name.`` with nothing typed
+    after the dot, so like the board's own completion they leave out names
+    starting with ``_``.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.firmware = {}  # board -> firmware key, from the last banner it printed
+        self.entries = {}  # firmware key -> {dotted name: [names]}
+        self.captures = {}  # board -> (name, expires, lines) awaiting the board's candidate list
+        self.lock = threading.Lock()
+
+    def _path(self, firmware):
+        return os.path.join(self.cache_dir, hashlib.sha256(firmware.encode()).hexdigest()[:16] + ".json")
+
+    def _load(self, firmware):
+        if firmware not in self.entries:
+            try:
+                with open(self._path(firmware)) as f:
+                    self.entries[firmware] = json.load(f)["names"]
+            except (OSError, ValueError, KeyError):
+                self.entries[firmware] = {}
+        return self.entries[firmware]
+
+    def _save(self, firmware):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = self._path(firmware) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"firmware": firmware, "names": self.entries[firmware]}, f)
+        os.replace(tmp, self._path(firmware))
+
+    def identify(self, connection):
+        """Ask a serial board for its firmware if no banner has given it away yet.
+
+        Returns whether the board was asked: that goes through the raw REPL,
+        which drops the line being typed at the prompt.
+        """
+        target = resolve(connection)
+        board = target.get("port") or target.get("address")
+        if target.get("type") != "serial" or board in self.firmware:
+            return False
+        try:
+            with board_link(connection) as repl:
+                fields = repl.exec(UNAME_SCRIPT, timeout=5).decode(errors="replace").strip().split("\t")
+        except (RawReplError, OSError):
+            return True
+        if len(fields) == 3:
+            with self.lock:
+                self.firmware.setdefault(board, uname_firmware(*fields))
+        return True
+
+    def lookup(self, connection, name, learn=False):
+        """Return ``(firmware, names)`` for the attributes of ``name``; ``names`` is ``None`` on a miss.
+
+        With ``learn``, the candidate list the board prints for the Tab the
+        caller sends next is cached.
+        """
+        if not DOTTED_NAME.fullmatch(name):
+            raise ValueError(f"Not a dotted name: {name!r}")
+        target = resolve(connection)
+        board = target.get("port") or target.get("address")
+        with self.lock:
+            firmware = self.firmware.get(board)
+            if firmware is not None and name in self._load(firmware):
+                return firmware, self.entries[firmware][name]
+            if learn and firmware is not None:
+                self.captures[board] = (name, time.monotonic() + CAPTURE_SECONDS, [])
+        return firmware, None
+
+    def observe(self, board, lines, partial):
+        """Follow a board's output: its completed ``lines`` and the ``partial`` line after them."""
+        for line in lines:
+            if "MicroPython" in line and (match := BANNER.search(line)):
+                with self.lock:
+                    self.firmware[board] = match[1]
+        if board not in self.captures:
+            return
+        with self.lock:
+            name, expires, captured = self.captures.get(board, (None, 0, None))
+            if time.monotonic() > expires:
+                self.captures.pop(board, None)
+                return
+            captured += lines
+            # The board answers a Tab with several matches by ending the typed
+            # line, listing the candidates and printing the prompt again.
+            if len(captured) < 2 or not partial.startswith(PROMPTS):
+                return
+            del self.captures[board]
+            firmware = self.firmware.get(board)
+            if firmware is None or not captured[0].endswith(name + "."):
+                return
+            self._load(firmware)[name] = sorted(word for line in captured[1:] for word in line.split())
+            self._save(firmware)
+
+
+completions = CompletionCache()
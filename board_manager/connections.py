@@ -0,0 +1,289 @@
+"""Board links: one-shot connections and long-lived, reusable sessions."""
+import collections
+import contextlib
+import ftplib
+import secrets
+import threading
+import time
+
+from . import baudrate, serial_io
+from .broker import BrokerSerial, broker_running
+from .raw_repl import RawRepl, RawReplError
+
+FTP_TIMEOUT = 10
+IDLE_TIMEOUT = 300  # seconds before an unused session is closed
+KEEPALIVE_INTERVAL = 30
+
+
+class SessionError(Exception):
+    """Raised for unknown, expired or closed session handles."""
+
+
+def open_serial(connection, lease=True):
+    """Open the serial port described by a ``connection`` payload.
+
+    When a port broker is running the port is leased from it instead, so
+    several worker processes never open the same device directly. Pass
+    ``lease=False`` to share the port with leaseholders (e.g. a REPL view).
+    A board a session has moved to a faster rate is opened at that rate.
+    """
+    rate = baudrate.active.get(connection["port"]) or int(connection.get("baudrate") or 115200)
+    if broker_running():
+        try:
+            return BrokerSerial(connection["port"], rate, timeout=0.1, lease=lease)
+        except (ConnectionRefusedError, FileNotFoundError):
+            pass  # the broker stopped since the check; open the port directly
+    return serial_io.Serial(connection["port"], rate, timeout=0.1)
+
+
+class PortShares:
+    """Other in-process readers of a local port, paused while a ``RawRepl`` drives it.
+
+    Without a broker the REPL hub and a session each open their own fd on the
+    same tty, and the kernel hands every byte to whichever reads first. The
+    hub registers here; ``hold(port)`` pauses its reads and holds its viewers'
+    input for as long as the raw REPL is in use.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.readers = {}  # port -> object with hold(), release() and retune(rate)
+        self.holds = collections.Counter()
+
+    def register(self, port, reader):
+        """Share ``port`` with ``reader``, holding it at once if the port is in use."""
+        with self.lock:
+            self.readers[port] = reader
+            if self.holds[port]:
+                reader.hold()
+
+    def retune(self, port, rate):
+        """Tell ``port``'s other reader that the board now runs at ``rate``."""
+        with self.lock:
+            reader = self.readers.get(port)
+        if reader is not None:
+            reader.retune(rate)
+
+    def unregister(self, port, reader):
+        with self.lock:
+            if self.readers.get(port) is reader:
+                del self.readers[port]
+
+    @contextlib.contextmanager
+    def hold(self, port):
+        with self.lock:
+            self.holds[port] += 1
+            if self.holds[port] == 1 and port in self.readers:
+                self.readers[port].hold()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.holds[port] -= 1
+                if not self.holds[port]:
+                    del self.holds[port]
+                    if port in self.readers:
+                        self.readers[port].release()
+
+
+shares = PortShares()
+
+
+def open_ftp(connection):
+    """Log in to the board's FTP server described by a ``connection`` payload."""
+    return ftplib.FTP(connection["address"], connection.get("username", "micro"),
+                      connection.get("password", "python"), timeout=FTP_TIMEOUT)
+
+
+class BoardSession:
+    """An open board connection reused across API calls until closed or idle."""
+
+    def __init__(self, connection):
+        self.id = secrets.token_urlsafe(12)
+        self.connection = connection
+        self.lock = threading.RLock()
+        self.port = self.repl = self.ftp = None
+        self.safe_baudrate = None
+        self.micropython = None  # the board's MicroPython version, once transfer.board_micropython asks
+        if connection.get("type") == "serial":
+            self.port = open_serial(connection)
+            self.repl = RawRepl(self.port)
+            if connection.get("negotiate"):
+                with shares.hold(connection["port"]):
+                    self._escalate()
+        else:
+            self.ftp = open_ftp(connection)
+        self.created = self.last_used = time.monotonic()
+
+    def _escalate(self):
+        """Move the link to the fastest rate the board passes; see ``baudrate``."""
+        self.safe_baudrate = self.port.baudrate
+        port = self.connection["port"]
+        try:
+            rate = baudrate.negotiate(self.repl, baudrate.board_id(port))
+        except (RawReplError, OSError):
+            self.port.close()
+            raise
+        # Links that resolve this session, and any other open_serial() of the
+        # port until close() restores the safe rate, now use this rate.
+        self.connection = dict(self.connection, baudrate=rate)
+        if rate != self.safe_baudrate:
+            baudrate.active[port] = rate
+            shares.retune(port, rate)
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+    def keepalive(self):
+        """Exercise the link unless a request is using it; raise if it is dead.
+
+        A serial port is asked whether its device hung up, which catches an
+        unplugged board; talking to the board itself would mean entering the
+        raw REPL, which interrupts whatever program it is running.
+        """
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            if self.ftp:
+                self.ftp.voidcmd("NOOP")
+            elif not self.port.is_open:
+                raise SessionError(f"{self.connection['port']} was closed")
+            elif getattr(self.port, "hung_up", lambda: False)():
+                raise SessionError(f"{self.connection['port']} was unplugged")
+        finally:
+            self.lock.release()
+
+    def close(self):
+        with self.lock:
+            if self.ftp:
+                try:
+                    self.ftp.quit()
+                except (OSError, ftplib.Error):
+                    self.ftp.close()
+            else:
+                port = self.connection["port"]
+                if self.safe_baudrate and self.port.baudrate != self.safe_baudrate:
+                    with shares.hold(port), contextlib.suppress(RawReplError, OSError):
+                        baudrate.restore(self.repl, self.safe_baudrate)
+                        baudrate.active.pop(port, None)
+                        shares.retune(port, self.safe_baudrate)
+                self.port.close()
+
+    def info(self):
+        target = self.connection.get("port") if self.port else self.connection.get("address")
+        info = {"id": self.id, "type": "serial" if self.port else "wifi", "target": target,
+                "idle_seconds": round(time.monotonic() - self.last_used, 1)}
+        if self.port:
+            info["baudrate"] = self.port.baudrate
+        return info
+
+
+class SessionRegistry:
+    """Process-wide table of open sessions with idle reaping and keepalives."""
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, keepalive_interval=KEEPALIVE_INTERVAL):
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.reaper = None
+
+    def open(self, connection):
+        session = BoardSession(connection)
+        with self.lock:
+            self.sessions[session.id] = session
+            if self.reaper is None:
+                self.reaper = threading.Thread(target=self._reap, name="session-reaper", daemon=True)
+                self.reaper.start()
+        return session
+
+    def get(self, session_id):
+        try:
+            return self.sessions[session_id]
+        except KeyError:
+            raise SessionError(f"Unknown or expired session {session_id!r}") from None
+
+    def close(self, session_id):
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+        if session is None:
+            raise SessionError(f"Unknown or expired session {session_id!r}")
+        session.close()
+
+    def list(self):
+        return [s.info() for s in list(self.sessions.values())]
+
+    def _expire(self, session, idle):
+        """Close ``session`` unless a request holds it or, when ``idle``, it was used since."""
+        if not session.lock.acquire(blocking=False):
+            return  # busy: look again on the next round
+        try:
+            if idle and time.monotonic() - session.last_used <= self.idle_timeout:
+                return
+            with self.lock:
+                if self.sessions.get(session.id) is not session:
+                    return
+                del self.sessions[session.id]
+            session.close()
+        finally:
+            session.lock.release()
+
+    def _reap(self):
+        while True:
+            time.sleep(self.keepalive_interval)
+            for session in list(self.sessions.values()):
+                idle = time.monotonic() - session.last_used > self.idle_timeout
+                if not idle:
+                    try:
+                        session.keepalive()
+                        continue
+                    except (SessionError, OSError, ftplib.Error):
+                        pass
+                self._expire(session, idle)
+
+
+sessions = SessionRegistry()
+
+
+def resolve(connection):
+    """Return the credentials behind ``connection``, following session handles."""
+    if "session" in connection:
+        return sessions.get(connection["session"]).connection
+    return connection
+
+
+@contextlib.contextmanager
+def board_link(connection):
+    """Yield a ``RawRepl`` (serial) or ``ftplib.FTP`` (WiFi) for ``connection``.
+
+    ``{"session": id}`` borrows that session's open link for the duration,
+    holding its lock; any other payload opens a fresh link and closes it after.
+    A serial board's REPL hub stays paused while the raw REPL is in use.
+    """
+    if "session" in connection:
+        session = sessions.get(connection["session"])
+        with session.lock:
+            session.touch()
+            try:
+                if session.repl:
+                    with shares.hold(session.connection["port"]):
+                        session.repl.enter()
+                        try:
+                            yield session.repl
+                        finally:
+                            session.repl.exit()
+                else:
+                    yield session.ftp
+            finally:
+                session.touch()
+    elif connection.get("type") == "serial":
+        with open_serial(connection) as port, shares.hold(connection["port"]):
+            repl = RawRepl(port)
+            repl.enter()
+            try:
+                yield repl
+            finally:
+                repl.exit()
+    else:
+        with open_ftp(connection) as ftp:
+            yield ftp
@@ -0,0 +1,184 @@
+"""Full-text index of board console output across the fleet.
+
+Hubs hand every completed output line to ``console.add``; a writer thread
+batches them into SQLite, with an FTS5 table over the text, so queries such
+as "which boards printed ``OSError: [Errno 28]`` last week" come back with
+board, time and the surrounding lines without scanning any recording.
+"""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from .recorder import RECORDINGS_DIR
+
+INDEX_PATH = os.environ.get("BOARD_MANAGER_CONSOLE_INDEX", os.path.join(RECORDINGS_DIR, "console.sqlite3"))
+BATCH_LINES = 1000  # lines per transaction ...
+BATCH_SECONDS = 0.5  # ... or how long a line may wait to be indexed
+PENDING_LINES = 100000
+RETRY_SECONDS = 5  # wait after a failed write before trying the same batch again
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lines (id INTEGER PRIMARY KEY, board TEXT NOT NULL, time REAL NOT NULL,
+                                  text TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS lines_board ON lines (board);
+CREATE INDEX IF NOT EXISTS lines_time ON lines (time);
+CREATE VIRTUAL TABLE IF NOT EXISTS lines_fts USING fts5 (text, content='lines', content_rowid='id');
+"""
+
+
+def connect(path):
+    db = sqlite3.connect(path, timeout=30)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+def phrase(query):
+    """Quote free text as one FTS5 phrase, so punctuation like ``:`` or ``[`` is not syntax."""
+    return '"' + query.replace('"', '""') + '"'
+
+
+class ConsoleIndex:
+    """Indexes console lines in the background and answers searches."""
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self.pending = queue.Queue(maxsize=PENDING_LINES)
+        self.dropped = 0
+        self.writer = None
+        self.created = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Start the writer thread, which opens the database itself."""
+        with self.lock:
+            if self.writer is not None:
+                return
+            self.writer = threading.Thread(target=self._write_loop, name="console-index", daemon=True)
+            self.writer.start()
+
+    def _create(self):
+        """Create the database, its schema and WAL mode, once per index."""
+        with self.lock:
+            if self.created:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            db = connect(self.path)
+            try:
+                db.executescript(SCHEMA)
+            finally:
+                db.close()
+            self.created = True
+
+    def _open(self):
+        """Open the writer's connection."""
+        self._create()
+        return connect(self.path)
+
+    def _read(self):
+        """Open a connection for one query; WAL mode is kept in the file, so no pragmas."""
+        self._create()
+        return sqlite3.connect(self.path, timeout=30)
+
+    def add(self, board, lines, when=None):
+        """Queue completed output ``lines`` of ``board`` for indexing; never raises.
+
+        Hubs call this from their read loop, so a broken index must not take
+        the board's REPL down with it.
+        """
+        if not lines:
+            return
+        try:
+            self.start()
+        except RuntimeError as e:  # no thread to spare
+            with self.lock:
+                self.writer = None
+            log.warning("console index writer did not start: %s", e)
+        when = time.time() if when is None else when
+        for line in lines:
+            try:
+                self.pending.put_nowait((board, when, line))
+            except queue.Full:  # the disk cannot keep up; never stall a board
+                self.dropped += 1
+
+    def _next_batch(self):
+        batch = [self.pending.get()]
+        deadline = time.monotonic() + BATCH_SECONDS
+        while len(batch) < BATCH_LINES:
+            try:
+                batch.append(self.pending.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_loop(self):
+        db = None
+        batch = None
+        while True:
+            if batch is None:
+                batch = self._next_batch()
+            try:
+                if db is None:
+                    db = self._open()
+                with db:
+                    for board, when, text in batch:
+                        rowid = db.execute("INSERT INTO lines (board, time, text) VALUES (?, ?, ?)",
+                                           (board, when, text)).lastrowid
+                        db.execute("INSERT INTO lines_fts (rowid, text) VALUES (?, ?)", (rowid, text))
+            except (sqlite3.Error, OSError) as e:
+                # A full disk or a locked or damaged file: keep the batch and
+                # try again, while add() queues (or drops) what arrives meanwhile.
+                log.warning("console index write failed, retrying in %s s: %s", RETRY_SECONDS, e)
+                if db is not None:
+                    db.close()
+                    db = None
+                time.sleep(RETRY_SECONDS)
+                continue
+            batch = None
+
+    def search(self, query, board=None, since=None, until=None, limit=50, context=2, raw=False):
+        """Return the newest lines matching ``query``, each with ``context`` lines either side.
+
+        ``query`` is matched as a phrase unless ``raw`` is set, in which case
+        it is passed to FTS5 as is (``AND``, ``OR``, ``NEAR``, prefixes...).
+        """
+        sql = ["SELECT lines.id, lines.board, lines.time, lines.text FROM lines_fts",
+               "JOIN lines ON lines.id = lines_fts.rowid WHERE lines_fts MATCH ?"]
+        args = [query if raw else phrase(query)]
+        for clause, value in (("lines.board = ?", board), ("lines.time >= ?", since), ("lines.time <= ?", until)):
+            if value is not None:
+                sql.append("AND " + clause)
+                args.append(value)
+        sql.append("ORDER BY lines.time DESC, lines.id DESC LIMIT ?")
+        args.append(limit)
+        db = self._read()
+        try:
+            hits = db.execute(" ".join(sql), args).fetchall()
+            return [{"board": hit_board, "time": when, "line": text,
+                     "before": [row[0] for row in reversed(db.execute(
+                         "SELECT text FROM lines WHERE board = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                         (hit_board, rowid, context)).fetchall())],
+                     "after": [row[0] for row in db.execute(
+                         "SELECT text FROM lines WHERE board = ? AND id > ? ORDER BY id LIMIT ?",
+                         (hit_board, rowid, context)).fetchall()]}
+                    for rowid, hit_board, when, text in hits]
+        finally:
+            db.close()
+
+    def boards(self):
+        """Return every indexed board with its line count and time span."""
+        db = self._read()
+        try:
+            rows = db.execute("SELECT board, COUNT(*), MIN(time), MAX(time) FROM lines GROUP BY board ORDER BY board")
+            return [{"board": board, "lines": count, "start": first, "end": last}
+                    for board, count, first, last in rows]
+        finally:
+            db.close()
+
+
+console = ConsoleIndex()
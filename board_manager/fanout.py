@@ -0,0 +1,76 @@
+"""Concurrent deploys to many boards with per-hub and per-subnet limits."""
+import ipaddress
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .connections import resolve
+from .ports import registry
+from .transfer import upload_files
+
+MAX_WORKERS = 16
+PER_HUB = 2
+PER_SUBNET = 4
+
+
+def usb_hubs():
+    """Map each serial device to the USB hub it hangs off (from its sysfs location)."""
+    hubs = {}
+    for port in registry.list():
+        if port["location"]:
+            hubs[port["device"]] = port["location"].split(":")[0].rsplit(".", 1)[0]
+    return hubs
+
+
+def target_group(connection, hubs):
+    """Return the shared-bandwidth group a target belongs to.
+
+    WiFi boards given by name (``mypycom.local``) are grouped by the /24 the
+    name resolves to, or by the name itself if it does not resolve.
+    """
+    connection = resolve(connection)
+    if connection.get("type") == "serial":
+        return "hub:" + hubs.get(connection["port"], connection["port"])
+    try:
+        address = socket.gethostbyname(connection["address"])
+    except OSError:  # the upload itself reports an unreachable name
+        return "host:" + connection["address"]
+    return "net:" + str(ipaddress.ip_network(f"{address}/24", strict=False))
+
+
+def target_name(connection):
+    """Return the port or address identifying a target in results."""
+    connection = resolve(connection)
+    return connection.get("port") if connection.get("type") == "serial" else connection.get("address")
+
+
+def deploy(targets, files, max_workers=MAX_WORKERS, per_hub=PER_HUB, per_subnet=PER_SUBNET, **options):
+    """Upload ``files`` to every connection in ``targets`` concurrently.
+
+    At most ``per_hub`` serial boards behind the same USB hub and
+    ``per_subnet`` WiFi boards in the same /24 are written at once. Returns one
+    result dict per target, in the order given.
+    """
+    hubs = usb_hubs() if any(resolve(t).get("type") == "serial" for t in targets) else {}
+    groups = [target_group(connection, hubs) for connection in targets]
+    limits = {}
+    for group in groups:
+        if group not in limits:
+            limits[group] = threading.Semaphore(per_hub if group.startswith("hub:") else per_subnet)
+
+    def run(connection, group):
+        result = {"target": target_name(connection)}
+        with limits[group]:
+            start = time.monotonic()
+            try:
+                sent = upload_files(connection, files, **options)
+            except Exception as e:  # one bad board must not sink the whole rack
+                result.update(success=False, message=str(e))
+            else:
+                result.update(success=True, files=[{"name": name, "bytes_sent": n} for name, n in sent])
+            result["seconds"] = round(time.monotonic() - start, 3)
+        return result
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(targets) or 1)) as pool:
+        return list(pool.map(run, targets, groups))
@@ -0,0 +1,346 @@
+"""Framed binary file transfer over the raw REPL.
+
+``RawRepl.put_file`` streams a file as bare bytes: one corrupted or dropped
+byte leaves the board writing garbage or waiting forever. Here a small
+receiver script runs on the board and the host sends the file as numbered
+frames, each ``kind, seq, payload, CRC32`` and COBS-encoded so a zero byte
+always ends a frame. Up to ``window`` frames are in flight; the board acks
+every good frame, asks again (NAK) for gaps it notices, and the host resends
+only those frames, or any that stay unacked too long.
+"""
+import collections
+import struct
+import time
+import zlib
+
+from serial.threaded import Packetizer
+
+from .raw_repl import RawReplError, split_chunks
+from .serial_io import RING_BYTES, read_available_into
+
+# The frames in flight must fit the ~256 byte stdin buffer of small boards,
+# which fills while the board is busy writing flash.
+CHUNK_SIZE = 112  # payload bytes per frame; a frame is up to 124 bytes on the wire
+WINDOW = 2  # frames in flight
+MAX_RETRIES = 8  # sends of one frame before giving up
+STALL_TIMEOUT = 10  # seconds without an ack before giving up
+
+HEADER = struct.Struct("<BI")  # kind, sequence number
+CRC = struct.Struct("<I")
+SIZE = struct.Struct("<I")
+
+# Frame kinds; host to board:
+DATA = 1
+END = 2  # seq = number of data frames, payload = file size
+ABORT = 3
+# board to host:
+READY = 4
+ACK = 5
+NAK = 6
+DONE = 7
+FAIL = 8  # payload = the board's error message
+EXIT = 9  # the script's last output; the raw REPL's end markers follow
+
+# Runs on the board: receive frames from stdin into {path}, writing them in
+# order and holding at most {window} out-of-order frames.
+RECEIVE_SCRIPT = """\
+import sys, struct, micropython
+try:
+    from binascii import crc32
+except ImportError:
+    from ubinascii import crc32
+micropython.kbd_intr(-1)
+i = sys.stdin.buffer
+o = sys.stdout.buffer
+W = {window}
+pend = b''
+def enc(d):
+    r = bytearray(1)
+    c = 0
+    for b in d:
+        if b:
+            r.append(b)
+        else:
+            r[c] = len(r) - c
+            c = len(r)
+            r.append(0)
+    r[c] = len(r) - c
+    r.append(0)
+    return r
+def dec(d):
+    r = bytearray()
+    k = 0
+    n = len(d)
+    while k < n:
+        c = d[k]
+        if c == 0 or k + c > n:
+            return None
+        r += d[k + 1:k + c]
+        k += c
+        if c < 255 and k < n:
+            r.append(0)
+    return r
+def tx(kind, seq, p=b''):
+    b = struct.pack('<BI', kind, seq) + p
+    o.write(enc(b + struct.pack('<I', crc32(b) & 0xffffffff)))
+def get(n):
+    global pend
+    if pend:
+        d = pend[:n]
+        pend = pend[n:]
+        return d + i.read(n - len(d)) if len(d) < n else d
+    return i.read(n)
+def rx():
+    global pend
+    r = bytearray()
+    while True:
+        c = get(1)[0]
+        if c == 0:
+            return r
+        r.append(c)
+        if c > 1:
+            d = get(c - 1)
+            z = d.find(b'\\0')
+            if z >= 0:
+                pend = d[z + 1:] + pend
+                r += d[:z]
+                return r
+            r += d
+f = None
+try:
+    f = open({path!r}, 'wb')
+    tx({READY}, 0)
+    want = 0
+    held = {{}}
+    asked = set()
+    while True:
+        p = dec(rx())
+        if p is None or len(p) < 9 or crc32(p[:-4]) & 0xffffffff != struct.unpack('<I', p[-4:])[0]:
+            continue
+        k, s = struct.unpack_from('<BI', p)
+        d = p[5:-4]
+        if k == {DATA}:
+            asked.discard(s)
+            if s == want:
+                f.write(d)
+                want += 1
+                while want in held:
+                    f.write(held.pop(want))
+                    want += 1
+            elif s >= want + W:
+                continue
+            elif s > want:
+                held[s] = d
+                for m in range(want, s):
+                    if m not in held and m not in asked:
+                        asked.add(m)
+                        tx({NAK}, m)
+            tx({ACK}, s)
+        elif k == {END}:
+            if s == want:
+                f.close()
+                f = None
+                tx({DONE}, want)
+                break
+            tx({NAK}, want)
+        elif k == {ABORT}:
+            raise OSError('transfer aborted by host')
+except Exception as e:
+    tx({FAIL}, 0, repr(e)[:200].encode())
+    raise
+finally:
+    if f:
+        f.close()
+    tx({EXIT}, 0)
+    micropython.kbd_intr(3)
+"""
+
+
+def cobs_encode(data):
+    """COBS-encode ``data`` so the result contains no zero bytes."""
+    out = bytearray()
+    for piece in bytes(data).split(b"\0"):
+        while len(piece) >= 254:
+            out.append(255)
+            out += piece[:254]
+            piece = piece[254:]
+        out.append(len(piece) + 1)
+        out += piece
+    return bytes(out)
+
+
+def cobs_decode(data):
+    """Reverse ``cobs_encode``; raises ``ValueError`` on a malformed frame."""
+    out = bytearray()
+    i = 0
+    while i < len(data):
+        code = data[i]
+        if code == 0 or i + code > len(data):
+            raise ValueError("malformed COBS frame")
+        out += data[i + 1:i + code]
+        i += code
+        if code < 255 and i < len(data):
+            out.append(0)
+    return bytes(out)
+
+
+def pack_frame(kind, seq, payload=b""):
+    """Return one frame ready for the wire, terminator included."""
+    body = HEADER.pack(kind, seq) + bytes(payload)
+    return cobs_encode(body + CRC.pack(zlib.crc32(body))) + b"\0"
+
+
+def unpack_frame(packet):
+    """Return ``(kind, seq, payload)`` from a frame without its terminator."""
+    body = cobs_decode(packet)
+    if len(body) < HEADER.size + CRC.size or zlib.crc32(body[:-CRC.size]) != CRC.unpack(body[-CRC.size:])[0]:
+        raise ValueError("bad frame checksum")
+    kind, seq = HEADER.unpack_from(body)
+    return kind, seq, body[HEADER.size:-CRC.size]
+
+
+class FrameReader(Packetizer):
+    """Collects the board's frames; corrupted ones are counted and dropped.
+
+    After the ``EXIT`` frame the bytes are the raw REPL's again and are only
+    kept in ``buffer``.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.frames = collections.deque()
+        self.corrupt = 0
+        self.exited = False
+
+    def data_received(self, data):
+        self.buffer.extend(data)
+        while not self.exited and self.TERMINATOR in self.buffer:
+            packet, self.buffer = self.buffer.split(self.TERMINATOR, 1)
+            self.handle_packet(packet)
+
+    def handle_packet(self, packet):
+        try:
+            frame = unpack_frame(bytes(packet))
+        except ValueError:
+            self.corrupt += 1
+            return
+        if frame[0] == EXIT:
+            self.exited = True
+        else:
+            self.frames.append(frame)
+
+
+class FramedSender:
+    """Host side of one framed transfer to a running ``RECEIVE_SCRIPT``."""
+
+    def __init__(self, repl, chunks, window):
+        self.repl = repl
+        self.chunks = chunks
+        self.window = window
+        self.reader = FrameReader()
+        self.reader.data_received(repl.pending.take(len(repl.pending)))
+        self.sent = {}  # seq -> [last send time, sends]
+        self.acked = set()
+        self.retransmits = 0
+        self.exited = False
+        self.scratch = memoryview(bytearray(RING_BYTES))
+        frame_bytes = (len(chunks[0]) if chunks else 0) + 16
+        # A full window at the wire rate, with room for the board's flash writes.
+        self.resend_after = max(0.2, 3 * window * frame_bytes * 10 / getattr(repl.serial, "baudrate", 115200))
+
+    def poll(self):
+        """Read what the board sent and return its complete frames."""
+        count = read_available_into(self.repl.serial, self.scratch)
+        self.reader.data_received(self.scratch[:count])
+        frames = list(self.reader.frames)
+        self.reader.frames.clear()
+        if self.reader.exited and not self.exited:
+            # The raw REPL's end-of-output markers follow, with any traceback between them.
+            self.release()
+            self.exited = True
+            err = self.repl.follow()[1]
+            if err:
+                raise RawReplError(err.decode(errors="replace"))
+        for kind, _, payload in frames:
+            if kind == FAIL:
+                raise RawReplError(payload.decode(errors="replace"))
+        return frames
+
+    def send(self, seq):
+        entry = self.sent.setdefault(seq, [0, 0])
+        if entry[1] >= MAX_RETRIES:
+            raise RawReplError(f"Frame {seq} was not acknowledged after {MAX_RETRIES} sends")
+        if entry[1]:
+            self.retransmits += 1
+        entry[:] = [time.monotonic(), entry[1] + 1]
+        self.repl.serial.write(pack_frame(DATA, seq, self.chunks[seq]))
+
+    def run(self, size):
+        total = len(self.chunks)
+        base = following = 0
+        progress = time.monotonic()
+        while base < total:
+            while following < total and following < base + self.window:
+                self.send(following)
+                following += 1
+            frames = self.poll()
+            if self.exited:
+                raise RawReplError(f"Receiver exited after {base} of {total} frame(s)")
+            for kind, seq, _ in frames:
+                if kind == ACK and base <= seq < following:
+                    self.acked.add(seq)
+                    progress = time.monotonic()
+                elif kind == NAK and base <= seq < following and seq not in self.acked:
+                    self.send(seq)
+            while base in self.acked:
+                self.acked.discard(base)
+                self.sent.pop(base)
+                base += 1
+            now = time.monotonic()
+            for seq in range(base, following):
+                if seq not in self.acked and now - self.sent[seq][0] > self.resend_after:
+                    self.send(seq)
+            if now - progress > STALL_TIMEOUT:
+                raise RawReplError(f"Board stopped acknowledging after {base} of {total} frame(s)")
+        end_sent = 0
+        while True:
+            if time.monotonic() - end_sent > self.resend_after:
+                self.repl.serial.write(pack_frame(END, total, SIZE.pack(size)))
+                end_sent = time.monotonic()
+            # A lost DONE still shows as the script ending cleanly.
+            if any(kind == DONE for kind, _, _ in self.poll()) or self.exited:
+                return
+            if time.monotonic() - progress > STALL_TIMEOUT:
+                raise RawReplError("Board did not confirm the end of the transfer")
+
+    def release(self):
+        """Hand bytes read past the last frame back to the raw REPL."""
+        self.repl.pending.unread(self.reader.buffer)
+        self.reader.buffer.clear()
+
+    def abort(self):
+        """Stop the board's receiver so the raw REPL can be entered again."""
+        for _ in range(3):
+            self.repl.serial.write(pack_frame(ABORT, 0))
+
+
+def send_file(repl, path, data, chunk_size=CHUNK_SIZE, window=WINDOW):
+    """Write ``data`` to ``path`` on the board using framed, acknowledged transfer.
+
+    Returns the number of frames that had to be sent again.
+    """
+    repl.send(RECEIVE_SCRIPT.format(path=path, window=window, DATA=DATA, END=END, ABORT=ABORT, READY=READY,
+                                    ACK=ACK, NAK=NAK, DONE=DONE, FAIL=FAIL, EXIT=EXIT))
+    sender = FramedSender(repl, split_chunks(data, chunk_size), window)
+    try:
+        sender.run(len(data))
+    except RawReplError:
+        sender.abort()
+        repl.enter()
+        raise
+    if not sender.exited:
+        sender.release()
+        out, err = repl.follow()
+        if err:
+            raise RawReplError(err.decode(errors="replace"))
+    return sender.retransmits
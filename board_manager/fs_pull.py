@@ -0,0 +1,215 @@
+"""Recursive pulls of a board's whole filesystem into a streamed archive."""
+import ftplib
+import json
+import posixpath
+import queue
+import threading
+import time
+
+from .connections import board_link, open_ftp, resolve
+from .transfer import ftp_chunks
+
+# /flash is the internal filesystem; boot.py's mount_sd_card() adds /sd.
+FS_ROOTS = ("/flash", "/sd")
+FTP_SESSIONS = 4
+READ_AHEAD = 16  # chunks a session may read ahead of the archive
+PUT_TIMEOUT = 1  # how often a blocked worker checks whether the pull was abandoned
+REPORT_NAME = "_transfer_report.json"
+
+# Runs on the board: print "path<TAB>size" for every file below the roots.
+LIST_SCRIPT = """\
+import os
+def walk(d):
+    try:
+        names = os.listdir(d)
+    except OSError:
+        return
+    for n in names:
+        p = d + '/' + n
+        st = os.stat(p)
+        if st[0] & 0x4000:
+            walk(p)
+        else:
+            print(p, st[6], sep='\\t')
+for r in {roots!r}:
+    walk(r)
+"""
+
+
+def archive_name(path):
+    """Map a board path such as ``/flash/lib/x.py`` to ``flash/lib/x.py``."""
+    return path.lstrip("/")
+
+
+def ftp_walk(ftp, root):
+    """Return ``[(path, size), ...]`` for every file below ``root`` on an FTP server."""
+    lines = []
+    try:
+        ftp.retrlines(f"LIST {root}", lines.append)
+    except ftplib.error_perm:  # e.g. /sd when no card is mounted
+        return []
+    files = []
+    for line in lines:
+        parts = line.split(None, 8)
+        if len(parts) < 9 or parts[8] in (".", ".."):
+            continue
+        path = posixpath.join(root, parts[8])
+        if parts[0].startswith("d"):
+            files.extend(ftp_walk(ftp, path))
+        else:
+            files.append((path, int(parts[4])))
+    return files
+
+
+def serial_walk(repl, roots):
+    """Return ``[(path, size), ...]`` for every file below ``roots`` on the board."""
+    out = repl.exec(LIST_SCRIPT.format(roots=list(roots)), timeout=60)
+    return [(path, int(size)) for path, size in (line.split("\t") for line in out.decode().splitlines())]
+
+
+class _Cancelled(Exception):
+    """The archive stopped being read, so pulling workers should quit."""
+
+
+def _put(q, item, cancel):
+    """``q.put(item)``, giving up with ``_Cancelled`` once ``cancel`` is set."""
+    while True:
+        try:
+            q.put(item, timeout=PUT_TIMEOUT)
+            return
+        except queue.Full:
+            if cancel.is_set():
+                raise _Cancelled() from None
+
+
+def _ftp_pull(connection, jobs, results, session, cancel):
+    stream = None
+    start = time.perf_counter()
+    try:
+        with open_ftp(connection) as ftp:
+            while not cancel.is_set():
+                try:
+                    path, _ = jobs.get_nowait()
+                except queue.Empty:
+                    break
+                stream = queue.Queue(maxsize=READ_AHEAD)
+                _put(results, (path, session, stream), cancel)
+                start = time.perf_counter()
+                error = None
+                try:
+                    for data in ftp_chunks(ftp, path):
+                        _put(stream, data, cancel)
+                except ftplib.error_perm as e:
+                    error = str(e)
+                _put(stream, (time.perf_counter() - start, error), cancel)
+                stream = None
+    except (OSError, ftplib.Error) as e:
+        if stream is None:  # between files: the login failed or the session dropped
+            stream = queue.Queue(maxsize=1)
+            _put(results, (None, session, stream), cancel)
+        _put(stream, (time.perf_counter() - start, str(e)), cancel)
+
+
+def _ftp_worker(connection, jobs, results, session, cancel):
+    """Pull jobs off ``jobs`` over one FTP session until it runs dry or ``cancel`` is set.
+
+    Each file is announced on ``results`` as ``(path, session, stream)``; its
+    chunks follow on the bounded ``stream`` queue as they arrive, ended by
+    ``(seconds, error)``. ``None`` on ``results`` means the worker is done.
+    """
+    try:
+        try:
+            _ftp_pull(connection, jobs, results, session, cancel)
+        finally:
+            _put(results, None, cancel)
+    except _Cancelled:
+        pass
+
+
+def _stream_chunks(path, session, first, stream, report):
+    """Yield a file's chunks as its session reads them, then add its report entry.
+
+    A session that fails mid-file ends the entry early; the report says so.
+    """
+    size = 0
+    item = first
+    while not isinstance(item, tuple):
+        size += len(item)
+        yield item
+        item = stream.get()
+    seconds, error = item
+    report.append(_report_entry(path, size, seconds, session, error))
+
+
+def _report_entry(path, size, seconds, session, error):
+    entry = {"path": path, "bytes": size, "seconds": round(seconds, 3),
+             "bytes_per_second": round(size / seconds) if seconds else None, "session": session}
+    if error:
+        entry["error"] = error
+    return entry
+
+
+def pull_ftp(connection, roots=FS_ROOTS, sessions=FTP_SESSIONS):
+    """Yield ``(name, chunks)`` archive entries for every file, over parallel FTP sessions.
+
+    Files are handed out largest first so the sessions finish close together.
+    Each file's entry streams its chunks as they arrive, so the chunks must
+    be consumed before advancing; sessions read ahead while waiting their
+    turn. A throughput report is yielded as the last entry.
+    """
+    with board_link(connection) as ftp:
+        files = [f for root in roots for f in ftp_walk(ftp, root)]
+    # Extra sessions always log in afresh, even when listing reused one.
+    connection = resolve(connection)
+    jobs = queue.Queue()
+    for job in sorted(files, key=lambda f: f[1], reverse=True):
+        jobs.put(job)
+    # Bounded, like each file's chunk queue, so at most about
+    # 2 x sessions x READ_AHEAD chunks are held in memory at once.
+    results = queue.Queue(maxsize=sessions)
+    sessions = max(1, min(sessions, len(files)))
+    cancel = threading.Event()
+    for session in range(sessions):
+        threading.Thread(target=_ftp_worker, args=(connection, jobs, results, session, cancel),
+                         daemon=True).start()
+
+    report = []
+    running = sessions
+    try:
+        while running:
+            item = results.get()
+            if item is None:
+                running -= 1
+                continue
+            path, session, stream = item
+            first = stream.get()
+            if isinstance(first, tuple):  # empty, or failed before any data
+                seconds, error = first
+                report.append(_report_entry(path, 0, seconds, session, error))
+                if error is None:
+                    yield archive_name(path), []
+                continue
+            yield archive_name(path), _stream_chunks(path, session, first, stream, report)
+        yield REPORT_NAME, [json.dumps(report, indent=2).encode()]
+    finally:
+        # Also reached when the client goes away and the archive is closed.
+        cancel.set()
+
+
+def pull_repl(repl, roots=FS_ROOTS):
+    """Yield ``(name, chunks)`` archive entries for every file, streamed over the raw REPL."""
+    report = []
+    for path, size in serial_walk(repl, roots):
+        start = time.perf_counter()
+        yield archive_name(path), repl.get_file(path)
+        report.append(_report_entry(path, size, time.perf_counter() - start, 0, None))
+    yield REPORT_NAME, [json.dumps(report, indent=2).encode()]
+
+
+def pull_filesystem(connection, roots=FS_ROOTS, sessions=FTP_SESSIONS):
+    """Yield archive entries for the whole board filesystem over its connection."""
+    if resolve(connection).get("type") == "serial":
+        with board_link(connection) as repl:
+            yield from pull_repl(repl, roots)
+    else:
+        yield from pull_ftp(connection, roots, sessions)
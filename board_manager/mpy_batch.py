@@ -0,0 +1,119 @@
+"""Compile many modules with mpy-cross in parallel from a persistent thread pool.
+
+Usable from the upload pipeline (``precompile``) and from the command line::
+
+    python -m board_manager.mpy_batch src/ -o build/ [--micropython 1.20] [-- -O2]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .mpy_cache import CACHE_DIR, CompileError, binary_version, compile_cached, resolve_binary
+
+# The firmware runs these by name, so they must stay as source.
+KEEP_AS_SOURCE = {"boot.py", "main.py"}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the shared worker pool, starting it on first use.
+
+    Threads, not processes: each job waits on an mpy-cross child process,
+    which is where the parallelism is, and forking the threaded web server
+    for a process pool is unsafe.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="mpy-cross")
+        return _pool
+
+
+def _compile_job(binary, version, name, source, flags, cache_dir):
+    start = time.perf_counter()
+    try:
+        data, cached = compile_cached(binary, version, name, source, flags, cache_dir)
+    except CompileError as e:
+        return {"name": name, "error": str(e), "seconds": time.perf_counter() - start}
+    return {"name": name, "data": data, "cached": cached, "source_size": len(source),
+            "size": len(data), "seconds": time.perf_counter() - start}
+
+
+def compile_many(sources, flags=(), micropython=None, cache_dir=CACHE_DIR):
+    """Compile ``(name, source)`` pairs in parallel.
+
+    The binary is resolved and probed once here, not per file. Returns one
+    dict per source, in order, with ``data``, ``size``, ``source_size``,
+    ``seconds`` and ``cached``, or ``error`` if mpy-cross rejected it.
+    """
+    binary = resolve_binary(micropython)
+    version = binary_version(binary)
+    pool = get_pool()
+    futures = [pool.submit(_compile_job, binary, version, name, source, tuple(flags), cache_dir)
+               for name, source in sources]
+    return [f.result() for f in futures]
+
+
+def precompile(files, flags=(), micropython=None):
+    """Swap ``.py`` entries of ``(name, data)`` pairs for compiled ``.mpy`` ones."""
+    todo = [(name, data) for name, data in files if name.endswith(".py") and name not in KEEP_AS_SOURCE]
+    results = {r["name"]: r for r in compile_many(todo, flags, micropython)}
+    errors = [r["error"] for r in results.values() if "error" in r]
+    if errors:
+        raise CompileError("\n".join(errors))
+    return [(name[:-3] + ".mpy", results[name]["data"]) if name in results else (name, data)
+            for name, data in files]
+
+
+def compile_tree(root, out_dir, flags=(), micropython=None):
+    """Compile every module under ``root`` into the same layout under ``out_dir``."""
+    sources = []
+    for dirpath, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if filename.endswith(".py"):
+                path = os.path.join(dirpath, filename)
+                with open(path, "rb") as f:
+                    sources.append((os.path.relpath(path, root), f.read()))
+    results = compile_many(sources, flags, micropython)
+    for result in results:
+        if "data" in result:
+            target = os.path.join(out_dir, result["name"][:-3] + ".mpy")
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as f:
+                f.write(result["data"])
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m board_manager.mpy_batch",
+                                     description="Compile a tree of MicroPython modules to .mpy.",
+                                     epilog="Extra mpy-cross flags may follow a -- separator.")
+    parser.add_argument("root", help="directory of .py sources")
+    parser.add_argument("-o", "--out", default="build", help="output directory (default: build)")
+    parser.add_argument("--micropython", help="target MicroPython release, e.g. 1.20")
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # Everything after "--" is passed through to mpy-cross untouched.
+    flags = argv[argv.index("--") + 1:] if "--" in argv else []
+    args = parser.parse_args(argv[:argv.index("--")] if "--" in argv else argv)
+
+    start = time.perf_counter()
+    results = compile_tree(args.root, args.out, flags, args.micropython)
+    failed = 0
+    for r in results:
+        if "error" in r:
+            failed += 1
+            print(f"FAIL {r['name']}\n{r['error']}", file=sys.stderr)
+        else:
+            print(f"{r['name']:40} {r['source_size']:8} -> {r['size']:8} B "
+                  f"{r['seconds'] * 1000:8.1f} ms{' (cached)' if r['cached'] else ''}")
+    print(f"{len(results) - failed} compiled, {failed} failed in {time.perf_counter() - start:.2f} s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
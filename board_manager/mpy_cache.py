@@ -0,0 +1,91 @@
+"""Precompile uploads with mpy-cross, caching output on disk by content."""
+import functools
+import glob
+import hashlib
+import os
+import stat
+import subprocess
+import tempfile
+
+import mpy_cross
+from mpy_cross import versions
+
+CACHE_DIR = os.environ.get("BOARD_MANAGER_MPY_CACHE",
+                           os.path.join(os.path.expanduser("~"), ".cache", "board_manager", "mpy"))
+
+
+class CompileError(Exception):
+    """Raised when mpy-cross rejects a source file."""
+
+
+@functools.lru_cache(maxsize=None)
+def resolve_binary(micropython=None):
+    """Return the mpy-cross binary for a MicroPython version (default: bundled)."""
+    if micropython is None:
+        path = mpy_cross.mpy_cross
+    else:
+        try:
+            release = versions.mpy_version(micropython, None)
+        except SystemExit as e:  # mpy_cross reports unknown versions by exiting
+            raise ValueError(str(e)) from None
+        found = glob.glob(os.path.join(os.path.dirname(mpy_cross.__file__), "archive", release, "mpy-cross*"))
+        if not found:
+            raise ValueError(f"No mpy-cross binary bundled for MicroPython {micropython}")
+        path = found[0]
+    mode = os.stat(path).st_mode
+    if not mode & stat.S_IEXEC:
+        os.chmod(path, mode | stat.S_IEXEC)
+    return path
+
+
+@functools.lru_cache(maxsize=None)
+def binary_version(binary):
+    """Return the version banner of an mpy-cross binary, e.g. ``MicroPython v1.26.1 ...``."""
+    return subprocess.run([binary, "--version"], capture_output=True, text=True, check=True).stdout.strip()
+
+
+def cache_key(name, source, version, flags):
+    """Key compiled output by source hash, name, mpy-cross version and flags.
+
+    The name is part of the key because ``-s name`` embeds it in the .mpy.
+    """
+    h = hashlib.sha256(source)
+    h.update(name.encode() + b"\0")
+    h.update(version.encode())
+    h.update("\0".join(flags).encode())
+    return h.hexdigest()
+
+
+def compile_cached(binary, version, name, source, flags=(), cache_dir=CACHE_DIR):
+    """Return ``(mpy_bytes, was_cached)`` for ``source`` built by ``binary``.
+
+    ``version`` is the binary's ``binary_version()`` banner, passed in so
+    callers that already resolved the binary do not probe it again.
+    """
+    key = cache_key(name, source, version, flags)
+    path = os.path.join(cache_dir, key[:2], key + ".mpy")
+    try:
+        with open(path, "rb") as f:
+            return f.read(), True
+    except FileNotFoundError:
+        pass
+    os.makedirs(cache_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=cache_dir) as tmp:
+        src = os.path.join(tmp, os.path.basename(name))
+        with open(src, "wb") as f:
+            f.write(source)
+        out = os.path.join(tmp, "out.mpy")
+        proc = subprocess.run([binary, *flags, "-s", name, "-o", out, src], capture_output=True, text=True)
+        if proc.returncode:
+            raise CompileError(f"{name}: {proc.stderr.strip()}")
+        with open(out, "rb") as f:
+            data = f.read()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(out, path)
+    return data, False
+
+
+def compile_source(name, source, flags=(), micropython=None, cache_dir=CACHE_DIR):
+    """Return the ``.mpy`` bytes for ``source``, compiling only on a cache miss."""
+    binary = resolve_binary(micropython)
+    return compile_cached(binary, binary_version(binary), name, source, flags, cache_dir)[0]
@@ -0,0 +1,211 @@
+"""One thread reading every open serial port for ``serial.threaded`` protocols.
+
+``serial.threaded.ReaderThread`` spends an OS thread per port, so watching a
+rack of 100 boards takes 100 threads. ``SerialMultiplexer`` registers each
+port's fd with one ``selectors`` selector (epoll on Linux) and calls the
+port's ``Protocol`` from a single thread. Protocols see the same calls as
+under ``ReaderThread``: ``connection_made(transport)``, ``data_received``
+and ``connection_lost``, and the transport has the same ``write``, ``stop``
+and ``close``, so ``Packetizer``, ``LineReader`` and friends work unchanged.
+"""
+import collections
+import os
+import selectors
+import socket
+import threading
+
+from serial import SerialException
+
+READ_BYTES = 64 * 1024  # most taken from one port per wakeup
+STOP_TIMEOUT = 2  # same wait as ReaderThread.stop()
+
+
+class PortTransport:
+    """The transport a multiplexed protocol is given; shaped like ``ReaderThread``."""
+
+    def __init__(self, multiplexer, serial_instance, protocol_factory, paused=False):
+        self.multiplexer = multiplexer
+        self.serial = serial_instance
+        self.fd = serial_instance.fileno()
+        self.protocol_factory = protocol_factory
+        self.protocol = None
+        self.alive = True
+        self.reading = not paused
+        self.stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def write(self, data):
+        """Thread safe writing (uses lock)"""
+        with self._lock:
+            return self.serial.write(data)
+
+    def pause_reading(self):
+        """Stop reading the port until ``resume_reading``; returns once no read is in progress."""
+        self.multiplexer.pause(self)
+
+    def resume_reading(self):
+        self.multiplexer.resume(self)
+
+    def stop(self):
+        """Stop dispatching this port; it stays open."""
+        self.multiplexer.remove(self)
+
+    def close(self):
+        """Stop dispatching and close the port."""
+        self.stop()
+        with self._lock:  # let a write in progress finish
+            self.serial.close()
+
+    def is_alive(self):
+        return self.alive
+
+    def connect(self):
+        return self, self.protocol
+
+    def __enter__(self):
+        return self.protocol
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SerialMultiplexer:
+    """Dispatches reads of many serial ports to their protocols from one thread."""
+
+    def __init__(self):
+        self.selector = None
+        self.thread = None
+        self.changes = collections.deque()  # (transport, operation, argument)
+        self.lock = threading.Lock()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.selector = selectors.DefaultSelector()
+            self.selector.register(self._wake_r, selectors.EVENT_READ)
+            self.thread = threading.Thread(target=self._run, name="serial-multiplexer", daemon=True)
+            self.thread.start()
+
+    def add(self, serial_instance, protocol_factory, paused=False):
+        """Start dispatching reads of an open, non-blocking port to a new protocol; returns its transport.
+
+        ``connection_made`` runs in the caller's thread, so errors it raises
+        reach the caller and the port is never registered. A ``paused`` port
+        is only read after ``resume_reading``.
+        """
+        self.start()
+        transport = PortTransport(self, serial_instance, protocol_factory, paused)
+        transport.protocol = protocol_factory()
+        transport.protocol.connection_made(transport)
+        self._change(transport, "add")
+        return transport
+
+    def remove(self, transport, error=None):
+        """Stop dispatching ``transport``'s port and tell its protocol."""
+        if threading.current_thread() is self.thread:
+            self._drop(transport, error)
+            return
+        self._change(transport, "remove", error)
+        transport.stopped.wait(STOP_TIMEOUT)
+
+    def pause(self, transport):
+        """Stop reading ``transport``'s port, waiting until the read thread has let go of it."""
+        if threading.current_thread() is self.thread:
+            self._pause(transport)
+            return
+        paused = threading.Event()
+        self._change(transport, "pause", paused)
+        paused.wait(STOP_TIMEOUT)
+
+    def resume(self, transport):
+        if threading.current_thread() is self.thread:
+            self._resume(transport)
+        else:
+            self._change(transport, "resume")
+
+    def _change(self, transport, operation, argument=None):
+        self.changes.append((transport, operation, argument))
+        self._wake_w.send(b"\0")
+
+    def _apply_changes(self):
+        while True:
+            try:
+                self._wake_r.recv(4096)
+            except BlockingIOError:
+                break
+        while self.changes:
+            transport, operation, argument = self.changes.popleft()
+            if operation == "remove":
+                self._drop(transport, argument)
+            elif operation == "pause":
+                self._pause(transport)
+                argument.set()
+            elif operation == "resume":
+                self._resume(transport)
+            elif transport.reading:
+                self._watch(transport)
+
+    def _watch(self, transport):
+        try:
+            self.selector.register(transport.fd, selectors.EVENT_READ, transport)
+        except (KeyError, ValueError, OSError) as e:  # closed meanwhile, or already watched
+            self._drop(transport, SerialException(f"cannot watch {transport.serial.name}: {e}"))
+
+    def _unwatch(self, transport):
+        key = self.selector.get_map().get(transport.fd)
+        if key is not None and key.data is transport:
+            self.selector.unregister(transport.fd)
+
+    def _pause(self, transport):
+        if transport.reading:
+            transport.reading = False
+            self._unwatch(transport)
+
+    def _resume(self, transport):
+        if not transport.reading and transport.alive:
+            transport.reading = True
+            self._watch(transport)
+
+    def _drop(self, transport, error):
+        if transport.stopped.is_set():
+            return
+        self._unwatch(transport)
+        transport.alive = False
+        protocol, transport.protocol = transport.protocol, None
+        try:
+            protocol.connection_lost(error)
+        except Exception:  # the base Protocol re-raises ``error``; the other ports must keep running
+            pass
+        transport.stopped.set()
+
+    def _run(self):
+        buffer = memoryview(bytearray(READ_BYTES))
+        while True:
+            for key, _ in self.selector.select():
+                if key.fileobj is self._wake_r:
+                    self._apply_changes()
+                    continue
+                transport = key.data
+                if not transport.alive or not transport.reading:  # dropped or paused earlier in this batch
+                    continue
+                try:
+                    count = os.readv(key.fd, [buffer])
+                except (BlockingIOError, InterruptedError):
+                    continue
+                except OSError as e:
+                    self._drop(transport, SerialException(f"read failed: {e}"))
+                    continue
+                if not count:
+                    self._drop(transport, SerialException("device reports readiness to read but returned no data "
+                                                          "(device disconnected or multiple access on port?)"))
+                    continue
+                try:
+                    transport.protocol.data_received(bytes(buffer[:count]))
+                except Exception as e:
+                    self._drop(transport, e)
+
+
+readers = SerialMultiplexer()
@@ -0,0 +1,156 @@
+"""In-memory serial port registry kept current by watching ``/dev``.
+
+``serial.tools.list_ports.comports()`` globs seven device patterns and reads
+sysfs for every port on each call. The registry does that once, then follows
+inotify events on ``/dev`` and only inspects ports that come or go. Where
+inotify is unavailable it falls back to re-listing in the background.
+"""
+import ctypes
+import ctypes.util
+import fnmatch
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+
+from serial.tools import list_ports, list_ports_common, list_ports_linux
+
+# The same device families list_ports_linux.comports() globs for.
+PORT_PATTERNS = ("ttyS*", "ttyUSB*", "ttyXRUSB*", "ttyACM*", "ttyAMA*", "rfcomm*", "ttyAP*")
+POLL_INTERVAL = 2
+
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+_EVENT = struct.Struct("iIII")
+
+
+def port_info(info):
+    """Return the JSON shape the page expects for a ``ListPortInfo``."""
+    return {"device": info.device, "description": info.description, "hwid": info.hwid,
+            "location": info.location}
+
+
+def _inotify(path):
+    """Return an inotify fd watching ``path`` for entries coming and going, or ``None``."""
+    if not sys.platform.startswith("linux"):
+        return None
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    fd = libc.inotify_init1(os.O_CLOEXEC)
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, path.encode(), IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+class PortRegistry:
+    """Current serial ports plus a feed of ``add``/``remove`` events."""
+
+    def __init__(self, dev="/dev"):
+        self.dev = dev
+        self.ports = {}
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.watcher = None
+
+    def start(self):
+        with self.lock:
+            if self.watcher is not None:
+                return
+            # Watch before the initial scan so no port slips in between.
+            fd = _inotify(self.dev)
+            self.ports = {info.device: port_info(info) for info in list_ports.comports()}
+            self.watcher = threading.Thread(target=self._watch, args=(fd,), name="port-registry", daemon=True)
+            self.watcher.start()
+
+    def list(self):
+        """Return the known ports, sorted by device name."""
+        self.start()
+        with self.lock:
+            return self._sorted()
+
+    def _sorted(self):
+        return sorted(self.ports.values(), key=lambda p: list_ports_common.numsplit(p["device"]))
+
+    def subscribe(self, events=None):
+        """Return a queue that receives ``(event, port)`` tuples until unsubscribed.
+
+        A subscriber that falls behind loses its backlog and gets one
+        ``("ports", [...])`` snapshot of every current port in its place.
+        """
+        self.start()
+        events = queue.Queue(maxsize=256) if events is None else events
+        with self.lock:
+            self.subscribers.add(events)
+        return events
+
+    def unsubscribe(self, events):
+        with self.lock:
+            self.subscribers.discard(events)
+
+    def _publish(self, event, port):
+        # Called with the lock held, so a resync snapshot matches the events after it.
+        for events in self.subscribers:
+            try:
+                events.put_nowait((event, port))
+            except queue.Full:
+                while True:
+                    try:
+                        events.get_nowait()
+                    except queue.Empty:
+                        break
+                events.put_nowait(("ports", self._sorted()))
+
+    def _added(self, name):
+        device = os.path.join(self.dev, name)
+        info = list_ports_linux.SysFS(device)
+        if info.subsystem == "platform":
+            return
+        with self.lock:
+            if device in self.ports:
+                return
+            self.ports[device] = port = port_info(info)
+            self._publish("add", port)
+
+    def _removed(self, name):
+        with self.lock:
+            port = self.ports.pop(os.path.join(self.dev, name), None)
+            if port is not None:
+                self._publish("remove", port)
+
+    def _watch(self, fd):
+        if fd is None:
+            self._poll()
+            return
+        while True:
+            data = os.read(fd, 65536)
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0").decode()
+                offset += _EVENT.size + length
+                if not any(fnmatch.fnmatch(name, p) for p in PORT_PATTERNS):
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._added(name)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._removed(name)
+
+    def _poll(self):
+        while True:
+            time.sleep(POLL_INTERVAL)
+            current = {info.device: port_info(info) for info in list_ports.comports()}
+            with self.lock:
+                for device in current.keys() - self.ports.keys():
+                    self.ports[device] = current[device]
+                    self._publish("add", current[device])
+                for device in self.ports.keys() - current.keys():
+                    self._publish("remove", self.ports.pop(device))
+
+
+registry = PortRegistry()
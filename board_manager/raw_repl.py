@@ -0,0 +1,252 @@
+"""MicroPython raw REPL driver for boards attached over serial."""
+import binascii
+import struct
+import time
+
+from .serial_io import RingBuffer, read_available_into, write_control
+
+CTRL_A = b"\x01"  # enter raw REPL
+CTRL_B = b"\x02"  # leave raw REPL
+CTRL_C = b"\x03"  # keyboard interrupt
+CTRL_D = b"\x04"  # end of input / soft reset
+CTRL_E = b"\x05"  # raw-paste request
+ACK = b"\x06"
+
+RAW_REPL_BANNER = b"raw REPL; CTRL-B to exit\r\n"
+
+# Runs on the board: read the file from stdin in fixed-size chunks and ack
+# each one, so the host can keep the next chunk on the wire meanwhile.
+PUT_SCRIPT = """\
+import sys, micropython
+micropython.kbd_intr(-1)
+r = sys.stdin.buffer.read
+f = open({path!r}, 'wb')
+n = {size}
+while n > 0:
+    b = r(min(n, {chunk}))
+    f.write(b)
+    n -= len(b)
+    sys.stdout.write('\\x06')
+f.close()
+micropython.kbd_intr(3)
+"""
+
+# Like PUT_SCRIPT, but only rewrites the given (offset, length) spans.
+PATCH_SCRIPT = """\
+import sys, micropython
+micropython.kbd_intr(-1)
+r = sys.stdin.buffer.read
+f = open({path!r}, 'r+b')
+for o, n in {spans!r}:
+    f.seek(o)
+    while n > 0:
+        b = r(min(n, {chunk}))
+        f.write(b)
+        n -= len(b)
+        sys.stdout.write('\\x06')
+f.close()
+micropython.kbd_intr(3)
+"""
+
+# Streams a file back as base64 lines, one per chunk, so the raw REPL's
+# \x04 terminator can never appear inside the data.
+GET_SCRIPT = """\
+import sys, ubinascii
+f = open({path!r}, 'rb')
+buf = bytearray({chunk})
+while True:
+    k = f.readinto(buf)
+    if not k:
+        break
+    sys.stdout.write(ubinascii.b2a_base64(memoryview(buf)[:k]))
+f.close()
+"""
+
+
+class RawReplError(Exception):
+    """Raised when the board does not follow the raw REPL protocol."""
+
+
+class RawRepl:
+    """Drive the raw REPL of a MicroPython board over a pyserial ``Serial``.
+
+    The port should be opened with a short read timeout (e.g. 0.1 s); overall
+    deadlines are enforced here with ``timeout``.
+    """
+
+    def __init__(self, port, timeout=10):
+        self.serial = port
+        self.timeout = timeout
+        self.use_raw_paste = True
+        self.pending = RingBuffer()  # received but not yet consumed
+
+    def _fill(self, deadline, what):
+        if time.monotonic() > deadline:
+            raise RawReplError(f"Timed out waiting for {what}, got {self.pending.tail(64)!r}")
+        self.pending.fill(lambda view: read_available_into(self.serial, view))
+
+    def read_exact(self, size, timeout=None):
+        """Read exactly ``size`` bytes or raise ``RawReplError``."""
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        while len(self.pending) < size:
+            self._fill(deadline, f"{size} byte(s)")
+        return self.pending.take(size)
+
+    def read_until(self, ending, timeout=None):
+        """Read until ``ending`` has been received, returning everything read."""
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        while (end := self.pending.find(ending)) < 0:
+            self._fill(deadline, repr(ending))
+        return self.read_exact(end + len(ending))
+
+    def in_waiting(self):
+        """Return how many received bytes are ready to be read."""
+        return len(self.pending) + self.serial.in_waiting
+
+    def enter(self):
+        """Interrupt any running program and switch the board to the raw REPL."""
+        self.serial.write(b"\r" + CTRL_C + CTRL_C)
+        time.sleep(0.1)
+        self.serial.reset_input_buffer()
+        self.pending.clear()
+        self.serial.write(b"\r" + CTRL_A)
+        self.read_until(RAW_REPL_BANNER)
+
+    def exit(self):
+        """Return the board to the friendly REPL."""
+        self.serial.write(b"\r" + CTRL_B)
+
+    def send(self, code):
+        """Submit ``code`` for execution without waiting for its output."""
+        if isinstance(code, str):
+            code = code.encode()
+        self.read_until(b">")
+        if self.use_raw_paste:
+            self.serial.write(CTRL_E + b"A" + CTRL_A)
+            reply = self.read_exact(2)
+            if reply == b"R\x01":
+                self._paste(code)
+                return
+            if reply != b"R\x00":
+                # Firmware predates raw-paste: the Ctrl-A re-sent the banner,
+                # whose first two bytes were just consumed as the reply.
+                self.read_until(RAW_REPL_BANNER[2:] + b">")
+            self.use_raw_paste = False
+        for i in range(0, len(code), 256):
+            self.serial.write(code[i:i + 256])
+            time.sleep(0.01)
+        self.serial.write(CTRL_D)
+        reply = self.read_exact(2)
+        if reply != b"OK":
+            raise RawReplError(f"Board refused the command: {reply!r}")
+
+    def _paste(self, code):
+        """Write ``code`` honouring the raw-paste flow-control window."""
+        increment = struct.unpack("<H", self.read_exact(2))[0]
+        window = increment
+        view = memoryview(code)
+        i = 0
+        while i < len(code):
+            while window == 0 or self.in_waiting():
+                flag = self.read_exact(1)
+                if flag == CTRL_A:
+                    window += increment
+                elif flag == CTRL_D:
+                    # The board aborted compilation; acknowledge and bail out.
+                    self.serial.write(CTRL_D)
+                    return
+                else:
+                    raise RawReplError(f"Unexpected byte during raw paste: {flag!r}")
+            block = view[i:i + window]
+            self.serial.write(block)
+            window -= len(block)
+            i += len(block)
+        self.serial.write(CTRL_D)
+        self.read_until(CTRL_D)
+
+    def follow(self, timeout=None):
+        """Wait for the running command to finish and return ``(stdout, stderr)``."""
+        out = self.read_until(CTRL_D, timeout)[:-1]
+        err = self.read_until(CTRL_D, timeout)[:-1]
+        return out, err
+
+    def stream_output(self, timeout=None):
+        """Yield ``("stdout" | "stderr", bytes)`` chunks of the running command as they arrive."""
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        for stream in ("stdout", "stderr"):
+            while True:
+                if not self.pending:
+                    self._fill(deadline, f"{stream} of the running command")
+                end = self.pending.find(CTRL_D)
+                data = self.pending.take(end if end >= 0 else len(self.pending))
+                if end >= 0:
+                    self.pending.take(1)
+                if data:
+                    yield stream, data
+                if end >= 0:
+                    break
+
+    def interrupt(self):
+        """Send Ctrl-C to the running command; safe to call from another thread."""
+        write_control(self.serial, CTRL_C)
+
+    def exec(self, code, timeout=None):
+        """Run ``code`` on the board and return its stdout, raising on error."""
+        self.send(code)
+        out, err = self.follow(timeout)
+        if err:
+            raise RawReplError(err.decode(errors="replace"))
+        return out
+
+    def put_file(self, path, data, chunk_size=256, window=2):
+        """Stream ``data`` into ``path`` on the board.
+
+        Up to ``window`` chunks are in flight at once, so the next chunk is
+        already queued on the wire while the board acks the previous one.
+        """
+        self.send(PUT_SCRIPT.format(path=path, size=len(data), chunk=chunk_size))
+        self._stream(path, split_chunks(data, chunk_size), window)
+
+    def patch_file(self, path, blocks, chunk_size=256, window=2):
+        """Overwrite ``(offset, data)`` blocks of an existing file in place."""
+        spans = [(offset, len(data)) for offset, data in blocks]
+        self.send(PATCH_SCRIPT.format(path=path, spans=spans, chunk=chunk_size))
+        self._stream(path, [c for _, data in blocks for c in split_chunks(data, chunk_size)], window)
+
+    def get_file(self, path, chunk_size=512):
+        """Yield the contents of ``path`` on the board chunk by chunk."""
+        self.send(GET_SCRIPT.format(path=path, chunk=chunk_size))
+        while True:
+            first = self.read_exact(1)
+            if first == CTRL_D:
+                err = self.read_until(CTRL_D)[:-1]
+                if err:
+                    raise RawReplError(err.decode(errors="replace"))
+                return
+            yield binascii.a2b_base64(first + self.read_until(b"\n"))
+
+    def _stream(self, path, chunks, window):
+        """Feed ``chunks`` to a running reader script, keeping ``window`` unacked."""
+        total = len(chunks)
+        sent = acked = 0
+        while acked < total:
+            while sent < total and sent - acked < window:
+                self.serial.write(chunks[sent])
+                sent += 1
+            flag = self.read_exact(1)
+            if flag != ACK:
+                err = self.read_until(CTRL_D)[:-1] if flag == CTRL_D else b""
+                # Chunks already on the wire land in the raw REPL input; resync.
+                self.enter()
+                raise RawReplError(err.decode(errors="replace")
+                                   or f"Board stopped acknowledging {path} after {acked} chunk(s)")
+            acked += 1
+        out, err = self.follow()
+        if err:
+            raise RawReplError(err.decode(errors="replace"))
+
+
+def split_chunks(data, chunk_size):
+    """Return zero-copy ``chunk_size`` slices of ``data``."""
+    view = memoryview(data)
+    return [view[i:i + chunk_size] for i in range(0, len(view), chunk_size)]
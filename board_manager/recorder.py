@@ -0,0 +1,281 @@
+"""Persistent, seekable recordings of board REPL output.
+
+Each hub records to ``<board>-<start>.log``: an append-only series of blocks,
+each a header plus a zlib-compressed run of ``(time, bytes)`` records. A
+sibling ``.idx`` file holds one ``(first, last, offset)`` entry per block, so
+replaying or searching from any moment reads only the blocks it needs.
+Hubs only append records in memory; full blocks are compressed and written
+by one background thread, so a slow disk never holds up a board's reader.
+"""
+import bisect
+import codecs
+import collections
+import itertools
+import logging
+import os
+import queue
+import re
+import struct
+import threading
+import time
+import zlib
+
+RECORDINGS_DIR = os.environ.get("BOARD_MANAGER_RECORDINGS",
+                                os.path.join(os.path.expanduser("~"), ".local", "share", "board_manager", "recordings"))
+BLOCK_BYTES = 64 * 1024  # raw output per compressed block ...
+BLOCK_SECONDS = 5  # ... or output this old, whichever comes first
+
+BLOCK_HEADER = struct.Struct("<ddII")  # first time, last time, raw size, compressed size
+RECORD = struct.Struct("<dI")  # time, size
+INDEX_ENTRY = struct.Struct("<ddQ")  # first time, last time, log offset
+
+log = logging.getLogger(__name__)
+
+
+def recording_id(board, started):
+    """Return the file stem for ``board``'s recording started at ``started``, to the microsecond."""
+    name = re.sub(r"[^A-Za-z0-9.]+", "_", board).strip("_")
+    micros = int(started % 1 * 1000000)
+    return f"{name}-{time.strftime('%Y%m%dT%H%M%S', time.localtime(started))}.{micros:06d}"
+
+
+def pack_records(records):
+    return b"".join(RECORD.pack(t, len(data)) + data for t, data in records)
+
+
+def unpack_records(raw):
+    offset = 0
+    while offset < len(raw):
+        t, size = RECORD.unpack_from(raw, offset)
+        offset += RECORD.size
+        yield t, raw[offset:offset + size]
+        offset += size
+
+
+class Recorder:
+    """Appends one board's output to its recording; fed by the hub reader only."""
+
+    def __init__(self, board, directory=RECORDINGS_DIR):
+        os.makedirs(directory, exist_ok=True)
+        stem = self.id = recording_id(board, time.time())
+        # A hub reopened at once must not append to its predecessor's files.
+        for n in itertools.count(2):
+            self.path = os.path.join(directory, self.id)
+            try:
+                self.log = open(self.path + ".log", "xb")
+                break
+            except FileExistsError:
+                self.id = f"{stem}.{n}"
+        self.index = open(self.path + ".idx", "ab")
+        self.records = []
+        self.size = 0
+        self.unwritten = collections.deque()  # blocks handed to the writer, oldest first
+        self.closed = threading.Event()
+        self.lock = threading.Lock()
+        recorders[self.id] = self
+
+    def write(self, data):
+        now = time.time()
+        with self.lock:
+            self.records.append((now, bytes(data)))
+            self.size += len(data)
+            if self.size >= BLOCK_BYTES or now - self.records[0][0] >= BLOCK_SECONDS:
+                self._hand_off()
+
+    def pending(self):
+        """Return the records not yet written to disk."""
+        with self.lock:
+            return [record for block in self.unwritten for record in block] + self.records
+
+    def _hand_off(self):
+        if not self.records:
+            return
+        self.unwritten.append(self.records)
+        writer.put(self, self.records)
+        self.records = []
+        self.size = 0
+
+    def _write_block(self, records):
+        """Compress and append one block; called on the writer thread."""
+        raw = pack_records(records)
+        data = zlib.compress(raw)
+        first, last = records[0][0], records[-1][0]
+        try:
+            offset = self.log.tell()
+            self.log.write(BLOCK_HEADER.pack(first, last, len(raw), len(data)) + data)
+            self.log.flush()
+            self.index.write(INDEX_ENTRY.pack(first, last, offset))
+            self.index.flush()
+        except OSError as e:
+            log.warning("recording %s lost %d bytes: %s", self.id, len(raw), e)
+        with self.lock:
+            self.unwritten.popleft()
+
+    def _finish(self):
+        self.log.close()
+        self.index.close()
+        self.closed.set()
+
+    def close(self):
+        """Write what is left and close the files, once the writer has caught up."""
+        with self.lock:
+            self._hand_off()
+            writer.put(self, None)
+        self.closed.wait()
+        if recorders.get(self.id) is self:
+            del recorders[self.id]
+
+
+class BlockWriter:
+    """The one thread that compresses and writes every recorder's blocks."""
+
+    def __init__(self):
+        self.blocks = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def put(self, recorder, records):
+        """Queue ``records`` for ``recorder``; ``None`` closes its files once the rest is written."""
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._write_loop, name="recorder", daemon=True)
+                self.thread.start()
+        self.blocks.put((recorder, records))
+
+    def _write_loop(self):
+        while True:
+            recorder, records = self.blocks.get()
+            if records is None:
+                recorder._finish()
+            else:
+                recorder._write_block(records)
+
+
+writer = BlockWriter()
+
+
+# recording id -> Recorder, while its hub is open
+recorders = {}
+
+
+class Recording:
+    """Read side of a recording: seek by time, replay and search."""
+
+    def __init__(self, recording, directory=RECORDINGS_DIR):
+        if os.sep in recording or recording.startswith("."):
+            raise KeyError(recording)
+        self.id = recording
+        self.path = os.path.join(directory, recording)
+        if not os.path.exists(self.path + ".log"):
+            raise KeyError(recording)
+        self.blocks = self._load_index()
+
+    def _load_index(self):
+        with open(self.path + ".idx", "rb") as f:
+            data = f.read()
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        blocks = [INDEX_ENTRY.unpack_from(data, i) for i in range(0, usable, INDEX_ENTRY.size)]
+        # Blocks written after the index was last flushed (e.g. a crash) are
+        # picked up from their headers.
+        offset = blocks[-1][2] if blocks else 0
+        with open(self.path + ".log", "rb") as log:
+            log.seek(offset)
+            if blocks:
+                header = BLOCK_HEADER.unpack(log.read(BLOCK_HEADER.size))
+                log.seek(header[3], os.SEEK_CUR)
+            while len(header_data := log.read(BLOCK_HEADER.size)) == BLOCK_HEADER.size:
+                first, last, _, size = BLOCK_HEADER.unpack(header_data)
+                blocks.append((first, last, log.tell() - BLOCK_HEADER.size))
+                log.seek(size, os.SEEK_CUR)
+        return blocks
+
+    def span(self):
+        """Return ``(first, last)`` record times, including unflushed output."""
+        pending = recorders[self.id].pending() if self.id in recorders else []
+        first = self.blocks[0][0] if self.blocks else pending[0][0] if pending else None
+        last = pending[-1][0] if pending else self.blocks[-1][1] if self.blocks else None
+        return first, last
+
+    def records(self, start=None, end=None):
+        """Yield ``(time, bytes)`` records between ``start`` and ``end``, one block in memory at a time."""
+        start = float("-inf") if start is None else start
+        end = float("inf") if end is None else end
+        pending = recorders[self.id].pending() if self.id in recorders else []
+        if pending:
+            # Blocks the writer finished since the index was read are on disk
+            # now, no longer pending: read the index again and skip them.
+            self.blocks = self._load_index()
+            written = self.blocks[-1][1] if self.blocks else float("-inf")
+            pending = [record for record in pending if record[0] > written]
+        first_block = bisect.bisect_left([last for _, last, _ in self.blocks], start)
+        with open(self.path + ".log", "rb") as log:
+            for first, _, offset in self.blocks[first_block:]:
+                if first > end:
+                    return
+                log.seek(offset)
+                header_data = log.read(BLOCK_HEADER.size)
+                if len(header_data) < BLOCK_HEADER.size:
+                    break
+                try:
+                    raw = zlib.decompress(log.read(BLOCK_HEADER.unpack(header_data)[3]))
+                except zlib.error:  # cut short by a crash, or being written right now
+                    continue
+                for t, data in unpack_records(raw):
+                    if t > end:
+                        return
+                    if t >= start:
+                        yield t, data
+        for t, data in pending:
+            if start <= t <= end:
+                yield t, data
+
+    def replay(self, start=None, end=None, limit=256 * 1024):
+        """Return ``(chunks, next)``: about ``limit`` bytes as ``(time, text)`` from ``start``.
+
+        ``next`` is the time to continue from, or ``None`` at the end.
+        """
+        chunks = []
+        size = 0
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        for t, data in self.records(start, end):
+            if size >= limit:
+                return chunks, t
+            chunks.append((t, decoder.decode(data)))
+            size += len(data)
+        return chunks, None
+
+    def search(self, pattern, start=None, end=None, limit=100):
+        """Return up to ``limit`` ``(time, line)`` pairs whose line matches ``pattern``."""
+        regex = re.compile(pattern)
+        matches = []
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        line, line_time = "", None
+        for t, data in self.records(start, end):
+            *complete, rest = (line + decoder.decode(data)).split("\n")
+            for text in complete:
+                if regex.search(text):
+                    matches.append((line_time or t, text.rstrip("\r")))
+                    if len(matches) >= limit:
+                        return matches
+                line_time = None
+            line = rest
+            if line and line_time is None:
+                line_time = t
+        if line and regex.search(line):
+            matches.append((line_time, line))
+        return matches[:limit]
+
+
+def list_recordings(directory=RECORDINGS_DIR):
+    """Return every recording with its board, time span and size on disk."""
+    if not os.path.isdir(directory):
+        return []
+    found = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".log"):
+            continue
+        recording = Recording(name[:-4], directory)
+        first, last = recording.span()
+        found.append({"id": recording.id, "board": recording.id.rsplit("-", 1)[0], "start": first, "end": last,
+                      "live": recording.id in recorders, "bytes": os.path.getsize(recording.path + ".log")})
+    return found
@@ -0,0 +1,82 @@
+"""Run scripts on a board through one raw REPL session, streaming their output."""
+import codecs
+import logging
+import secrets
+import time
+
+from .connections import SessionError, board_link
+from .raw_repl import RawRepl, RawReplError
+
+EXEC_TIMEOUT = 60  # seconds each snippet may run
+
+EXEC_ERRORS = (OSError, RawReplError, SessionError, KeyError, ValueError)
+
+log = logging.getLogger(__name__)
+
+
+class Execution:
+    """One run of snippets; ``cancel()`` interrupts it from another thread."""
+
+    def __init__(self):
+        self.id = secrets.token_urlsafe(8)
+        self.repl = None
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+        if self.repl is not None:
+            self.repl.interrupt()
+
+
+# execution id -> Execution, while it runs
+running = {}
+
+
+def run_snippets(connection, snippets, timeout=EXEC_TIMEOUT, stop_on_error=True):
+    """Run ``snippets`` one after another on the board, yielding event dicts.
+
+    Events are ``start`` (with the execution ``id`` to cancel), ``stdout`` and
+    ``stderr`` chunks, an ``end`` per snippet with its wall time, and ``error``
+    if the board could not be driven. Snippets share one namespace, as they
+    run in the same raw REPL session.
+    """
+    execution = Execution()
+    running[execution.id] = execution
+    try:
+        yield {"event": "start", "id": execution.id, "snippets": len(snippets)}
+        with board_link(connection) as repl:
+            if not isinstance(repl, RawRepl):
+                raise ValueError("running code needs a serial connection")
+            execution.repl = repl
+            for index, code in enumerate(snippets):
+                if execution.cancelled:
+                    break
+                decoders = {stream: codecs.getincrementaldecoder("utf-8")(errors="replace")
+                            for stream in ("stdout", "stderr")}
+                failed = finished = False
+                start = time.monotonic()
+                try:
+                    repl.send(code)
+                    for stream, data in repl.stream_output(timeout):
+                        failed = failed or stream == "stderr"
+                        text = decoders[stream].decode(data)
+                        if text:
+                            yield {"event": stream, "snippet": index, "data": text}
+                    finished = True
+                finally:
+                    if not finished:
+                        # Timed out, or the client went away: stop the board and resync.
+                        # This may run while the generator is being closed, where a
+                        # failure must not reach the except below, which yields.
+                        try:
+                            repl.enter()
+                        except EXEC_ERRORS as e:
+                            log.warning("could not stop snippet %d on the board: %s", index, e)
+                yield {"event": "end", "snippet": index, "seconds": round(time.monotonic() - start, 3),
+                       "error": failed, "cancelled": execution.cancelled}
+                if failed and stop_on_error:
+                    break
+    except EXEC_ERRORS as e:
+        yield {"event": "error", "message": str(e)}
+    finally:
+        running.pop(execution.id, None)
@@ -0,0 +1,574 @@
+"""Per-board REPL hubs: one board stream fanned out to many browser viewers."""
+import codecs
+import collections
+import itertools
+import queue
+import socket
+import threading
+import time
+
+from serial.threaded import Protocol
+from simple_websocket import ConnectionClosed
+
+from .aio_serial import SerialTransport, attach
+from .completions import completions
+from .connections import open_serial, resolve, shares
+from .console_index import console
+from .multiplex import PortTransport, readers
+from . import repl_protocol
+from .raw_repl import CTRL_C
+from .recorder import Recorder
+from .serial_io import read_available_into, write_control
+
+SUBSCRIBER_QUEUE = 1024  # chunks a viewer may lag behind before output is dropped
+COALESCE_SECONDS = 0.010  # batch board output for this long ...
+COALESCE_BYTES = 16 * 1024  # ... or until this much is pending, per frame
+METER_WINDOW = 5
+SCROLLBACK_LINES = 20000  # lines of board output each hub keeps for paging
+SCROLLBACK_PAGE = 500
+SCROLLBACK_LINE = 4096  # longest unbroken output kept as one line; the rest starts another
+READ_BYTES = 16 * 1024  # most a single read takes from the board
+WRITE_LOCK_TIMEOUT = 5
+TELNET_PORT = 23
+IAC = 0xFF
+
+
+class TelnetLink:
+    """Minimal client for the Pycom telnet REPL, shaped like a serial port."""
+
+    def __init__(self, connection, timeout=0.1):
+        self.sock = socket.create_connection((connection["address"], TELNET_PORT), timeout=10)
+        self.sock.settimeout(timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # keystrokes go out one by one
+        self.pending = bytearray()
+        self._login(connection.get("username", "micro"), connection.get("password", "python"))
+
+    def _login(self, username, password):
+        for prompt, answer in ((b"Login as:", username), (b"Password:", password)):
+            while prompt not in self.pending:
+                chunk = self._recv()
+                if chunk is None:
+                    raise ConnectionError("telnet closed during login")
+                self.pending += chunk
+            del self.pending[:self.pending.index(prompt) + len(prompt)]
+            self.write(answer.encode() + b"\r\n")
+
+    def _recv(self):
+        try:
+            data = self.sock.recv(4096)
+        except socket.timeout:
+            return b""
+        if not data:
+            return None
+        # Drop option negotiation (IAC, command, option); the REPL needs none.
+        out = bytearray()
+        i = 0
+        while i < len(data):
+            if data[i] == IAC and i + 1 < len(data) and data[i + 1] != IAC:
+                i += 3
+                continue
+            out.append(data[i])
+            i += 2 if data[i] == IAC else 1
+        return bytes(out)
+
+    @property
+    def in_waiting(self):
+        return len(self.pending)
+
+    def read(self, size=1):
+        if not self.pending:
+            chunk = self._recv()
+            if chunk is None:
+                raise ConnectionError("telnet connection closed")
+            self.pending += chunk
+        data = bytes(self.pending[:size])
+        del self.pending[:size]
+        return data
+
+    def write(self, data):
+        self.sock.sendall(bytes(data).replace(b"\xff", b"\xff\xff"))
+        return len(data)
+
+    def close(self):
+        self.sock.close()
+
+
+class Meter:
+    """Counts frames and bytes, reporting rates over the last few seconds."""
+
+    def __init__(self, window=METER_WINDOW):
+        self.window = window
+        self.samples = collections.deque()
+        self.frames = self.bytes = 0
+        self.lock = threading.Lock()
+
+    def add(self, message):
+        """Count one sent ``message``; text is counted by its UTF-8 size, as it goes on the wire."""
+        size = len(message.encode() if isinstance(message, str) else message)
+        now = time.monotonic()
+        with self.lock:
+            self.frames += 1
+            self.bytes += size
+            self.samples.append((now, size))
+            self._prune(now)
+
+    def _prune(self, now):
+        while self.samples and self.samples[0][0] < now - self.window:
+            self.samples.popleft()
+
+    def snapshot(self):
+        with self.lock:
+            self._prune(time.monotonic())
+            recent = sum(size for _, size in self.samples)
+            return {"frames": self.frames, "bytes": self.bytes,
+                    "frames_per_second": round(len(self.samples) / self.window, 1),
+                    "bytes_per_second": round(recent / self.window)}
+
+
+class Scrollback:
+    """Bounded ring of a board's most recent output lines.
+
+    Lines are numbered from when the hub opened, so a page can keep asking
+    for the lines before the oldest one it holds. Output that runs on
+    without a newline is cut into lines of ``SCROLLBACK_LINE`` characters.
+    """
+
+    def __init__(self, limit=SCROLLBACK_LINES):
+        self.lines = collections.deque(maxlen=limit)
+        self.first = 0  # number of lines[0]
+        self.partial = ""
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    @property
+    def end(self):
+        """Number of the line currently being written."""
+        return self.first + len(self.lines)
+
+    def feed(self, data):
+        """Add output, returning the lines it completed."""
+        *complete, self.partial = (self.partial + self.decoder.decode(data)).split("\n")
+        complete = [line.rstrip("\r") for line in complete]
+        if len(self.partial) > SCROLLBACK_LINE:
+            cut = (len(self.partial) - 1) // SCROLLBACK_LINE * SCROLLBACK_LINE
+            complete += [self.partial[i:i + SCROLLBACK_LINE] for i in range(0, cut, SCROLLBACK_LINE)]
+            self.partial = self.partial[cut:]
+        for line in complete:
+            if len(self.lines) == self.lines.maxlen:
+                self.first += 1
+            self.lines.append(line)
+        return complete
+
+    def page(self, before=None, count=SCROLLBACK_PAGE):
+        """Return ``(start, lines)`` for up to ``count`` lines ending before ``before``."""
+        before = self.end if before is None else max(self.first, min(before, self.end))
+        start = max(self.first, before - count)
+        return start, list(itertools.islice(self.lines, start - self.first, before - self.first))
+
+
+class Subscriber:
+    """One viewer's bounded queue of board output; ``None`` marks the end.
+
+    When the queue is full new output is discarded and only counted in
+    ``dropped``, so the viewer can be shown a marker instead of stalling
+    the hub. ``joined`` is the scrollback line the viewer's output starts at.
+    """
+
+    def __init__(self, joined=0):
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE)
+        self.joined = joined
+        self.dropped = 0
+        self.dropped_lines = 0
+        self.left = False
+        self.lock = threading.Lock()  # the hub drops while the viewer's pump takes
+
+    def drop(self, data):
+        with self.lock:
+            self.dropped += len(data)
+            self.dropped_lines += data.count(b"\n")
+
+    def take_dropped(self):
+        """Return and reset the ``(bytes, lines)`` lost since the last call."""
+        with self.lock:
+            dropped = (self.dropped, self.dropped_lines)
+            self.dropped = self.dropped_lines = 0
+        return dropped
+
+    def marker(self):
+        """Return the dropped-output marker, keeping the viewer's line count in step."""
+        size, lines = self.take_dropped()
+        return f"[{size} bytes dropped: viewer fell behind]" + ("\n" * lines or " ")
+
+    def end(self):
+        """Queue the end marker, making room for it if the viewer is behind."""
+        while True:
+            try:
+                self.queue.put_nowait(None)
+                return
+            except queue.Full:
+                try:
+                    self.drop(self.queue.get_nowait() or b"")
+                except queue.Empty:
+                    pass
+
+
+class ReplHub(Protocol):
+    """Reads one board once and copies every byte to all subscribers.
+
+    Local serial ports are read by the shared ``multiplex.readers`` thread,
+    or, when the hub is opened for an event loop, by that ``loop`` itself;
+    telnet and broker links, which have no port fd, get a thread of their own.
+    A local port is shared through ``connections.shares``: while a
+    ``RawRepl`` drives the board the hub reads nothing and holds viewer input.
+    """
+
+    def __init__(self, key, connection, loop=None):
+        self.key = key
+        if connection.get("type") == "serial":
+            self.link = open_serial(connection, lease=False)
+        else:
+            self.link = TelnetLink(connection)
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.meter = Meter()
+        self.scrollback = Scrollback()
+        self.recorder = Recorder(key[1])
+        self.low_latency_set = False
+        self.closed = False
+        self.loop = None  # the event loop driving the port, if any
+        self.reader = None
+        self.held = False
+        self.held_input = []
+        if hasattr(self.link, "fileno"):
+            shares.register(key[1], self)
+            with self.write_lock:
+                if loop is not None:
+                    self.loop = loop
+                    self.reader = attach(loop, self.link, lambda: self, paused=self.held)
+                else:
+                    self.reader = readers.add(self.link, lambda: self, paused=self.held)
+        else:
+            self.reader = threading.Thread(target=self._read_loop, name=f"repl-{key[1]}", daemon=True)
+            self.reader.start()
+
+    def reading(self):
+        """Return whether the board is still being read."""
+        if isinstance(self.reader, SerialTransport):
+            return not self.reader.is_closing()
+        return self.reader.is_alive()
+
+    def subscribe(self, subscriber=None):
+        with self.lock:
+            subscriber = Subscriber() if subscriber is None else subscriber
+            subscriber.joined = self.scrollback.end
+            # Start the viewer at the beginning of the current line.
+            if self.scrollback.partial:
+                subscriber.queue.put_nowait(self.scrollback.partial.encode())
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """Detach a viewer; returns ``True`` when it was the last one."""
+        subscriber.left = True
+        with self.lock:
+            self.subscribers.discard(subscriber)
+            return not self.subscribers
+
+    def stats(self):
+        return dict(self.meter.snapshot(), board=self.key[1], recording=self.recorder.id,
+                    viewers=len(self.subscribers), dropped=sum(s.dropped for s in list(self.subscribers)),
+                    scrollback=len(self.scrollback.lines))
+
+    def low_latency(self):
+        """Ask the serial driver to hand over bytes immediately, for keystroke mode.
+
+        Returns whether the port accepted it; pseudo-terminals and many USB
+        adapters do not support the flag, which is fine.
+        """
+        if self.low_latency_set or not hasattr(self.link, "set_low_latency_mode"):
+            return self.low_latency_set
+        try:
+            self.link.set_low_latency_mode(True)
+        except (ValueError, NotImplementedError):
+            return False
+        self.low_latency_set = True
+        return True
+
+    def hold(self):
+        """Stop reading the port and hold viewer input while a ``RawRepl`` drives the board."""
+        with self.write_lock:
+            self.held = True
+            if isinstance(self.reader, PortTransport):
+                self.reader.pause_reading()
+            elif isinstance(self.reader, SerialTransport):
+                self.reader.pause_reading_threadsafe()
+
+    def release(self):
+        """Resume reading and send the input held meanwhile."""
+        with self.write_lock:
+            self.held = False
+            if isinstance(self.reader, PortTransport):
+                self.reader.resume_reading()
+            elif isinstance(self.reader, SerialTransport):
+                self.reader.resume_reading_threadsafe()
+            held, self.held_input = self.held_input, []
+            for data in held:
+                self._send(data)
+
+    def retune(self, rate):
+        """Follow the board to a new baud rate; called while the port is held."""
+        self.link.baudrate = rate
+
+    def _send(self, data):
+        if isinstance(self.reader, SerialTransport):
+            self.reader.write_threadsafe(data)
+        elif data == CTRL_C:  # over the broker, ahead of a transfer's queued data
+            write_control(self.link, data)
+        else:
+            self.link.write(data)
+
+    def write(self, data):
+        """Send viewer input to the board, one writer at a time."""
+        if not self.write_lock.acquire(timeout=WRITE_LOCK_TIMEOUT):
+            raise TimeoutError("another viewer is still writing to the board")
+        try:
+            if self.held:
+                self.held_input.append(data)
+            else:
+                self._send(data)
+        finally:
+            self.write_lock.release()
+
+    def publish(self, data):
+        self.recorder.write(data)
+        with self.lock:
+            lines = self.scrollback.feed(data)
+            partial = self.scrollback.partial
+            subscribers = list(self.subscribers)
+        console.add(self.key[1], lines)
+        completions.observe(self.key[1], lines, partial)
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(data)
+            except queue.Full:
+                # Slow consumer: lose its output rather than stall everyone else.
+                subscriber.drop(data)
+
+    def data_received(self, data):
+        self.publish(data)
+
+    def connection_lost(self, exc):
+        """The board is gone or the hub closed: finish the recording and end every viewer."""
+        self.recorder.close()
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.end()
+
+    def _read_loop(self):
+        # One buffer for the hub's lifetime; each read is copied once, into
+        # the bytes object every viewer, the recorder and scrollback share.
+        buffer = memoryview(bytearray(READ_BYTES))
+        try:
+            while not self.closed:
+                count = read_available_into(self.link, buffer)
+                if count:
+                    self.publish(bytes(buffer[:count]))
+        except (OSError, TypeError, ValueError):  # port unplugged, socket closed, or close() raced us
+            pass
+        finally:
+            self.connection_lost(None)
+
+    def close(self):
+        self.closed = True
+        shares.unregister(self.key[1], self)
+        if isinstance(self.reader, PortTransport):
+            self.reader.close()
+        elif isinstance(self.reader, SerialTransport):
+            self.reader.close_threadsafe()
+        else:
+            self.link.close()
+
+
+class HubRegistry:
+    """Shares one ``ReplHub`` per board among all connected viewers."""
+
+    def __init__(self):
+        self.hubs = {}
+        self.viewers = {}
+        self.opening = {}  # key -> lock held while that board's link is opened
+        self.lock = threading.Lock()
+
+    def join(self, connection, viewer=None, subscriber=None, loop=None):
+        """Return ``(hub, subscriber)`` for the board behind ``connection``.
+
+        ``viewer`` is an id chosen by the page, under which it can later page
+        through the scrollback from where its own output started. A prepared
+        ``subscriber`` may be passed in to receive the output. A hub opened
+        here with an event ``loop`` reads and writes its port on that loop.
+        A hub whose board went away is closed and replaced. Links are opened
+        outside the registry lock, so a slow board only delays its own viewers.
+        """
+        connection = resolve(connection)
+        key = ("serial", connection["port"]) if connection.get("type") == "serial" else ("wifi", connection["address"])
+        with self.lock:
+            opening = self.opening.setdefault(key, threading.Lock())
+        with opening:
+            with self.lock:
+                hub = self.hubs.get(key)
+                if hub is not None and not hub.closed and hub.reading():
+                    return self._subscribe(hub, viewer, subscriber)
+                stale = self.hubs.pop(key, None)
+            if stale is not None:
+                stale.close()  # its viewers have been ended; release the fd or socket
+            hub = ReplHub(key, connection, loop)
+            with self.lock:
+                self.hubs[key] = hub
+                return self._subscribe(hub, viewer, subscriber)
+
+    def _subscribe(self, hub, viewer, subscriber):
+        subscriber = hub.subscribe(subscriber)
+        if viewer:
+            self.viewers[viewer] = (hub, subscriber)
+        return hub, subscriber
+
+    def scrollback(self, viewer, before, count=SCROLLBACK_PAGE):
+        """Page back through a viewer's board output.
+
+        ``before`` counts lines from where the viewer joined, so it is zero or
+        negative for output the viewer never received live.
+        """
+        hub, subscriber = self.viewers[viewer]
+        with hub.lock:
+            start, lines = hub.scrollback.page(subscriber.joined + before, min(count, SCROLLBACK_PAGE))
+        return start - subscriber.joined, lines
+
+    def stats(self):
+        """Return per-board viewer counts and output frame rates."""
+        return [hub.stats() for hub in list(self.hubs.values())]
+
+    def leave(self, hub, subscriber):
+        with self.lock:
+            for viewer, (_, joined) in list(self.viewers.items()):
+                if joined is subscriber:
+                    del self.viewers[viewer]
+            if hub.unsubscribe(subscriber) and self.hubs.get(hub.key) is hub:
+                del self.hubs[hub.key]
+                hub.close()
+
+
+hubs = HubRegistry()
+
+
+def repl_connection(message):
+    """Turn the page's ``{"type", "config"}`` handshake into a connection payload."""
+    if not isinstance(message, dict):
+        raise ValueError("The REPL handshake must be a JSON object")
+    if "config" in message:
+        return dict(message["config"], type=message["type"])
+    return message
+
+
+def viewer_input(data, keys=False):
+    """Return the bytes to write for one viewer message.
+
+    Line mode submits each message with ``\r``; lone control characters
+    (Ctrl-C, Ctrl-D) and everything in keystroke mode go through as-is.
+    """
+    data = data.encode() if isinstance(data, str) else data
+    if keys or (len(data) == 1 and data[0] < 0x20):
+        return data
+    return data + b"\r"
+
+
+def handle_message(hub, subscriber, message, binary=False, keys=False):
+    """Act on one viewer message; returns a reply to send back, or ``None``."""
+    if not binary:
+        hub.write(viewer_input(message, keys))
+        return None
+    kind, payload = repl_protocol.unpack(message)
+    if kind == repl_protocol.DATA:
+        hub.write(payload)
+    elif kind == repl_protocol.INTERRUPT:
+        hub.write(CTRL_C)
+    elif kind == repl_protocol.STATUS:
+        return repl_protocol.status("stats", **hub.stats())
+    else:
+        return repl_protocol.status("error", message=f"unknown frame type {kind}")
+    return None
+
+
+def output_messages(frame, decoder, subscriber, binary=False):
+    """Turn a coalesced output ``frame`` into the messages one viewer is sent."""
+    if binary:
+        messages = []
+        if subscriber.dropped:
+            size, lines = subscriber.take_dropped()
+            messages.append(repl_protocol.status("dropped", bytes=size, lines=lines))
+        if frame:
+            messages.append(repl_protocol.pack(repl_protocol.DATA, frame))
+        return messages
+    text = decoder.decode(frame)
+    if subscriber.dropped:
+        text = subscriber.marker() + text
+    return [text] if text else []
+
+
+def closing_message(binary=False):
+    if binary:
+        return repl_protocol.status("disconnected")
+    return "\n*** Board disconnected ***\n"
+
+
+def next_frame(subscriber):
+    """Wait for output and coalesce what follows within the batching window.
+
+    Returns ``(frame, ended)``; ``frame`` is ``None`` when nothing arrived
+    within a second, so callers can check for shutdown.
+    """
+    try:
+        data = subscriber.queue.get(timeout=1)
+    except queue.Empty:
+        return None, False
+    if data is None:
+        return b"", True
+    frame = bytearray(data)
+    deadline = time.monotonic() + COALESCE_SECONDS
+    while len(frame) < COALESCE_BYTES:
+        left = deadline - time.monotonic()
+        if left <= 0:
+            break
+        try:
+            data = subscriber.queue.get(timeout=left)
+        except queue.Empty:
+            break
+        if data is None:
+            return bytes(frame), True
+        frame += data
+    return bytes(frame), False
+
+
+def pump_output(ws, hub, subscriber, binary=False):
+    """Forward board output to one viewer in coalesced frames until the hub ends.
+
+    A slow browser blocks ``ws.send``; the viewer's queue then fills and the
+    hub starts dropping its output, which is reported as a marker (or a
+    ``dropped`` status frame with the binary subprotocol). A viewer whose
+    socket closed under us leaves the hub at once.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    ended = False
+    try:
+        while not ended:
+            frame, ended = next_frame(subscriber)
+            if frame is None:
+                if subscriber.left:
+                    return
+                continue
+            for message in output_messages(frame, decoder, subscriber, binary):
+                ws.send(message)
+                hub.meter.add(message)
+        ws.send(closing_message(binary))
+        ws.close()
+    except ConnectionClosed:
+        hubs.leave(hub, subscriber)
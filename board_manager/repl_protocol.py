@@ -0,0 +1,40 @@
+"""Binary ``/repl`` subprotocol: raw board bytes plus small typed control frames.
+
+A browser that offers ``SUBPROTOCOL`` gets board output untouched, so binary
+output and UTF-8 sequences split across reads survive and decoding happens in
+the page. The first message is still the JSON handshake; after that every
+binary message starts with one frame-type byte:
+
+``DATA``       raw bytes, both directions
+``INTERRUPT``  browser to server, no payload: Ctrl-C to the board
+``STATUS``     JSON; events from the server (``joined``, ``dropped``,
+               ``stats``, ``error``, ``disconnected``), and an empty one from
+               the browser asks for ``stats``
+
+Type 1 was a terminal size report that nothing used; it is no longer accepted.
+"""
+import json
+
+SUBPROTOCOL = "board-repl.v1"
+
+DATA = 0
+INTERRUPT = 2
+STATUS = 3
+
+def pack(kind, payload=b""):
+    return bytes((kind,)) + bytes(payload)
+
+
+def status(event, **fields):
+    """Return a ``STATUS`` frame for ``event``."""
+    return pack(STATUS, json.dumps(dict(fields, event=event)).encode())
+
+
+def unpack(message):
+    """Split a browser message into ``(kind, payload)``; text counts as ``DATA``."""
+    if isinstance(message, str):
+        return DATA, message.encode()
+    if not message:
+        raise ValueError("empty frame")
+    return message[0], message[1:]
+
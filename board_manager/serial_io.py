@@ -0,0 +1,192 @@
+"""Allocation-free reads from serial ports into caller-owned buffers.
+
+``serial.Serial.read`` grows a fresh ``bytearray`` from ``os.read`` results
+and converts it to ``bytes`` on every call; the raw REPL then copied that
+into its own buffer and sliced it out again. At high baud rates that churn
+dominates. ``Serial.read_available_into`` asks the driver how much is queued
+(``TIOCINQ``) and reads exactly that straight into a ``memoryview``, and
+``RingBuffer`` gives readers preallocated storage to read into.
+"""
+import errno
+import os
+import select
+import struct
+
+import serial
+from serial.serialutil import PortNotOpenError, SerialException, Timeout
+
+try:
+    import fcntl
+    from serial.serialposix import TIOCINQ, TIOCM_zero_str
+except ImportError:  # not POSIX; ``Serial`` is then plain ``serial.Serial``
+    fcntl = None
+
+RING_BYTES = 64 * 1024
+
+
+class Serial(serial.Serial):
+    """``serial.Serial`` with zero-copy ``readinto`` and ``read_available_into``."""
+
+    def _queued(self):
+        return struct.unpack("I", fcntl.ioctl(self.fd, TIOCINQ, TIOCM_zero_str))[0]
+
+    def _wait_readable(self, timeout):
+        """Wait until data is queued; returns ``False`` on timeout or ``cancel_read``."""
+        while True:
+            try:
+                ready, _, _ = select.select([self.fd, self.pipe_abort_read_r], [], [], timeout.time_left())
+            except InterruptedError:
+                continue
+            if self.pipe_abort_read_r in ready:
+                os.read(self.pipe_abort_read_r, 1000)
+                return False
+            return bool(ready)
+
+    def _read_into(self, view):
+        try:
+            count = os.readv(self.fd, [view])
+        except BlockingIOError:
+            return 0
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EINTR):
+                return 0
+            raise SerialException(f"read failed: {e}") from e
+        if not count:
+            # Same as serialposix: a vanished device polls readable but reads nothing.
+            raise SerialException("device reports readiness to read but returned no data "
+                                  "(device disconnected or multiple access on port?)")
+        return count
+
+    def read_available_into(self, buffer):
+        """Fill ``buffer`` with what the driver has queued, waiting up to ``timeout`` for the first byte.
+
+        Returns the number of bytes written, 0 on timeout.
+        """
+        if not self.is_open:
+            raise PortNotOpenError()
+        view = memoryview(buffer).cast("B")
+        queued = self._queued()
+        if not queued:
+            if not self._wait_readable(Timeout(self._timeout)):
+                return 0
+            queued = self._queued() or len(view)
+        return self._read_into(view[:min(queued, len(view))])
+
+    def hung_up(self):
+        """Return whether the device has gone away (unplugged), without reading from it."""
+        if not self.is_open:
+            return True
+        poller = select.poll()
+        poller.register(self.fd, select.POLLIN)
+        return any(events & (select.POLLHUP | select.POLLERR | select.POLLNVAL) for _, events in poller.poll(0))
+
+    def readinto(self, buffer):
+        """Like ``read(len(buffer))``, but straight into ``buffer``; returns the count."""
+        if not self.is_open:
+            raise PortNotOpenError()
+        view = memoryview(buffer).cast("B")
+        timeout = Timeout(self._timeout)
+        filled = 0
+        while filled < len(view):
+            if not self._queued() and not self._wait_readable(timeout):
+                break
+            filled += self._read_into(view[filled:])
+            if timeout.expired():
+                break
+        return filled
+
+
+if fcntl is None:
+    Serial = serial.Serial
+
+
+def read_available_into(port, buffer):
+    """``port.read_available_into(buffer)`` for any pyserial-style port, copying once where unsupported."""
+    method = getattr(port, "read_available_into", None)
+    if method is not None:
+        return method(buffer)
+    data = port.read(min(len(buffer), max(1, port.in_waiting)))
+    buffer[:len(data)] = data
+    return len(data)
+
+
+def write_control(port, data):
+    """Write ``data``, e.g. Ctrl-C, ahead of writes still queued where the port queues them (``BrokerSerial``)."""
+    method = getattr(port, "write_control", None)
+    if method is not None:
+        return method(data)
+    return port.write(data)
+
+
+class RingBuffer:
+    """Preallocated byte buffer that ports read into and parsers consume from.
+
+    Unread bytes stay contiguous so they can be searched in place; consumed
+    space is reclaimed by moving the (usually tiny) unread remainder to the
+    front only when reads reach the end of the storage.
+    """
+
+    def __init__(self, capacity=RING_BYTES):
+        self.data = bytearray(capacity)
+        self.view = memoryview(self.data)
+        self.start = self.end = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __bytes__(self):
+        return bytes(self.view[self.start:self.end])
+
+    def _make_room(self, size, front=0):
+        """Move the unread bytes to offset ``front``, growing the storage to fit ``size`` more."""
+        unread = len(self)
+        if front + unread + size > len(self.data):
+            data = bytearray(max(2 * len(self.data), front + unread + size))
+            data[front:front + unread] = self.view[self.start:self.end]
+            self.data, self.view = data, memoryview(data)
+        elif unread:
+            self.data[front:front + unread] = self.data[self.start:self.end]
+        self.start, self.end = front, front + unread
+
+    def _reserve(self, size):
+        """Make room for ``size`` more bytes after the unread ones."""
+        if len(self.data) - self.end < size:
+            self._make_room(size)
+
+    def fill(self, read_into, size=4096):
+        """Call ``read_into(view)`` on at least ``size`` bytes of free space; returns its count."""
+        self._reserve(size)
+        count = read_into(self.view[self.end:])
+        self.end += count
+        return count
+
+    def extend(self, data):
+        self._reserve(len(data))
+        self.view[self.end:self.end + len(data)] = data
+        self.end += len(data)
+
+    def unread(self, data):
+        """Put ``data`` back in front of the unread bytes."""
+        if len(data) > self.start:
+            self._make_room(0, front=len(data))
+        self.start -= len(data)
+        self.view[self.start:self.start + len(data)] = data
+
+    def find(self, sub):
+        """Return the offset of ``sub`` among the unread bytes, or -1."""
+        found = self.data.find(sub, self.start, self.end)
+        return found - self.start if found >= 0 else -1
+
+    def take(self, size):
+        """Consume and return the first ``size`` unread bytes, or all of them if fewer."""
+        data = bytes(self.view[self.start:min(self.start + size, self.end)])
+        self.start += len(data)
+        if self.start == self.end:
+            self.start = self.end = 0
+        return data
+
+    def tail(self, size):
+        return bytes(self.view[max(self.start, self.end - size):self.end])
+
+    def clear(self):
+        self.start = self.end = 0
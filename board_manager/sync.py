@@ -0,0 +1,85 @@
+"""Content-hash manifests so uploads only send what the board is missing."""
+import hashlib
+
+from .framed import send_file
+
+BLOCK_SIZE = 1024
+BLOCK_DIGEST_LEN = 8  # bytes of each per-block SHA-256 kept for comparison
+
+# Runs on the board: hash each requested file in BLOCK_SIZE reads and print
+# "path<TAB>size<TAB>sha256[<TAB>block,block,...]" per file that exists.
+MANIFEST_SCRIPT = """\
+import os
+try:
+    import uhashlib as hashlib
+    import ubinascii as binascii
+except ImportError:
+    import hashlib, binascii
+buf = bytearray({block})
+for p in {paths!r}:
+    try:
+        f = open(p, 'rb')
+    except OSError:
+        continue
+    h = hashlib.sha256()
+    bl = []
+    n = 0
+    while True:
+        k = f.readinto(buf)
+        if not k:
+            break
+        m = memoryview(buf)[:k]
+        h.update(m)
+        if {blocks}:
+            bl.append(binascii.hexlify(hashlib.sha256(m).digest()[:{digest_len}]).decode())
+        n += k
+    f.close()
+    print(p, n, binascii.hexlify(h.digest()).decode(), ','.join(bl), sep='\\t')
+"""
+
+
+def board_manifest(repl, paths, blocks=False, block_size=BLOCK_SIZE):
+    """Return ``{path: (size, sha256_hex, block_digests)}`` for files on the board."""
+    out = repl.exec(MANIFEST_SCRIPT.format(paths=list(paths), block=block_size, blocks=blocks,
+                                           digest_len=BLOCK_DIGEST_LEN), timeout=60)
+    manifest = {}
+    for line in out.decode().splitlines():
+        path, size, digest, block_list = line.split("\t")
+        manifest[path] = (int(size), digest, block_list.split(",") if block_list else [])
+    return manifest
+
+
+def block_digests(data, block_size=BLOCK_SIZE):
+    """Return the truncated per-block digests the board reports for ``data``."""
+    return [hashlib.sha256(data[i:i + block_size]).digest()[:BLOCK_DIGEST_LEN].hex()
+            for i in range(0, len(data), block_size)]
+
+
+def changed_blocks(data, remote_blocks, block_size=BLOCK_SIZE):
+    """Return ``(offset, data)`` for every block of ``data`` that differs on the board."""
+    view = memoryview(data)
+    return [(i * block_size, view[i * block_size:(i + 1) * block_size])
+            for i, digest in enumerate(block_digests(data, block_size))
+            if i >= len(remote_blocks) or remote_blocks[i] != digest]
+
+
+def sync_file(repl, path, data, entry, blocks=False, block_size=BLOCK_SIZE, framed=False):
+    """Bring ``path`` on the board in line with ``data``.
+
+    ``entry`` is the board's manifest entry for ``path`` (``None`` if missing).
+    With ``blocks`` only the changed blocks of a file are rewritten, provided
+    the file did not shrink (MicroPython files cannot be truncated in place).
+    Whole files go over the checksummed framed protocol when ``framed`` is set.
+    Returns the number of bytes sent, or ``None`` if the file was unchanged.
+    """
+    if entry and entry[1] == hashlib.sha256(data).hexdigest():
+        return None
+    if blocks and entry and len(data) >= entry[0]:
+        delta = changed_blocks(data, entry[2], block_size)
+        repl.patch_file(path, delta)
+        return sum(len(d) for _, d in delta)
+    if framed:
+        send_file(repl, path, data)
+    else:
+        repl.put_file(path, data)
+    return len(data)
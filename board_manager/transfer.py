@@ -0,0 +1,105 @@
+"""File transfer between the host and a board over serial or WiFi/FTP."""
+import contextlib
+import ftplib
+import io
+import posixpath
+import re
+
+from .connections import board_link, sessions
+from .raw_repl import RawRepl
+from .sync import board_manifest, sync_file
+
+FLASH_ROOT = "/flash"
+
+# Runs on the board: delete the given files if they exist.
+REMOVE_SCRIPT = """\
+import os
+for p in {paths!r}:
+    try:
+        os.remove(p)
+    except OSError:
+        pass
+"""
+
+# Pycom firmware numbers its own releases ("1.20.2.r4") and reports the
+# MicroPython it is built on, which decides the .mpy format, in the version.
+VERSION_SCRIPT = "import os\nprint(os.uname().version)\n"
+UPSTREAM_VERSION = re.compile(r"v(\d+\.\d+(?:\.\d+)?)")
+
+
+def stale_sources(files, remote_dir=FLASH_ROOT):
+    """Return the board paths of ``.py`` files that uploaded ``.mpy`` modules replace.
+
+    MicroPython imports ``foo.py`` ahead of ``foo.mpy``, so a source left
+    next to its compiled module would shadow it.
+    """
+    names = {name for name, _ in files}
+    return [posixpath.join(remote_dir, name[:-4] + ".py") for name, _ in files
+            if name.endswith(".mpy") and name[:-4] + ".py" not in names]
+
+
+def upload_files(connection, files, remote_dir=FLASH_ROOT, blocks=False, framed=False):
+    """Write ``(name, data)`` pairs to ``remote_dir`` on the board.
+
+    Over serial, files whose SHA-256 already matches the board's copy are
+    skipped (see ``sync``), and ``framed`` sends the rest with CRC-checked,
+    retransmitted frames (see ``framed``). Returns ``[(name, bytes_sent), ...]`` where
+    ``bytes_sent`` is ``None`` for skipped files. The ``.py`` sources of
+    uploaded ``.mpy`` modules are removed from the board.
+    """
+    stale = stale_sources(files, remote_dir)
+    with board_link(connection) as link:
+        if isinstance(link, RawRepl):
+            paths = {name: posixpath.join(remote_dir, name) for name, _ in files}
+            manifest = board_manifest(link, paths.values(), blocks)
+            sent = [(name, sync_file(link, paths[name], data, manifest.get(paths[name]), blocks, framed))
+                    for name, data in files]
+            if stale:
+                link.exec(REMOVE_SCRIPT.format(paths=stale))
+            return sent
+        for name, data in files:
+            link.storbinary(f"STOR {posixpath.join(remote_dir, name)}", io.BytesIO(data))
+        for path in stale:
+            with contextlib.suppress(ftplib.error_perm):  # no such file
+                link.delete(path)
+        return [(name, len(data)) for name, data in files]
+
+
+def board_micropython(connection):
+    """Return the MicroPython version a serial board is built on, e.g. ``"1.11"``.
+
+    Returns ``None`` over WiFi, or if the board does not say. A session asks
+    the board once and remembers the answer.
+    """
+    session = sessions.get(connection["session"]) if "session" in connection else None
+    if session is not None and session.micropython is not None:
+        return session.micropython
+    with board_link(connection) as link:
+        if not isinstance(link, RawRepl):
+            return None
+        match = UPSTREAM_VERSION.search(link.exec(VERSION_SCRIPT, timeout=5).decode(errors="replace"))
+    version = match[1] if match else None
+    if session is not None:
+        session.micropython = version
+    return version
+
+
+def ftp_chunks(ftp, path, blocksize=8192):
+    """Yield the contents of ``path`` from an FTP server as it arrives."""
+    ftp.voidcmd("TYPE I")
+    with ftp.transfercmd(f"RETR {path}") as conn:
+        while data := conn.recv(blocksize):
+            yield data
+    ftp.voidresp()
+
+
+def download_files(connection, names, remote_dir=FLASH_ROOT):
+    """Yield ``(name, chunks)`` for each file read from ``remote_dir`` on the board.
+
+    The board connection stays open while the generator runs, and each
+    ``chunks`` iterator must be consumed before advancing to the next file.
+    """
+    with board_link(connection) as link:
+        for name in names:
+            path = posixpath.join(remote_dir, name)
+            yield name, link.get_file(path) if isinstance(link, RawRepl) else ftp_chunks(link, path)
@@ -0,0 +1,112 @@
+"""Compare thread-per-socket and asyncio serving of ``/repl`` viewers.
+
+A fake board on a pseudo-terminal is shared by ``--clients`` viewers, first
+through the Flask/flask-sock routes and then through ``aio_ws``. For each the
+board prints ``--lines`` lines and the report gives the server threads in use
+and how long until every viewer has seen the last line::
+
+    python -m board_manager.ws_bench --clients 200 --lines 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+import tty
+
+from simple_websocket import AioClient
+
+from .repl_hub import hubs
+
+DONE = "bench done"
+
+
+def fake_board():
+    """Return ``(master_fd, device)`` of a pseudo-terminal standing in for a board."""
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    return master, os.ttyname(slave)
+
+
+def start_threaded():
+    """Serve the Flask routes from a thread-per-connection werkzeug server."""
+    from flask import Flask
+    from werkzeug.serving import make_server
+
+    from .api import api
+
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_port
+
+
+def start_async():
+    """Serve ``aio_ws`` from an event loop on a background thread."""
+    from .aio_ws import serve
+
+    ready = threading.Event()
+    port = []
+
+    def run():
+        asyncio.run(serve("127.0.0.1", 0, lambda p: (port.append(p), ready.set())))
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return port[0]
+
+
+async def viewer(port, device, joined):
+    ws = await AioClient.connect(f"ws://127.0.0.1:{port}/repl")
+    await ws.send(json.dumps({"type": "serial", "config": {"port": device}}))
+    joined.release()
+    return ws
+
+
+async def wait_for_done(ws):
+    tail = ""
+    while DONE not in tail:
+        tail = (tail + await ws.receive())[-64:]
+
+
+async def measure(port, device, master, clients, lines):
+    baseline = threading.active_count()
+    joined = asyncio.Semaphore(0)
+    sockets = await asyncio.gather(*(viewer(port, device, joined) for _ in range(clients)))
+    while sum(board["viewers"] for board in hubs.stats()) < clients:
+        await asyncio.sleep(0.05)
+    threads = threading.active_count() - baseline
+    payload = b"".join(b"line %d\r\n" % i for i in range(lines)) + DONE.encode() + b"\r\n"
+    start = time.perf_counter()
+    writer = asyncio.create_task(asyncio.to_thread(os.write, master, payload))
+    await asyncio.gather(*(wait_for_done(ws) for ws in sockets))
+    seconds = time.perf_counter() - start
+    await writer
+    stats = hubs.stats()
+    for ws in sockets:
+        await ws.close()
+    while hubs.stats():
+        await asyncio.sleep(0.05)
+    return {"threads": threads, "seconds": round(seconds, 3),
+            "frames": sum(board["frames"] for board in stats),
+            "dropped": sum(board["dropped"] for board in stats)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m board_manager.ws_bench",
+                                     description="Benchmark thread-per-socket against asyncio /repl serving.")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--lines", type=int, default=1000)
+    args = parser.parse_args(argv)
+    master, device = fake_board()
+    for mode, start in (("threaded", start_threaded), ("asyncio", start_async)):
+        result = asyncio.run(measure(start(), device, master, args.clients, args.lines))
+        print(f"{mode:>9}: {args.clients} viewers, {result['threads']} extra threads, "
+              f"{args.lines} lines in {result['seconds']} s, {result['frames']} frames, "
+              f"{result['dropped']} bytes dropped")
+
+
+if __name__ == "__main__":
+    main()
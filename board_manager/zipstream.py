@@ -0,0 +1,42 @@
+"""Build zip archives incrementally so they can be streamed as a response."""
+import time
+import zipfile
+
+
+class _Sink:
+    """Write-only, unseekable file object whose contents the generator drains."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def stream_zip(entries, compression=zipfile.ZIP_DEFLATED):
+    """Yield a zip archive of ``(name, chunks)`` entries while it is being built.
+
+    ``chunks`` is any iterable of bytes; it is consumed lazily, so nothing is
+    buffered beyond what the compressor holds.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression) as archive:
+        for name, chunks in entries:
+            info = zipfile.ZipInfo(name, time.localtime()[:6])
+            info.compress_type = compression
+            with archive.open(info, "w") as dest:
+                for chunk in chunks:
+                    dest.write(chunk)
+                    if sink.buffer:
+                        yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
@@ -66,25 +66,61 @@ async function testConnection() {
     }
 }
 
-async function refreshSerialPorts() {
+function showSerialPorts(ports) {
     const serialPortSelect = document.getElementById("serial-port");
+    const selected = serialPortSelect.value;
     serialPortSelect.innerHTML = '<option value="">Select a port...</option>';
 
+    ports.forEach(port => {
+        const option = document.createElement("option");
+        option.value = port.device;
+        option.textContent = `${port.device} (${port.description})`;
+        serialPortSelect.appendChild(option);
+    });
+    serialPortSelect.value = selected;
+    if (serialPortSelect.selectedIndex < 0) {
+        serialPortSelect.value = "";
+    }
+}
+
+async function refreshSerialPorts() {
     try {
         const response = await fetch("/api/serial-ports");
-        const ports = await response.json();
-
-        ports.forEach(port => {
-            const option = document.createElement("option");
-            option.value = port.device;
-            option.textContent = `${port.device} (${port.description})`;
-            serialPortSelect.appendChild(option);
-        });
+        showSerialPorts(await response.json());
     } catch (error) {
         console.error("Failed to fetch serial ports:", error);
     }
 }
 
+// Keep the port list current as boards are plugged in or removed
+function watchSerialPorts() {
+    const events = new EventSource("/api/serial-ports/events");
+    const serialPortSelect = document.getElementById("serial-port");
+
+    events.addEventListener("add", (event) => {
+        const port = JSON.parse(event.data);
+        const option = document.createElement("option");
+        option.value = port.device;
+        option.textContent = `${port.device} (${port.description})`;
+        serialPortSelect.appendChild(option);
+    });
+
+    // Sent instead of the add/remove events this page fell behind on
+    events.addEventListener("ports", (event) => {
+        showSerialPorts(JSON.parse(event.data));
+    });
+
+    events.addEventListener("remove", (event) => {
+        const port = JSON.parse(event.data);
+        for (const option of serialPortSelect.options) {
+            if (option.value === port.device) {
+                option.remove();
+                break;
+            }
+        }
+    });
+}
+
 document.getElementById("upload-files").addEventListener("change", function (e) {
     const fileListElement = document.getElementById("upload-file-list");
     fileListElement.innerHTML = "";
@@ -127,7 +163,20 @@ async function uploadFiles() {
     for (const file of files) {
         formData.append("files", file);
     }
-    formData.append("connection", JSON.stringify(connectionData));
+    formData.append("connection", JSON.stringify(boardSession ? { session: boardSession } : connectionData));
+    if (document.getElementById("upload-delta").checked) {
+        formData.append("delta", "blocks");
+    }
+    if (document.getElementById("upload-compile").checked) {
+        formData.append("compile", "1");
+        const micropython = document.getElementById("upload-micropython").value.trim();
+        if (micropython) {
+            formData.append("micropython", micropython);
+        }
+    }
+    if (document.getElementById("upload-framed").checked) {
+        formData.append("framed", "1");
+    }
 
     try {
         const response = await fetch("/api/upload", {
@@ -146,7 +195,6 @@ async function uploadFiles() {
 
 async function downloadFiles() {
     const connectionType = document.querySelector('input[name="connection-type"]:checked').value;
-    const filenames = ["main.py", "boot.py"]; // Example files; replace with user input
     const statusElement = document.getElementById("download-status");
 
     let connectionData;
@@ -172,15 +220,15 @@ async function downloadFiles() {
                 "Content-Type": "application/json",
             },
             body: JSON.stringify({
-                connection: connectionData,
-                files: filenames,
+                connection: boardSession ? { session: boardSession } : connectionData,
+                recursive: true,
             }),
         });
 
         const result = await response.json();
         if (result.success) {
-            // Trigger download of the zip file
-            window.location.href = `/download?path=${encodeURIComponent(result.zip_path)}`;
+            // The zip is streamed straight from the board as files are read
+            window.location.href = `/download?id=${encodeURIComponent(result.download_id)}`;
             statusElement.textContent = "Download successful!";
             statusElement.style.color = "green";
         } else {
@@ -303,8 +351,9 @@ function searchFAQ(searchTerm) {
 
 // Initialize main page functionality (existing code)
 function initializeMainPage() {
-    // Load serial ports on page load
+    // Load serial ports on page load, then follow hot-plug events
     refreshSerialPorts();
+    watchSerialPorts();
 
     // Set up connection type toggle
     const connectionTypeRadios = document.querySelectorAll('input[name="connection-type"]');
@@ -331,8 +380,60 @@ function toggleConnectionForm() {
     }
 }
 
-// REPL WebSocket connection
+// REPL WebSocket connection. With the board-repl.v1 subprotocol the server
+// sends raw board bytes, and text is decoded here; every binary message starts
+// with a frame type byte.
 let replSocket = null;
+const REPL_SUBPROTOCOL = 'board-repl.v1';
+const REPL_FRAME = {data: 0, interrupt: 2, status: 3};
+let replDecoder = null;
+
+function replBinary() {
+    return replSocket && replSocket.protocol === REPL_SUBPROTOCOL;
+}
+
+function sendREPLFrame(kind, payload = new Uint8Array(0)) {
+    const frame = new Uint8Array(payload.length + 1);
+    frame[0] = kind;
+    frame.set(payload, 1);
+    replSocket.send(frame);
+}
+
+// Send input to the board; `line` input gets the Enter the board expects
+function sendREPL(data, line = false) {
+    if (!replBinary()) {
+        replSocket.send(data);  // the server adds the Enter in text mode
+        return;
+    }
+    sendREPLFrame(REPL_FRAME.data, new TextEncoder().encode(line ? data + '\r' : data));
+}
+
+function handleREPLStatus(status) {
+    if (status.event === 'dropped') {
+        // One newline per dropped line keeps the line numbers in step with the server
+        appendToREPL(`[${status.bytes} bytes dropped: viewer fell behind]` + ('\n'.repeat(status.lines) || ' '));
+    } else if (status.event === 'error') {
+        appendToREPL(`Error: ${status.message}\n`, true);
+    } else if (status.event === 'disconnected') {
+        appendToREPL(replDecoder.decode() + '\n*** Board disconnected ***\n', true);
+    }
+}
+
+function handleREPLMessage(event) {
+    if (typeof event.data === 'string') {
+        appendToREPL(event.data);
+        return;
+    }
+    const frame = new Uint8Array(event.data);
+    if (frame[0] === REPL_FRAME.data) {
+        const text = replDecoder.decode(frame.subarray(1), {stream: true});
+        if (text) {
+            appendToREPL(text);
+        }
+    } else if (frame[0] === REPL_FRAME.status) {
+        handleREPLStatus(JSON.parse(new TextDecoder().decode(frame.subarray(1))));
+    }
+}
 
 function initializeREPL() {
     const connectionType = document.querySelector('input[name="connection-type"]:checked').value;
@@ -345,13 +446,22 @@ function initializeREPL() {
     }
 
     // Create WebSocket connection
-    replSocket = new WebSocket(`ws://${window.location.host}/repl`);
+    replSocket = new WebSocket(`ws://${window.location.host}/repl`, [REPL_SUBPROTOCOL]);
+    replSocket.binaryType = 'arraybuffer';
+    replDecoder = new TextDecoder();
 
+    resetREPL();
     replSocket.onopen = () => {
-        appendToREPL('Connected to board REPL\n');
+        appendToREPL('Connected to board REPL\n', true);
         
-        // Send connection info
-        const connectionData = {
+        // Send connection info; an open session carries the rate it negotiated
+        const connectionData = boardSession ? {
+            viewer: replTerm.viewer,
+            keys: document.getElementById('repl-keys').checked,
+            session: boardSession,
+        } : {
+            viewer: replTerm.viewer,
+            keys: document.getElementById('repl-keys').checked,
             type: connectionType,
             config: connectionType === 'wifi' ? {
                 address: document.getElementById('wifi-address').value,
@@ -365,53 +475,419 @@ function initializeREPL() {
         replSocket.send(JSON.stringify(connectionData));
     };
 
-    replSocket.onmessage = (event) => {
-        appendToREPL(event.data);
-    };
+    replSocket.onmessage = handleREPLMessage;
 
     replSocket.onclose = () => {
-        appendToREPL('Disconnected from board REPL\n');
+        appendToREPL('Disconnected from board REPL\n', true);
     };
 
     replSocket.onerror = (error) => {
-        appendToREPL(`Error: ${error.message}\n`);
+        appendToREPL(`Error: ${error.message}\n`, true);
     };
 
     // Handle input
-    replInput.addEventListener('keypress', (event) => {
+    replLine = '';
+    replInput.onkeydown = handleREPLKey;
+}
+
+// Keystroke mode sends every key as it is pressed; the board echoes it
+const REPL_KEYS = {
+    Enter: '\r', Backspace: '\x7f', Escape: '\x1b', Delete: '\x1b[3~', Home: '\x1b[H', End: '\x1b[F',
+    ArrowUp: '\x1b[A', ArrowDown: '\x1b[B', ArrowRight: '\x1b[C', ArrowLeft: '\x1b[D',
+};
+let replLine = '';  // what has been typed on the board's current line, for completion
+
+function handleREPLKey(event) {
+    const replInput = document.getElementById('repl-input');
+    if (!replSocket || replSocket.readyState !== WebSocket.OPEN) {
+        return;
+    }
+    if (!document.getElementById('repl-keys').checked) {
         if (event.key === 'Enter') {
             const command = replInput.value;
-            replSocket.send(command);
+            sendREPL(command, true);
             replInput.value = '';
-            appendToREPL(`>>>> ${command}\n`);
+            appendToREPL(`>>>> ${command}\n`, true);
+        }
+        return;
+    }
+    let data = null;
+    if (event.key === 'Tab') {
+        event.preventDefault();
+        completeREPL();
+        return;
+    } else if (event.ctrlKey && /^[a-z]$/i.test(event.key)) {
+        data = String.fromCharCode(event.key.toUpperCase().charCodeAt(0) - 64);
+    } else if (event.key in REPL_KEYS) {
+        data = REPL_KEYS[event.key];
+    } else if (event.key.length === 1 && !event.metaKey) {
+        data = event.key;
+    }
+    if (data === null) {
+        return;
+    }
+    event.preventDefault();
+    sendREPL(data);
+    if (data === '\x7f') {
+        replLine = replLine.slice(0, -1);
+    } else if (data.length === 1 && data >= ' ') {
+        replLine += data;
+    } else {
+        replLine = '';  // Enter, control keys or cursor movement
+    }
+}
+
+// Complete `name.prefix` from the board's attributes, cached per firmware on
+// the server. Anything else, and any cache miss, goes to the board's own
+// completion; for `name.` with nothing after the dot the server caches the
+// candidates the board prints. Like the board, the cache leaves out `_` names.
+async function completeREPL() {
+    const match = replLine.match(/([A-Za-z_][\w.]*)\.(\w*)$/);
+    if (!match || match[2].startsWith('_')) {
+        sendREPL('\t');
+        return;
+    }
+    const [, name, prefix] = match;
+    const response = await fetch('/api/repl/completions', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({connection: currentConnection(), name, learn: prefix === ''}),
+    });
+    const result = await response.json();
+    if (result.retype) {
+        sendREPL(replLine);  // asking the board for its firmware cleared its prompt
+    }
+    if (!result.success || !result.names) {
+        sendREPL('\t');
+        return;
+    }
+    const candidates = result.names.filter(n => n.startsWith(prefix) && !n.startsWith('_'));
+    if (candidates.length === 0) {
+        return;
+    }
+    const common = candidates.reduce((a, b) => {
+        let i = 0;
+        while (i < a.length && a[i] === b[i]) {
+            i++;
+        }
+        return a.slice(0, i);
+    });
+    const rest = common.slice(prefix.length);
+    if (rest) {
+        sendREPL(rest);
+        replLine += rest;
+    }
+    if (candidates.length > 1) {
+        appendToREPL(candidates.join('  ') + '\n', true);
+    }
+}
+
+function currentConnection() {
+    const connectionType = document.querySelector('input[name="connection-type"]:checked').value;
+    if (boardSession) {
+        return {session: boardSession};
+    }
+    return connectionType === 'wifi' ? {
+        type: 'wifi',
+        address: document.getElementById('wifi-address').value,
+        username: document.getElementById('wifi-username').value,
+        password: document.getElementById('wifi-password').value,
+    } : {
+        type: 'serial',
+        port: document.getElementById('serial-port').value,
+        baudrate: parseInt(document.getElementById('serial-baudrate').value),
+    };
+}
+
+// Virtualized REPL terminal: output is kept as a bounded list of rows and
+// only the rows in view are put in the DOM. Rows from the board carry their
+// line number relative to where this viewer joined, so older output can be
+// paged in from the server's scrollback when scrolling to the top.
+const REPL_MAX_ROWS = 5000;
+const REPL_ROW_HEIGHT = 18;  // matches .repl-output line-height
+const REPL_PAGE_ROWS = 500;
+
+const replTerm = {
+    rows: [],        // {text, line}; line is null for the page's own notes
+    tail: -1,        // index of the row board output is being appended to
+    pending: '',     // an escape sequence split across output chunks
+    nextLine: 0,
+    viewer: null,
+    loading: false,
+    drawQueued: false,
+};
+
+function resetREPL() {
+    replTerm.rows = [];
+    replTerm.tail = -1;
+    replTerm.pending = '';
+    replTerm.nextLine = 0;
+    replTerm.viewer = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+    const replOutput = document.getElementById('repl-output');
+    if (!replOutput.querySelector('.repl-rows')) {
+        replOutput.textContent = '';
+        replOutput.append(document.createElement('div'), Object.assign(document.createElement('pre'), {className: 'repl-rows'}));
+        replOutput.addEventListener('scroll', () => {
+            if (replOutput.scrollTop === 0) {
+                loadEarlierREPL();
+            }
+            drawREPL();
+        });
+    }
+    drawREPL();
+}
+
+// What the board's line editor sends besides text: \r, \b and CSI cursor
+// moves and line erases for Backspace, arrows and history; other escapes are
+// dropped. An escape cut off at the end of a chunk waits for the next one.
+const REPL_CONTROL = /\x1b\[([0-9;]*)([@-~])|\x1b[^[]?|[\b\r]|[^\x1b\b\r]+/g;
+const REPL_PARTIAL_ESCAPE = /\x1b(\[[0-9;]*)?$/;
+
+// Apply board output to one row as a terminal would: text overwrites at the
+// row's cursor, which the control sequences move.
+function writeREPLRow(row, text) {
+    let line = row.text;
+    let col = row.col ?? line.length;
+    for (const [token, param, command] of text.matchAll(REPL_CONTROL)) {
+        const count = parseInt(param, 10) || 1;
+        if (token === '\r') {
+            col = 0;
+        } else if (token === '\b' || command === 'D') {
+            col = Math.max(0, col - (command ? count : 1));
+        } else if (command === 'C') {
+            col += count;
+        } else if (command === 'K') {
+            if (!param || param === '0') {
+                line = line.slice(0, col);
+            } else {
+                line = param === '1' ? ' '.repeat(col) + line.slice(col) : '';
+            }
+        } else if (token[0] !== '\x1b') {
+            line = line.slice(0, col).padEnd(col) + token + line.slice(col + token.length);
+            col += token.length;
+        }
+    }
+    row.text = line;
+    row.col = col;
+}
+
+function appendToREPL(text, note = false) {
+    const rows = replTerm.rows;
+    if (note) {
+        // Page notes get rows of their own and are skipped by line numbering
+        const parts = text.replace(/\r/g, '').split('\n');
+        if (parts[parts.length - 1] === '') {
+            parts.pop();
+        }
+        parts.forEach(part => rows.push({text: part, line: null}));
+    } else {
+        text = replTerm.pending + text;
+        const cut = text.search(REPL_PARTIAL_ESCAPE);
+        replTerm.pending = cut >= 0 ? text.slice(cut) : '';
+        const parts = (cut >= 0 ? text.slice(0, cut) : text).split('\n');
+        if (replTerm.tail < 0) {
+            replTerm.tail = rows.push({text: '', line: replTerm.nextLine++}) - 1;
+        }
+        writeREPLRow(rows[replTerm.tail], parts[0]);
+        for (const part of parts.slice(1)) {
+            replTerm.tail = rows.push({text: '', line: replTerm.nextLine++}) - 1;
+            writeREPLRow(rows[replTerm.tail], part);
+        }
+    }
+    if (rows.length > REPL_MAX_ROWS) {
+        const excess = rows.length - REPL_MAX_ROWS;
+        rows.splice(0, excess);
+        replTerm.tail -= excess;
+    }
+    scheduleREPLDraw(true);
+}
+
+function scheduleREPLDraw(follow) {
+    const replOutput = document.getElementById('repl-output');
+    const atBottom = replOutput.scrollTop + replOutput.clientHeight >= replOutput.scrollHeight - REPL_ROW_HEIGHT;
+    if (replTerm.drawQueued) {
+        return;
+    }
+    replTerm.drawQueued = true;
+    requestAnimationFrame(() => {
+        replTerm.drawQueued = false;
+        drawREPL();
+        if (follow && atBottom) {
+            replOutput.scrollTop = replOutput.scrollHeight;
+            drawREPL();
         }
     });
 }
 
-function appendToREPL(text) {
+function drawREPL() {
     const replOutput = document.getElementById('repl-output');
-    replOutput.textContent += text;
-    replOutput.scrollTop = replOutput.scrollHeight;
+    const [spacer, view] = replOutput.children;
+    if (!view) {
+        return;
+    }
+    spacer.style.height = `${replTerm.rows.length * REPL_ROW_HEIGHT}px`;
+    const first = Math.max(0, Math.floor(replOutput.scrollTop / REPL_ROW_HEIGHT) - 5);
+    const count = Math.ceil(replOutput.clientHeight / REPL_ROW_HEIGHT) + 10;
+    view.style.top = `${first * REPL_ROW_HEIGHT + 10}px`;
+    view.textContent = replTerm.rows.slice(first, first + count).map(row => row.text).join('\n');
+}
+
+async function loadEarlierREPL() {
+    const oldest = replTerm.rows.find(row => row.line !== null);
+    // History may take the terminal up to twice its live size, no further
+    if (replTerm.loading || !replTerm.viewer || replTerm.rows.length >= 2 * REPL_MAX_ROWS) {
+        return;
+    }
+    replTerm.loading = true;
+    try {
+        const before = oldest ? oldest.line : replTerm.nextLine;
+        const response = await fetch(`/api/repl/scrollback?viewer=${encodeURIComponent(replTerm.viewer)}&before=${before}&count=${REPL_PAGE_ROWS}`);
+        const result = await response.json();
+        if (!result.success || result.lines.length === 0) {
+            return;
+        }
+        const earlier = result.lines.map((text, i) => {
+            const row = {text: '', line: result.start + i};
+            writeREPLRow(row, text);
+            return row;
+        });
+        replTerm.rows.unshift(...earlier);
+        if (replTerm.tail >= 0) {
+            replTerm.tail += earlier.length;
+        }
+        const replOutput = document.getElementById('repl-output');
+        replOutput.scrollTop += earlier.length * REPL_ROW_HEIGHT;
+        drawREPL();
+    } finally {
+        replTerm.loading = false;
+    }
 }
 
 function clearREPL() {
-    document.getElementById('repl-output').textContent = '';
+    replTerm.rows = [];
+    replTerm.tail = -1;
+    replTerm.pending = '';
+    drawREPL();
+}
+
+// Id of the /api/exec run in progress, so Interrupt can cancel it
+let runningExec = null;
+
+async function runScript() {
+    const script = document.getElementById('repl-script').value;
+    if (!script.trim() || runningExec) {
+        return;
+    }
+    const connection = currentConnection();
+    runningExec = 'starting';
+    try {
+        const response = await fetch('/api/exec', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({connection, script}),
+        });
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffered = '';
+        for (;;) {
+            const {value, done} = await reader.read();
+            if (done) {
+                break;
+            }
+            buffered += value;
+            const lines = buffered.split('\n');
+            buffered = lines.pop();
+            for (const line of lines.filter(Boolean)) {
+                const event = JSON.parse(line);
+                if (event.event === 'start') {
+                    runningExec = event.id;
+                } else if (event.event === 'stdout' || event.event === 'stderr') {
+                    appendToREPL(event.data, true);
+                } else if (event.event === 'end') {
+                    appendToREPL(`*** Script finished in ${event.seconds} s${event.error ? ' with an error' : ''} ***\n`, true);
+                } else if (event.event === 'error' || event.success === false) {
+                    appendToREPL(`Error: ${event.message}\n`, true);
+                }
+            }
+        }
+    } catch (error) {
+        appendToREPL(`Error: ${error.message}\n`, true);
+    } finally {
+        runningExec = null;
+    }
 }
 
 function interruptREPL() {
+    if (runningExec && runningExec !== 'starting') {
+        fetch(`/api/exec/${runningExec}`, {method: 'DELETE'});
+    }
     if (replSocket && replSocket.readyState === WebSocket.OPEN) {
-        replSocket.send('\x03');  // Send Ctrl+C
-        appendToREPL('\n*** Interrupted ***\n');
+        if (replBinary()) {
+            sendREPLFrame(REPL_FRAME.interrupt);
+        } else {
+            replSocket.send('\x03');  // Send Ctrl+C
+        }
+        appendToREPL('*** Interrupted ***\n', true);
     }
 }
 
 function softResetREPL() {
     if (replSocket && replSocket.readyState === WebSocket.OPEN) {
-        replSocket.send('\x04');  // Send Ctrl+D
-        appendToREPL('\n*** Soft Reset ***\n');
+        sendREPL('\x04');  // Send Ctrl+D
+        appendToREPL('*** Soft Reset ***\n', true);
+    }
+}
+
+// Recorded REPL sessions: replay from any moment, or search, into the terminal
+async function loadRecordings() {
+    const select = document.getElementById('recording-select');
+    const selected = select.value;
+    const recordings = await (await fetch('/api/recordings')).json();
+    select.innerHTML = '';
+    recordings.reverse().forEach(recording => {
+        const option = document.createElement('option');
+        option.value = recording.id;
+        option.textContent = `${recording.board} ${new Date(recording.start * 1000).toLocaleString()}${recording.live ? ' (live)' : ''}`;
+        select.appendChild(option);
+    });
+    if (selected) {
+        select.value = selected;
+    }
+}
+
+async function replayRecording() {
+    const recording = document.getElementById('recording-select').value;
+    const when = document.getElementById('recording-time').value;
+    if (!recording) {
+        return;
+    }
+    const start = when ? new Date(when).getTime() / 1000 : '';
+    const result = await (await fetch(`/api/recordings/${encodeURIComponent(recording)}?start=${start}`)).json();
+    if (!result.success) {
+        appendToREPL(`Error: ${result.message}\n`, true);
+        return;
+    }
+    appendToREPL(`*** Replay of ${recording} ***\n`, true);
+    appendToREPL(result.chunks.map(chunk => chunk.text).join(''), true);
+    if (result.next) {
+        appendToREPL(`*** More after ${new Date(result.next * 1000).toLocaleString()} ***\n`, true);
     }
 }
 
+async function searchRecording() {
+    const recording = document.getElementById('recording-select').value;
+    const query = document.getElementById('recording-query').value;
+    if (!recording || !query) {
+        return;
+    }
+    const result = await (await fetch(`/api/recordings/${encodeURIComponent(recording)}/search?q=${encodeURIComponent(query)}`)).json();
+    if (!result.success) {
+        appendToREPL(`Error: ${result.message}\n`, true);
+        return;
+    }
+    appendToREPL(`*** ${result.matches.length} match(es) for ${query} ***\n`, true);
+    result.matches.forEach(match => appendToREPL(`[${new Date(match.time * 1000).toLocaleString()}] ${match.line}\n`, true));
+}
+
 // Add REPL initialization to connection test
 async function testConnection() {
     const connectionType = document.querySelector('input[name="connection-type"]:checked').value;
@@ -430,11 +906,14 @@ async function testConnection() {
             type: "serial",
             port: document.getElementById("serial-port").value,
             baudrate: parseInt(document.getElementById("serial-baudrate").value),
+            negotiate: document.getElementById("serial-negotiate").checked,
         };
     }
 
     try {
-        const response = await fetch("/api/test-connection", {
+        // Open a board session once; uploads and downloads reuse it
+        await closeBoardSession();
+        const response = await fetch("/api/sessions", {
             method: "POST",
             headers: {
                 "Content-Type": "application/json",
@@ -447,6 +926,7 @@ async function testConnection() {
         statusElement.style.color = result.success ? "green" : "red";
 
         if (result.success) {
+            boardSession = result.session.id;
             initializeREPL();  // Initialize REPL when connection is successful
         }
     } catch (error) {
@@ -456,3 +936,37 @@ async function testConnection() {
 }
 
 
+
+
+// Board session handle from /api/sessions, reused until the form changes
+let boardSession = null;
+const SESSION_KEEPALIVE_MS = 60000;  // well inside the server's idle timeout
+
+// Keep the session from being reaped as idle while the page is open; once
+// the server has closed it (board unplugged), fall back to the form's settings.
+setInterval(async () => {
+    if (!boardSession) {
+        return;
+    }
+    const sessionId = boardSession;
+    const response = await fetch(`/api/sessions/${sessionId}`, { method: "POST" }).catch(() => null);
+    if (response && response.status === 404 && boardSession === sessionId) {
+        boardSession = null;
+        const statusElement = document.getElementById("connection-status");
+        statusElement.textContent = "Connection closed by the server; test the connection to reopen it";
+        statusElement.style.color = "red";
+    }
+}, SESSION_KEEPALIVE_MS);
+
+async function closeBoardSession() {
+    if (boardSession) {
+        const sessionId = boardSession;
+        boardSession = null;
+        await fetch(`/api/sessions/${sessionId}`, { method: "DELETE", keepalive: true }).catch(() => {});
+    }
+}
+
+document.querySelectorAll("#wifi-form input, #serial-form select, #serial-form input, input[name='connection-type']").forEach((input) => {
+    input.addEventListener("change", closeBoardSession);
+});
+window.addEventListener("pagehide", closeBoardSession);
@@ -0,0 +1,149 @@
+import os
+import re
+import select
+import struct
+import tempfile
+import termios
+import threading
+import time
+import tty
+import zlib
+
+import pytest
+
+# Keep recordings and the console index out of the home directory; both
+# paths are read when board_manager is imported.
+_data = tempfile.mkdtemp(prefix="board_manager-tests-")
+os.environ.setdefault("BOARD_MANAGER_RECORDINGS", _data)
+os.environ.setdefault("BOARD_BROKER_SOCKET", os.path.join(_data, "no-broker.sock"))
+
+
+class FakeBoard:
+    """Just enough of a MicroPython board on a pty: friendly REPL echo, raw REPL and ``PUT_SCRIPT``.
+
+    The UART runs at ``rate`` and carries up to ``max_rate``; bytes sent while
+    the host's end of the pty is set to another rate, or faster than that,
+    are lost both ways. ``baudrate.SWITCH_SCRIPT`` and ``RESTORE_SCRIPT`` move it.
+    """
+
+    def __init__(self):
+        self.master, slave = os.openpty()
+        tty.setraw(slave)
+        self.port = os.ttyname(slave)
+        self.slave = slave
+        self.mode = "friendly"
+        self.code = bytearray()
+        self.upload = None  # the running PUT_SCRIPT's path, chunk, bytes left and data
+        self.files = {}
+        self.rate = 115200
+        self.max_rate = None
+        self.switch = None  # the running SWITCH_SCRIPT's state
+        self.closing = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        # Poll, so close() can stop the thread: a read blocked in another
+        # thread would keep the master, and so the "board", alive.
+        while not self.closing.is_set():
+            if self.switch and time.monotonic() > self.switch["deadline"]:
+                self.rate, self.switch = self.switch["safe"], None  # no confirmation: back to the safe rate
+            if not select.select([self.master], [], [], 0.05)[0]:
+                continue
+            try:
+                data = os.read(self.master, 4096)
+            except OSError:
+                return
+            if not self._line_up():
+                continue
+            for byte in data:
+                self._write(self._feed(bytes([byte])))
+
+    def _line_up(self):
+        host = termios.tcgetattr(self.slave)[5]
+        return host == getattr(termios, f"B{self.rate}") and (self.max_rate is None or self.rate <= self.max_rate)
+
+    def _write(self, reply):
+        if reply and self._line_up():
+            os.write(self.master, reply)
+
+    def _feed(self, c):
+        if self.switch:
+            return self._feed_switch(c)
+        if self.upload:
+            upload = self.upload
+            upload["data"] += c
+            upload["left"] -= 1
+            if upload["left"] and len(upload["data"]) % upload["chunk"]:
+                return b""
+            if upload["left"]:
+                return b"\x06"
+            self.files[upload["path"]] = bytes(upload["data"])
+            self.upload = None
+            return b"\x06\x04\x04>"
+        if c == b"\x01":
+            self.mode, self.code = "raw", bytearray()
+            return b"raw REPL; CTRL-B to exit\r\n>"
+        if c == b"\x02":
+            self.mode = "friendly"
+            return b"\r\nMicroPython\r\n>>> "
+        if self.mode == "friendly":
+            return c
+        self.code += c
+        if self.code.endswith(b"\x05A\x01"):
+            self.code.clear()
+            return b"R\x00"  # no raw-paste support
+        if c == b"\x04":
+            return self._run_code(bytes(self.code[:-1]))
+        return b""
+
+    def _feed_switch(self, c):
+        switch = self.switch
+        if len(switch["data"]) < switch["size"]:
+            switch["data"] += c
+            if len(switch["data"]) == switch["size"]:
+                data = bytes(switch["data"])
+                return data + struct.pack("<I", zlib.crc32(data))
+            return b""
+        self.switch = None
+        if c != b"\x06":
+            self.rate = switch["safe"]
+        return b"\x04\x04>"
+
+    def _run_code(self, code):
+        self.code.clear()
+        match = re.search(rb"u\.init\(baudrate=(\d+)\)\nd = wait\((\d+)\).*baudrate=(\d+)", code, re.S)
+        if match:
+            timeout = int(re.search(rb"< (\d+):", code)[1]) / 1000
+            self._write(b"OK\x06")  # acked at the old rate
+            self.rate = int(match[1])
+            self.switch = {"size": int(match[2]), "safe": int(match[3]), "data": bytearray(),
+                           "deadline": time.monotonic() + 2 * timeout}
+            return b""
+        match = re.search(rb"machine\.UART\(\d+\)\.init\(baudrate=(\d+)\)", code)
+        if match:
+            self._write(b"OK")
+            self.rate = int(match[1])
+            return b"\x04\x04>"
+        match = re.search(rb"open\('(.*?)', 'wb'\)\nn = (\d+)\n.*min\(n, (\d+)\)", code, re.S)
+        if match:
+            self.upload = {"path": match[1].decode(), "left": int(match[2]), "chunk": int(match[3]),
+                           "data": bytearray()}
+            return b"OK"
+        return b"OK\x04\x04>"
+
+    def close(self):
+        """Unplug the board."""
+        if self.closing.is_set():
+            return
+        self.closing.set()
+        self.thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+
+@pytest.fixture
+def board():
+    board = FakeBoard()
+    yield board
+    board.close()
@@ -0,0 +1,106 @@
+import asyncio
+import os
+import tty
+
+import pytest
+from serial import SerialException
+
+from board_manager.aio_serial import HIGH_WATER, create_serial_connection
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a pseudo-terminal")
+
+
+class Collector(asyncio.Protocol):
+    def __init__(self):
+        self.data = bytearray()
+        self.received = asyncio.Event()
+        self.paused = []
+        self.lost = asyncio.get_running_loop().create_future()
+
+    def data_received(self, data):
+        self.data += data
+        self.received.set()
+
+    def pause_writing(self):
+        self.paused.append(True)
+
+    def resume_writing(self):
+        self.paused.append(False)
+
+    def connection_lost(self, exc):
+        self.lost.set_result(exc)
+
+
+@pytest.fixture
+def pty():
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    os.set_blocking(master, False)
+    yield master, os.ttyname(slave)
+    for fd in (master, slave):
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
+
+async def drain(master, size):
+    """Read ``size`` bytes from the board side without blocking the loop."""
+    received = bytearray()
+    while len(received) < size:
+        try:
+            received += os.read(master, 65536)
+        except BlockingIOError:
+            await asyncio.sleep(0.01)
+    return bytes(received)
+
+
+def test_reads_and_writes(pty):
+    master, name = pty
+
+    async def main():
+        transport, protocol = await create_serial_connection(asyncio.get_running_loop(), Collector, name,
+                                                             baudrate=115200)
+        await asyncio.sleep(0)  # connection_made, then reading starts
+        os.write(master, b"from the board")
+        await asyncio.wait_for(protocol.received.wait(), 5)
+        transport.write(b"to the board")
+        assert await drain(master, 12) == b"to the board"
+        transport.close()
+        assert await asyncio.wait_for(protocol.lost, 5) is None
+        assert not transport.serial.is_open
+        return protocol.data
+
+    assert asyncio.run(main()) == b"from the board"
+
+
+def test_buffered_write_pauses_the_protocol_and_close_flushes_it(pty):
+    master, name = pty
+
+    async def main():
+        transport, protocol = await create_serial_connection(asyncio.get_running_loop(), Collector, name,
+                                                             baudrate=115200)
+        data = os.urandom(4 * HIGH_WATER)  # far more than the pty buffers
+        transport.write(data)
+        assert transport.get_write_buffer_size() > HIGH_WATER and protocol.paused == [True]
+        transport.close()  # must not discard what is still buffered
+        assert transport.is_closing() and not protocol.lost.done()
+        assert await drain(master, len(data)) == data
+        assert await asyncio.wait_for(protocol.lost, 5) is None
+        assert protocol.paused == [True, False]
+
+    asyncio.run(main())
+
+
+def test_board_going_away_ends_the_connection(pty):
+    master, name = pty
+
+    async def main():
+        transport, protocol = await create_serial_connection(asyncio.get_running_loop(), Collector, name,
+                                                             baudrate=115200)
+        await asyncio.sleep(0)
+        os.close(master)
+        assert isinstance(await asyncio.wait_for(protocol.lost, 5), SerialException)
+        assert transport.is_closing() and not transport.serial.is_open
+
+    asyncio.run(main())
@@ -0,0 +1,38 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from board_manager import aio_ws, repl_protocol
+
+
+class FakeWebSocket:
+    def __init__(self, handshake, subprotocol=None):
+        self.handshake = handshake
+        self.subprotocol = subprotocol
+        self.sent = []
+        self.wsock = SimpleNamespace(drain=self._drain)
+
+    async def _drain(self):
+        pass
+
+    async def receive(self):
+        return self.handshake
+
+    async def send(self, data):
+        self.sent.append(data)
+
+
+@pytest.mark.parametrize("handshake", ["{not json", "[]", json.dumps({"type": "serial"})])
+def test_bad_handshake_gets_an_error_reply(handshake):
+    ws = FakeWebSocket(handshake)
+    asyncio.run(aio_ws.repl(ws))
+    assert len(ws.sent) == 1 and ws.sent[0].startswith("Error: ")
+
+
+def test_bad_handshake_gets_an_error_status_over_the_binary_protocol():
+    ws = FakeWebSocket("{not json", repl_protocol.SUBPROTOCOL)
+    asyncio.run(aio_ws.repl(ws))
+    [(kind, payload)] = [repl_protocol.unpack(message) for message in ws.sent]
+    assert kind == repl_protocol.STATUS and json.loads(payload)["event"] == "error"
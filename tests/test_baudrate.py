@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+from board_manager import baudrate
+from board_manager.connections import BoardSession, shares
+from board_manager.raw_repl import RawRepl
+from board_manager.serial_io import Serial
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a pseudo-terminal")
+
+
+@pytest.fixture(autouse=True)
+def memory(tmp_path, monkeypatch):
+    # Failed rates cost the board's timeouts; keep them short.
+    monkeypatch.setattr(baudrate, "TEST_TIMEOUT_MS", 100)
+    monkeypatch.setattr(baudrate, "remembered", baudrate.RateMemory(str(tmp_path / "baudrates.json")))
+    return baudrate.remembered
+
+
+class Reader:
+    """Stands in for a REPL hub sharing the port."""
+
+    def __init__(self):
+        self.rates = []
+
+    def hold(self):
+        pass
+
+    def release(self):
+        pass
+
+    def retune(self, rate):
+        self.rates.append(rate)
+
+
+def test_session_moves_to_the_fastest_working_rate_and_back(board, memory):
+    board.max_rate = 921600
+    reader = Reader()
+    shares.register(board.port, reader)
+    try:
+        session = BoardSession({"type": "serial", "port": board.port, "negotiate": True})
+        assert session.port.baudrate == board.rate == 921600
+        assert baudrate.active[board.port] == 921600
+        assert memory.get(board.port) == 921600
+        assert reader.rates == [921600]
+
+        session.close()
+        assert board.rate == 115200
+        assert board.port not in baudrate.active
+        assert reader.rates == [921600, 115200]
+    finally:
+        shares.unregister(board.port, reader)
+
+
+def test_no_faster_rate_keeps_the_safe_one(board, memory):
+    board.max_rate = 115200
+    with Serial(board.port, 115200, timeout=0.1) as port:
+        repl = RawRepl(port, timeout=1)
+        assert baudrate.negotiate(repl, board.port, rates=(460800, 230400)) == 115200
+        assert port.baudrate == board.rate == 115200
+        repl.enter()  # still talking
+        assert repl.exec("x = 1") == b""
+    assert memory.get(board.port) is None
+
+
+def test_failing_remembered_rate_is_forgotten(board, memory):
+    board.max_rate = 460800
+    memory.set(board.port, 921600)
+    with Serial(board.port, 115200, timeout=0.1) as port:
+        repl = RawRepl(port, timeout=1)
+        assert baudrate.negotiate(repl, board.port, rates=(921600, 460800)) == 460800
+        assert board.rate == 460800
+    assert memory.get(board.port) == 460800
+
+
+def test_board_left_at_its_fast_rate_is_reached_there(board, memory):
+    board.rate = 460800
+    memory.set(board.port, 460800)
+    with Serial(board.port, 115200, timeout=0.1) as port:
+        repl = RawRepl(port, timeout=1)
+        assert baudrate.negotiate(repl, board.port) == 460800
+        assert port.baudrate == 460800
+        baudrate.restore(repl, 115200)
+        assert port.baudrate == board.rate == 115200
@@ -0,0 +1,104 @@
+import os
+import selectors
+import socket
+import tty
+
+import pytest
+
+from board_manager.broker import BULK_CHUNK, Broker, Decoder, encode
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a pseudo-terminal")
+
+
+@pytest.fixture
+def pty_port():
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    os.set_blocking(master, False)
+    yield master, os.ttyname(slave)
+    os.close(master)
+    os.close(slave)
+
+
+def drain(broker, port, master):
+    """Read the board side until every lane is written out."""
+    received = bytearray()
+    while True:
+        try:
+            received += os.read(master, 65536)
+        except BlockingIOError:
+            if not port.out and not any(lane.chunks for lane in port.lanes.values()):
+                return bytes(received)
+        broker._write_port(port)
+
+
+def test_control_write_overtakes_queued_bulk_data(pty_port, tmp_path):
+    master, name = pty_port
+    broker = Broker(str(tmp_path / "broker.sock"))
+    port = broker._open(name, 115200)
+    owner, viewer = object(), object()
+    port.owner = owner
+
+    upload = b"U" * 256 * 1024  # far more than the pty buffers
+    broker._enqueue(port, owner, upload)
+    assert port.lanes["bulk"].chunks  # the rest waits for the board to read
+    broker._enqueue(port, viewer, b"x")
+    broker._enqueue(port, viewer, b"\x03", "control")
+
+    received = drain(broker, port, master)
+    interrupt, key = received.index(b"\x03"), received.index(b"x")
+    assert interrupt < key < len(upload)  # both went out ahead of the rest, Ctrl-C first
+    assert interrupt % BULK_CHUNK == 0  # never inside a chunk
+    assert received.replace(b"\x03", b"").replace(b"x", b"") == upload
+
+
+class Listener:
+    def __init__(self, sock):
+        self.sock = sock
+
+    def accept(self):
+        return self.sock, None
+
+
+def connect(broker, data):
+    """Return ``(client, ours)``: a broker client that has just sent ``data``, and our end of it."""
+    ours, theirs = socket.socketpair()
+    broker._accept(Listener(theirs), selectors.EVENT_READ)
+    ours.sendall(data)
+    ours.settimeout(5)
+    client = next(client for client in broker.clients if client.sock is theirs)
+    broker._client_event(client, selectors.EVENT_READ)
+    return client, ours
+
+
+def replies(sock):
+    received = bytearray()
+    while chunk := sock.recv(65536):
+        received += chunk
+    return [header for header, _ in Decoder().feed(received)]
+
+
+def test_garbled_header_drops_the_client(tmp_path):
+    broker = Broker(str(tmp_path / "broker.sock"))
+    client, ours = connect(broker, b"{not json\n" + encode({"op": "status"}))
+    assert client not in broker.clients
+    assert [reply["error"][:9] for reply in replies(ours)] == ["bad frame"]  # then the broker hung up
+
+
+def test_owner_asking_for_its_lease_again_gets_a_reply(pty_port, tmp_path):
+    _, name = pty_port
+    broker = Broker(str(tmp_path / "broker.sock"))
+    broker._open(name, 115200)
+    client, ours = connect(broker, encode({"op": "lease", "port": name}) * 2)
+    broker._drop(client)
+    assert replies(ours) == [{"op": "lease", "ok": True}] * 2
+
+
+def test_second_broker_refuses_to_take_over_the_socket(tmp_path):
+    path = str(tmp_path / "broker.sock")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as running:
+        running.bind(path)
+        running.listen()
+        with pytest.raises(OSError, match="already listening"):
+            Broker(path).serve_forever()
+        assert os.path.exists(path)
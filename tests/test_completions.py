@@ -0,0 +1,64 @@
+import contextlib
+
+from board_manager import completions as completions_module
+from board_manager.completions import BANNER, CompletionCache, uname_firmware
+
+BOARD = "/dev/ttyUSB0"
+CONNECTION = {"type": "serial", "port": BOARD}
+
+
+def test_learns_firmware_and_candidates_from_board_output(tmp_path):
+    cache = CompletionCache(str(tmp_path))
+    assert cache.lookup(CONNECTION, "machine", learn=True) == (None, None)
+
+    cache.observe(BOARD, ["MicroPython v1.20.0 on 2023-04-26; ESP32 module with ESP32",
+                          'Type "help()" for more information.'], ">>> ")
+    firmware = "v1.20.0 on 2023-04-26; ESP32 module with ESP32"
+    assert cache.lookup(CONNECTION, "machine", learn=True) == (firmware, None)
+
+    # The board's reply to the Tab the page sends after the miss.
+    cache.observe(BOARD, [">>> machine."], "")
+    cache.observe(BOARD, ["Pin             UART            freq", "reset"], ">>> machine.")
+    assert cache.lookup(CONNECTION, "machine") == (firmware, ["Pin", "UART", "freq", "reset"])
+
+    # Another board on the same build is served from disk.
+    other = CompletionCache(str(tmp_path))
+    other.observe("/dev/ttyUSB1", ["MicroPython v1.20.0 on 2023-04-26; ESP32 module with ESP32"], ">>> ")
+    assert other.lookup({"type": "serial", "port": "/dev/ttyUSB1"}, "machine")[1] == ["Pin", "UART", "freq", "reset"]
+
+
+def test_single_match_completion_is_not_cached(tmp_path):
+    cache = CompletionCache(str(tmp_path))
+    cache.observe(BOARD, ["MicroPython v1.20.0 on 2023-04-26; ESP32 module with ESP32"], ">>> ")
+    cache.lookup(CONNECTION, "gc", learn=True)
+    cache.observe(BOARD, [">>> gc.collect()"], ">>> ")  # the board completed inline and the line ran
+    assert cache.lookup(CONNECTION, "gc")[1] is None
+
+
+class FakeRepl:
+    def __init__(self, reply):
+        self.reply = reply
+        self.runs = 0
+
+    def exec(self, code, timeout=None):
+        self.runs += 1
+        return self.reply
+
+
+def test_board_that_booted_earlier_is_asked_once(tmp_path, monkeypatch):
+    repl = FakeRepl(b"1.20.2.r4\tv1.11-ffb0e1c on 2021-01-12\tFiPy with ESP32\r\n")
+    monkeypatch.setattr(completions_module, "board_link", lambda connection: contextlib.nullcontext(repl))
+    cache = CompletionCache(str(tmp_path))
+
+    assert cache.identify(CONNECTION)
+    assert not cache.identify(CONNECTION)
+    assert repl.runs == 1
+    # The key matches what the banner gives after the next soft reset.
+    banner = "Pycom MicroPython 1.20.2.r4 [v1.11-ffb0e1c] on 2021-01-12; FiPy with ESP32"
+    assert cache.lookup(CONNECTION, "machine")[0] == BANNER.search(banner)[1]
+    assert not cache.identify({"type": "wifi", "address": "192.168.4.1"})
+
+
+def test_uname_matches_upstream_banner():
+    banner = "MicroPython v1.20.0 on 2023-04-26; ESP32 module with ESP32"
+    assert uname_firmware("1.20.0", "v1.20.0 on 2023-04-26", "ESP32 module with ESP32") == BANNER.search(banner)[1]
@@ -0,0 +1,37 @@
+import time
+
+from board_manager import console_index
+from board_manager.console_index import ConsoleIndex
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_writer_retries_after_database_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(console_index, "RETRY_SECONDS", 0.1)
+    monkeypatch.setattr(console_index, "BATCH_SECONDS", 0.05)
+    blocker = tmp_path / "index"
+    blocker.write_text("not a directory")
+    index = ConsoleIndex(str(blocker / "console.sqlite3"))
+
+    index.add("/dev/ttyUSB0", ["OSError: [Errno 28] No space left on device"])  # must not raise
+    time.sleep(0.3)
+    assert index.writer.is_alive()
+
+    blocker.unlink()
+    wait_for(index.boards)
+    assert [m["line"] for m in index.search("Errno 28")] == ["OSError: [Errno 28] No space left on device"]
+
+
+def test_queries_do_not_set_up_the_database_again(tmp_path, monkeypatch):
+    index = ConsoleIndex(str(tmp_path / "console.sqlite3"))
+    assert index.search("anything") == []
+
+    def setup_again(path):
+        raise AssertionError("schema and pragmas run again")
+    monkeypatch.setattr(console_index, "connect", setup_again)
+    assert index.search("anything") == [] and index.boards() == []
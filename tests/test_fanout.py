@@ -0,0 +1,13 @@
+from board_manager.fanout import target_group
+
+
+def test_wifi_targets_group_by_subnet_or_name():
+    assert target_group({"type": "wifi", "address": "192.168.4.7"}, {}) == "net:192.168.4.0/24"
+    assert target_group({"type": "wifi", "address": "localhost"}, {}) == "net:127.0.0.0/24"
+    assert target_group({"type": "wifi", "address": "mypycom.invalid"}, {}) == "host:mypycom.invalid"
+
+
+def test_serial_targets_group_by_hub():
+    hubs = {"/dev/ttyUSB0": "1-1", "/dev/ttyUSB1": "1-1"}
+    assert target_group({"type": "serial", "port": "/dev/ttyUSB1"}, hubs) == "hub:1-1"
+    assert target_group({"type": "serial", "port": "/dev/ttyACM0"}, hubs) == "hub:/dev/ttyACM0"
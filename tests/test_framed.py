@@ -0,0 +1,125 @@
+import os
+
+import pytest
+
+from board_manager.framed import (ACK, DATA, DONE, END, NAK, WINDOW, FramedSender, cobs_decode, cobs_encode,
+                                  pack_frame, unpack_frame)
+from board_manager.raw_repl import split_chunks
+from board_manager.serial_io import RingBuffer
+
+
+@pytest.mark.parametrize("data", [b"", b"\0", b"\0\0\0", b"a\0\0b\0", b"x" * 253, b"x" * 254, b"x" * 255,
+                                  b"x" * 254 + b"\0", b"\0" + b"x" * 508, bytes(range(256)) * 3])
+def test_cobs_round_trip(data):
+    encoded = cobs_encode(data)
+    assert b"\0" not in encoded
+    assert cobs_decode(encoded) == data
+
+
+def test_cobs_rejects_a_truncated_block():
+    with pytest.raises(ValueError):
+        cobs_decode(cobs_encode(b"x" * 300)[:-10])
+
+
+@pytest.mark.parametrize("payload", [b"\0" * 254, b"x" * 249, b"x" * 250, b"\0" * 1000])
+def test_frame_round_trip_across_cobs_blocks(payload):
+    frame = pack_frame(DATA, 0x01000000, payload)
+    assert unpack_frame(frame[:-1]) == (DATA, 0x01000000, payload)
+
+
+def test_frame_round_trip_and_corruption():
+    frame = pack_frame(DATA, 7, b"\0payload\0")
+    assert frame.endswith(b"\0") and b"\0" not in frame[:-1]
+    assert unpack_frame(frame[:-1]) == (DATA, 7, b"\0payload\0")
+    corrupt = bytearray(frame[:-1])
+    corrupt[frame.index(b"payload")] ^= 0x01
+    with pytest.raises(ValueError, match="checksum"):
+        unpack_frame(bytes(corrupt))
+
+
+class Receiver:
+    """The board side of RECEIVE_SCRIPT, answering frames as they are written."""
+
+    baudrate = 1000000
+
+    def __init__(self, lose=(), garble_acks=()):
+        self.lose = set(lose)  # data frames lost on their first send
+        self.garble_acks = set(garble_acks)  # acks corrupted on their way back
+        self.out = bytearray()
+        self.file = bytearray()
+        self.want = 0
+        self.held = {}
+        self.sends = []
+
+    def reply(self, kind, seq, garble=False):
+        frame = bytearray(pack_frame(kind, seq))
+        if garble:
+            frame[1] ^= 0x01  # the kind byte, which never encodes as a COBS code
+        self.out += frame
+
+    def write(self, data):
+        for packet in bytes(data).split(b"\0")[:-1]:
+            kind, seq, payload = unpack_frame(packet)
+            if kind == END:
+                self.reply(DONE if seq == self.want else NAK, self.want)
+                continue
+            assert kind == DATA and seq < self.want + WINDOW  # never more than a window ahead
+            self.sends.append(seq)
+            if seq in self.lose:
+                self.lose.discard(seq)
+                continue
+            if seq == self.want:
+                self.file += payload
+                self.want += 1
+                while self.want in self.held:
+                    self.file += self.held.pop(self.want)
+                    self.want += 1
+            elif seq > self.want:
+                self.held[seq] = payload
+                self.reply(NAK, self.want)
+            garble = seq in self.garble_acks
+            self.garble_acks.discard(seq)
+            self.reply(ACK, seq, garble)
+
+    def read_available_into(self, buffer):
+        count = min(len(buffer), len(self.out))
+        buffer[:count] = self.out[:count]
+        del self.out[:count]
+        return count
+
+
+class Repl:
+    def __init__(self, serial):
+        self.serial = serial
+        self.pending = RingBuffer()
+
+
+def transfer(receiver, data, chunk_size=16):
+    sender = FramedSender(Repl(receiver), split_chunks(data, chunk_size), WINDOW)
+    sender.run(len(data))
+    return sender
+
+
+def test_clean_transfer_sends_each_frame_once():
+    data = os.urandom(200)
+    receiver = Receiver()
+    sender = transfer(receiver, data)
+    assert receiver.file == data
+    assert receiver.sends == list(range(13)) and sender.retransmits == 0
+
+
+def test_gap_is_resent_on_nak():
+    data = os.urandom(200)
+    receiver = Receiver(lose={1})
+    sender = transfer(receiver, data)
+    assert receiver.file == data
+    assert receiver.sends.count(1) == 2 and sender.retransmits == 1
+
+
+def test_lost_last_frame_and_garbled_ack_are_resent_after_the_timeout():
+    data = os.urandom(64)
+    receiver = Receiver(lose={3}, garble_acks={0})
+    sender = transfer(receiver, data)
+    assert receiver.file == data
+    assert receiver.sends.count(3) == 2 and receiver.sends.count(0) == 2
+    assert sender.reader.corrupt == 1
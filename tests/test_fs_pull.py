@@ -0,0 +1,72 @@
+import contextlib
+import ftplib
+import json
+import threading
+import time
+
+import pytest
+
+from board_manager import fs_pull
+from board_manager.fs_pull import REPORT_NAME, pull_ftp
+
+CONNECTION = {"type": "wifi", "address": "192.168.4.1"}
+FILES = {"/flash/big.bin": bytes(range(256)) * 400, "/flash/main.py": b"import big\n", "/flash/empty.txt": b""}
+
+
+class FakeFtp:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def fake_chunks(ftp, path, blocksize=1000):
+    if path not in FILES:
+        raise ftplib.error_perm(f"550 {path}")
+    data = FILES[path]
+    for offset in range(0, len(data), blocksize):
+        yield data[offset:offset + blocksize]
+
+
+@pytest.fixture
+def board(monkeypatch):
+    monkeypatch.setattr(fs_pull, "board_link", lambda connection: contextlib.nullcontext(FakeFtp()))
+    monkeypatch.setattr(fs_pull, "open_ftp", lambda connection: FakeFtp())
+    monkeypatch.setattr(fs_pull, "ftp_chunks", fake_chunks)
+    monkeypatch.setattr(fs_pull, "READ_AHEAD", 2)
+    monkeypatch.setattr(fs_pull, "PUT_TIMEOUT", 0.05)
+
+
+def test_files_stream_through_bounded_queues(board, monkeypatch):
+    listing = [(path, len(data)) for path, data in FILES.items()] + [("/flash/gone.py", 10)]
+    monkeypatch.setattr(fs_pull, "ftp_walk", lambda ftp, root: listing if root == "/flash" else [])
+
+    entries = {name: b"".join(chunks) for name, chunks in pull_ftp(CONNECTION, sessions=3)}
+
+    report = json.loads(entries.pop(REPORT_NAME))
+    assert entries == {path[1:]: data for path, data in FILES.items()}
+    assert {entry["path"]: entry["bytes"] for entry in report} == {**{p: len(d) for p, d in FILES.items()},
+                                                                    "/flash/gone.py": 0}
+    assert "550" in next(entry["error"] for entry in report if entry["path"] == "/flash/gone.py")
+
+
+def test_abandoned_pull_stops_its_workers(board, monkeypatch):
+    listing = [(f"/flash/big{n}.bin", len(FILES["/flash/big.bin"])) for n in range(4)]
+    monkeypatch.setattr(fs_pull, "ftp_walk", lambda ftp, root: listing if root == "/flash" else [])
+    monkeypatch.setitem(FILES, "/flash/big0.bin", FILES["/flash/big.bin"])
+    for n in range(1, 4):
+        monkeypatch.setitem(FILES, f"/flash/big{n}.bin", FILES["/flash/big.bin"])
+    before = threading.active_count()
+
+    entries = pull_ftp(CONNECTION, sessions=4)
+    name, chunks = next(entries)
+    next(chunks)
+    time.sleep(0.1)
+    assert threading.active_count() == before + 4
+    entries.close()  # the client went away
+
+    deadline = time.monotonic() + 2
+    while threading.active_count() > before:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
@@ -0,0 +1,7 @@
+from board_manager.mpy_cache import cache_key
+
+
+def test_same_source_under_another_name_is_a_different_entry():
+    source = b"x = 1\n"
+    assert cache_key("a.py", source, "v1", ()) != cache_key("b.py", source, "v1", ())
+    assert cache_key("a.py", source, "v1", ()) == cache_key("a.py", source, "v1", ())
@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+import tty
+
+import pytest
+from serial import Serial, SerialException
+from serial.threaded import Protocol
+
+from board_manager.multiplex import SerialMultiplexer
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a pseudo-terminal")
+
+
+class Collector(Protocol):
+    def __init__(self):
+        self.data = bytearray()
+        self.lost = None
+        self.ended = threading.Event()
+        self.threads = set()
+
+    def data_received(self, data):
+        self.data += data
+        self.threads.add(threading.current_thread())
+
+    def connection_lost(self, exc):
+        self.lost = exc
+        self.ended.set()
+
+
+@pytest.fixture
+def ptys():
+    opened = []
+
+    def open_pty():
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        port = Serial(os.ttyname(slave), 115200, timeout=0)
+        opened.append((master, slave, port))
+        return master, port
+
+    yield open_pty
+    for master, slave, port in opened:
+        port.close()
+        for fd in (master, slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_one_thread_reads_every_port(ptys):
+    multiplexer = SerialMultiplexer()
+    boards = [ptys() for _ in range(3)]
+    collectors = [Collector() for _ in boards]
+    for (_, port), collector in zip(boards, collectors):
+        multiplexer.add(port, lambda collector=collector: collector)
+    for n, (master, _) in enumerate(boards):
+        os.write(master, b"board %d\r\n" % n)
+    wait_for(lambda: all(collector.data.endswith(b"\r\n") for collector in collectors))
+    assert [bytes(collector.data) for collector in collectors] == [b"board %d\r\n" % n for n in range(3)]
+    assert set.union(*(collector.threads for collector in collectors)) == {multiplexer.thread}
+
+
+def test_blocked_write_does_not_stall_other_ports(ptys):
+    multiplexer = SerialMultiplexer()
+    (stuck_master, stuck_port), (master, port) = ptys(), ptys()
+    stuck_port.write_timeout = None
+    stuck = multiplexer.add(stuck_port, Collector)
+    other = multiplexer.add(port, Collector)
+
+    data = b"w" * 256 * 1024  # far more than the pty buffers; the board reads nothing yet
+    writer = threading.Thread(target=stuck.write, args=(data,))
+    writer.start()
+    time.sleep(0.1)
+    assert writer.is_alive()
+
+    os.write(master, b"still read")
+    wait_for(lambda: other.protocol.data == b"still read")
+
+    received = bytearray()
+    while len(received) < len(data):  # the board catches up and the write completes
+        received += os.read(stuck_master, 65536)
+    writer.join(5)
+    assert not writer.is_alive() and received == data
+
+
+def test_port_that_goes_away_is_dropped(ptys):
+    multiplexer = SerialMultiplexer()
+    (gone_master, gone_port), (master, port) = ptys(), ptys()
+    gone = multiplexer.add(gone_port, Collector)
+    protocol = gone.protocol
+    other = multiplexer.add(port, Collector)
+
+    os.close(gone_master)  # unplugged: the port reads EOF or EIO
+    assert protocol.ended.wait(5)
+    assert isinstance(protocol.lost, SerialException)
+    assert not gone.is_alive() and gone.protocol is None
+    assert gone.fd not in multiplexer.selector.get_map()
+
+    os.write(master, b"after")
+    wait_for(lambda: other.protocol.data == b"after")
@@ -0,0 +1,19 @@
+import queue
+
+from board_manager.ports import PortRegistry
+
+
+def port(device):
+    return {"device": device, "description": "n/a", "hwid": "n/a", "location": None}
+
+
+def test_subscriber_that_fell_behind_gets_a_snapshot():
+    registry = PortRegistry("/dev")
+    registry.watcher = object()  # no watcher thread; events are fed by hand
+    registry.ports = {f"/dev/ttyUSB{n}": port(f"/dev/ttyUSB{n}") for n in range(3)}
+    events = registry.subscribe(queue.Queue(maxsize=1))
+
+    registry._removed("ttyUSB0")
+    registry._removed("ttyUSB2")
+    assert events.get_nowait() == ("ports", [port("/dev/ttyUSB1")])
+    assert events in registry.subscribers
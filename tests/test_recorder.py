@@ -0,0 +1,42 @@
+from board_manager import recorder as recorder_module
+from board_manager.recorder import Recorder, Recording, recorders
+
+
+def test_reopened_hub_gets_its_own_recording(tmp_path):
+    first = Recorder("/dev/ttyUSB0", str(tmp_path))
+    second = Recorder("/dev/ttyUSB0", str(tmp_path))
+    assert first.id != second.id
+    first.close()
+    assert recorders[second.id] is second
+    second.close()
+    assert second.id not in recorders
+
+
+def test_truncated_block_is_skipped(tmp_path):
+    recorder = Recorder("/dev/ttyUSB0", str(tmp_path))
+    recorder.write(b"kept\r\n")
+    recorder.close()
+    # A second block cut short by a crash: its header made it to disk, not all of its data.
+    with open(recorder.path + ".log", "rb") as f:
+        block = f.read()
+    with open(recorder.path + ".log", "ab") as f:
+        f.write(block[:-4])
+
+    recording = Recording(recorder.id, str(tmp_path))
+    assert len(recording.blocks) == 2
+    assert [text for _, text in recording.replay()[0]] == ["kept\r\n"]
+    assert [line for _, line in recording.search("kept")] == ["kept"]
+
+
+def test_blocks_in_the_writer_queue_are_still_readable(tmp_path, monkeypatch):
+    monkeypatch.setattr(recorder_module, "BLOCK_BYTES", 4)
+    recorder = Recorder("/dev/ttyUSB0", str(tmp_path))
+    recorder.write(b"first\r\n")
+    recorder.write(b"second\r\n")
+    recording = Recording(recorder.id, str(tmp_path))
+    assert b"".join(data for _, data in recording.records()) == b"first\r\nsecond\r\n"
+    recorder.close()
+
+    recording = Recording(recorder.id, str(tmp_path))
+    assert len(recording.blocks) == 2
+    assert [text for _, text in recording.replay()[0]] == ["first\r\n", "second\r\n"]
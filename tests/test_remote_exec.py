@@ -0,0 +1,31 @@
+import contextlib
+
+from board_manager import remote_exec
+from board_manager.raw_repl import RawRepl, RawReplError
+from board_manager.remote_exec import run_snippets
+
+
+class UnresponsiveRepl(RawRepl):
+    """A board that prints forever and cannot be interrupted."""
+
+    def __init__(self):
+        super().__init__(None)
+
+    def send(self, code):
+        pass
+
+    def stream_output(self, timeout=None):
+        while True:
+            yield "stdout", b"tick\r\n"
+
+    def enter(self):
+        raise RawReplError("Timed out waiting for b'raw REPL; CTRL-B to exit\\r\\n>'")
+
+
+def test_closing_the_stream_survives_a_failed_resync(monkeypatch):
+    monkeypatch.setattr(remote_exec, "board_link", lambda connection: contextlib.nullcontext(UnresponsiveRepl()))
+    events = run_snippets({"type": "serial", "port": "/dev/null"}, ["while True: print('tick')"])
+    assert next(events)["event"] == "start"
+    assert next(events) == {"event": "stdout", "snippet": 0, "data": "tick\r\n"}
+    events.close()  # the client went away; used to raise "generator ignored GeneratorExit"
+    assert not remote_exec.running
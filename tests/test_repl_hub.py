@@ -0,0 +1,130 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from board_manager.connections import board_link
+from board_manager import repl_hub, repl_protocol
+from board_manager.repl_hub import SCROLLBACK_LINE, Meter, Scrollback, Subscriber, handle_message, hubs
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a pseudo-terminal")
+
+
+@pytest.fixture(params=["multiplexer", "event loop"])
+def loop(request):
+    if request.param == "multiplexer":
+        yield None
+        return
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def test_transfer_while_viewer_subscribed(board, loop):
+    connection = {"type": "serial", "port": board.port}
+    hub, subscriber = hubs.join(connection, loop=loop)
+    try:
+        data = os.urandom(8 * 1024)
+        with board_link(connection) as repl:
+            hub.write(b"typed during the transfer")
+            repl.put_file("/flash/blob.bin", data)
+        assert board.files["/flash/blob.bin"] == data
+
+        # The viewer's input went out once the raw REPL was done with the board.
+        output = b""
+        deadline = time.monotonic() + 5
+        while b"typed during the transfer" not in output and time.monotonic() < deadline:
+            output += subscriber.queue.get(timeout=5) or b""
+        assert b">>> typed during the transfer" in output
+        assert b"raw REPL" not in output
+    finally:
+        hubs.leave(hub, subscriber)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_rejoin_after_unplug_closes_the_dead_hub(board, loop):
+    connection = {"type": "serial", "port": board.port}
+    hub, subscriber = hubs.join(connection, loop=loop)
+    board.close()  # unplugged
+    wait_for(lambda: not hub.reading())
+
+    with pytest.raises(OSError):  # still unplugged
+        hubs.join(connection, loop=loop)
+    wait_for(lambda: not hub.link.is_open)
+    assert hubs.hubs.get(hub.key) is not hub
+    hubs.leave(hub, subscriber)
+
+
+def test_slow_board_does_not_block_other_viewers(board, monkeypatch):
+    opened = threading.Event()
+    slow = threading.Event()
+
+    class SlowHub(repl_hub.ReplHub):
+        def __init__(self, key, connection, loop=None):
+            if connection.get("type") == "wifi":
+                opened.set()
+                slow.wait(5)
+                raise OSError("timed out")
+            super().__init__(key, connection, loop)
+    monkeypatch.setattr(repl_hub, "ReplHub", SlowHub)
+    joining = threading.Thread(target=lambda: pytest.raises(OSError, hubs.join,
+                                                           {"type": "wifi", "address": "192.168.4.1"}))
+    joining.start()
+    opened.wait(5)
+    try:
+        hub, subscriber = hubs.join({"type": "serial", "port": board.port})
+        hubs.leave(hub, subscriber)
+        assert joining.is_alive()  # still opening the WiFi board
+    finally:
+        slow.set()
+        joining.join()
+
+
+def test_meter_counts_bytes_on_the_wire():
+    meter = Meter()
+    meter.add("µs\n")
+    meter.add(b"\x00\x01")
+    assert meter.snapshot()["bytes"] == 6
+
+
+
+@pytest.mark.parametrize("frame", [b"\x01\x00\x50", b"\x07"])
+def test_unknown_frame_gets_an_error_status(frame):
+    kind, payload = repl_protocol.unpack(handle_message(None, Subscriber(), frame, binary=True))
+    assert kind == repl_protocol.STATUS and json.loads(payload)["event"] == "error"
+
+
+def test_viewer_whose_socket_closed_leaves_the_hub(board):
+    class ClosedSocket:
+        def send(self, message):
+            raise repl_hub.ConnectionClosed()
+
+    hub, subscriber = hubs.join({"type": "serial", "port": board.port})
+    try:
+        subscriber.queue.put_nowait(b"output")
+        repl_hub.pump_output(ClosedSocket(), hub, subscriber)
+        assert subscriber.left
+        assert hubs.hubs.get(hub.key) is not hub
+    finally:
+        hub.close()
+
+
+def test_output_without_newlines_is_cut_into_lines():
+    scrollback = Scrollback()
+    assert scrollback.feed(b"." * (2 * SCROLLBACK_LINE + 10)) == ["." * SCROLLBACK_LINE] * 2
+    assert scrollback.partial == "." * 10
+    assert scrollback.feed(b"..\r\n") == ["." * 12]
+    assert scrollback.end == 3
@@ -0,0 +1,89 @@
+import os
+import threading
+import time
+import tty
+
+import pytest
+
+from board_manager.serial_io import RingBuffer, Serial, read_available_into
+
+
+def test_ring_buffer_take_and_unread():
+    ring = RingBuffer(16)
+    ring.extend(b"hello world")
+    assert ring.take(6) == b"hello "
+    ring.unread(b"big ")
+    assert bytes(ring) == b"big world"
+    assert ring.find(b"world") == 4
+    assert ring.take(100) == b"big world" and not ring
+
+
+def test_ring_buffer_unread_past_the_front_moves_the_rest():
+    ring = RingBuffer(16)
+    ring.extend(b"abc")
+    ring.unread(b"0123456789")
+    assert bytes(ring) == b"0123456789abc"
+
+
+def test_ring_buffer_wraps_and_grows():
+    ring = RingBuffer(8)
+    ring.extend(b"-")
+    expected = bytearray(b"-")
+    for n in range(20):  # one byte always unread, wrapping many times over
+        ring.extend(b"%02d" % n)
+        expected += b"%02d" % n
+        assert ring.take(2) == expected[:2]
+        del expected[:2]
+        assert bytes(ring) == expected
+    # Reaching the end moved the unread bytes to the front instead of growing the storage.
+    assert len(ring.data) == 8
+    ring.extend(b"x" * 20)
+    assert len(ring.data) >= 20 + len(expected) and bytes(ring) == expected + b"x" * 20
+
+
+def test_ring_buffer_fill_reads_into_free_space():
+    ring = RingBuffer(4)
+    assert ring.fill(lambda view: len(view), size=10) >= 10
+    ring.clear()
+    assert not ring and ring.tail(4) == b""
+
+
+@pytest.fixture
+def pty():
+    if not hasattr(os, "openpty"):
+        pytest.skip("needs a pseudo-terminal")
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    with Serial(os.ttyname(slave), 115200, timeout=0.5) as port:
+        yield master, port
+    os.close(master)
+    os.close(slave)
+
+
+def test_read_available_into_takes_what_is_queued(pty):
+    master, port = pty
+    os.write(master, b"queued")
+    time.sleep(0.05)
+    buffer = bytearray(4)
+    assert port.read_available_into(buffer) == 4 and buffer == b"queu"
+    assert read_available_into(port, buffer) == 2 and buffer[:2] == b"ed"
+
+
+def test_read_available_into_waits_for_the_first_byte(pty):
+    master, port = pty
+    threading.Timer(0.1, os.write, (master, b"late")).start()
+    buffer = bytearray(16)
+    assert port.read_available_into(buffer) == 4 and buffer[:4] == b"late"
+    start = time.monotonic()
+    assert port.read_available_into(buffer) == 0
+    assert time.monotonic() - start >= 0.4
+
+
+def test_readinto_collects_across_writes_until_full_or_timeout(pty):
+    master, port = pty
+    threading.Timer(0.05, os.write, (master, b"abc")).start()
+    threading.Timer(0.15, os.write, (master, b"defgh")).start()
+    buffer = bytearray(6)
+    assert port.readinto(buffer) == 6 and buffer == b"abcdef"
+    buffer = bytearray(6)
+    assert port.readinto(buffer) == 2 and buffer[:2] == b"gh"
@@ -0,0 +1,61 @@
+import threading
+import time
+
+import pytest
+
+from board_manager.connections import BoardSession, SessionError, SessionRegistry
+
+
+class FakeSession:
+    def __init__(self, last_used):
+        self.id = "s1"
+        self.lock = threading.RLock()
+        self.last_used = last_used
+        self.closed = False
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+
+
+def test_reaper_skips_sessions_in_use():
+    registry = SessionRegistry(idle_timeout=1)
+    session = registry.sessions["s1"] = FakeSession(time.monotonic() - 10)
+    busy = threading.Event()
+    done = threading.Event()
+
+    def long_operation():
+        with session.lock:
+            busy.set()
+            done.wait(5)
+    worker = threading.Thread(target=long_operation)
+    worker.start()
+    busy.wait()
+
+    start = time.monotonic()
+    registry._expire(session, idle=True)
+    assert time.monotonic() - start < 0.5
+    assert not session.closed and "s1" in registry.sessions
+
+    done.set()
+    worker.join()
+    registry._expire(session, idle=True)
+    assert session.closed and "s1" not in registry.sessions
+
+
+def test_reaper_keeps_a_session_used_since_it_looked():
+    registry = SessionRegistry(idle_timeout=1)
+    session = registry.sessions["s1"] = FakeSession(time.monotonic())
+    registry._expire(session, idle=True)
+    assert not session.closed and "s1" in registry.sessions
+
+
+def test_keepalive_notices_an_unplugged_board(board):
+    session = BoardSession({"type": "serial", "port": board.port})
+    try:
+        session.keepalive()
+        board.close()
+        with pytest.raises(SessionError, match="unplugged"):
+            session.keepalive()
+    finally:
+        session.port.close()
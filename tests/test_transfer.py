@@ -0,0 +1,36 @@
+import contextlib
+import ftplib
+
+from board_manager import transfer
+from board_manager.transfer import UPSTREAM_VERSION, stale_sources, upload_files
+
+
+class FakeFtp:
+    def __init__(self, existing):
+        self.files = dict(existing)
+
+    def storbinary(self, command, data):
+        self.files[command.split(" ", 1)[1]] = data.read()
+
+    def delete(self, path):
+        if path not in self.files:
+            raise ftplib.error_perm(f"550 {path}")
+        del self.files[path]
+
+
+def test_uploaded_mpy_replaces_board_source(monkeypatch):
+    ftp = FakeFtp({"/flash/foo.py": b"old", "/flash/main.py": b"import foo"})
+    monkeypatch.setattr(transfer, "board_link", lambda connection: contextlib.nullcontext(ftp))
+
+    upload_files({"type": "wifi", "address": "192.168.4.1"}, [("foo.mpy", b"M\x06"), ("bar.mpy", b"M\x06")])
+
+    assert ftp.files == {"/flash/foo.mpy": b"M\x06", "/flash/bar.mpy": b"M\x06", "/flash/main.py": b"import foo"}
+
+
+def test_source_uploaded_beside_its_mpy_is_kept():
+    assert stale_sources([("foo.mpy", b""), ("foo.py", b""), ("boot.py", b"")]) == []
+
+
+def test_pycom_reports_its_upstream_version():
+    assert UPSTREAM_VERSION.search("v1.11-ffb0e1c on 2021-01-12")[1] == "1.11"
+    assert UPSTREAM_VERSION.search("v1.20.0 on 2023-04-26")[1] == "1.20.0"